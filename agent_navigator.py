@@ -11,14 +11,26 @@ TSK-правила обеих моделей. Рёбра описывают де
 """
 
 import random
+import sys
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Set, Tuple
 from neo4j import GraphDatabase
 
+from condition_pack import (CONDITION_MODES, POSSIBILITY_THRESHOLD,
+                            agent_peak_vector, agent_tri_vector,
+                            check_metric_mode, evaluate_packed, evaluate_possibilistic,
+                            get_metric, is_packed, pack_conditions,
+                            unpack_conditions, weight_vector)
 from emotional_model import EmotionalModel, get_peak, make_tri
 from ethical_model import EthicalModel
 
 
+# Порог сходимости итерации TSK до неподвижной точки: max |Δпик| за проход
+TSK_TOLERANCE: float = 1e-4
+
+
 # ──────────────────────────────────────────────────────────────────────
 #  Результат одного шага навигации
 # ──────────────────────────────────────────────────────────────────────
@@ -49,6 +61,99 @@ class StepResult:
     mode: str = 'combined'                      # режим выбора: 'combined'
     sem: float = 0.0                            # общее эмоциональное состояние (режим барьеров)
     seth: float = 0.0                           # этическая оценка (режим барьеров)
+    tsk_iterations: int = 1                     # число проходов TSK (итерация до неподвижной точки)
+    tsk_converged: Optional[bool] = None        # сошлось ли (None — один проход без проверки)
+    deviation_metric: str = 'l1'                # метрика ΣΔE (condition_pack.DEVIATION_METRICS)
+    deviation_weights: Optional[Dict[str, float]] = None  # веса переменных метрики
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Кеш окрестностей узлов (LRU с бюджетом по памяти)
+# ──────────────────────────────────────────────────────────────────────
+
+def _approx_size(obj: Any) -> int:
+    """Приблизительный размер объекта в байтах (рекурсивно по контейнерам)."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_approx_size(v) for v in obj)
+    return size
+
+
+class NeighbourhoodCache:
+    """
+    LRU-кеш исходящих рёбер узлов: node_id → [(edge_id, next_id,
+    edge_props, next_props), ...].
+
+    Промежуточный уровень между «запрос к Neo4j на каждом шаге» и
+    «снимок всего графа в памяти»: хранятся окрестности недавно
+    посещённых узлов, пока их суммарный размер не превышает
+    `max_bytes`; при переполнении вытесняются давно не используемые.
+    Смена версии графа (`set_version`) очищает кеш.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.version: Any = None
+        self._entries: 'OrderedDict[str, Tuple[list, int]]' = OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, node_id: str) -> Optional[list]:
+        entry = self._entries.get(node_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(node_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, node_id: str, edges: list):
+        size = _approx_size(edges)
+        if size > self.max_bytes:
+            return                      # окрестность больше всего бюджета
+        if node_id in self._entries:
+            self.bytes_used -= self._entries.pop(node_id)[1]
+        self._entries[node_id] = (edges, size)
+        self.bytes_used += size
+        while self.bytes_used > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes_used -= evicted
+            self.evictions += 1
+
+    def clear(self):
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self.bytes_used = 0
+
+    def set_version(self, version: Any) -> bool:
+        """Запомнить версию графа; при её смене кеш очищается. True — очищен."""
+        if version == self.version:
+            return False
+        self.version = version
+        self.clear()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes_used,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def __len__(self):
+        return len(self._entries)
 
 
 class AgentNavigator:
@@ -63,19 +168,232 @@ class AgentNavigator:
     DEFAULT_BARRIER: float = 1.0
 
     def __init__(self, uri: Optional[str] = None, user: Optional[str] = None,
-                 password: Optional[str] = None):
+                 password: Optional[str] = None, graph=None,
+                 cache_bytes: Optional[int] = None,
+                 version_check_interval: float = 1.0,
+                 state_backend: str = 'python',
+                 state_precision: str = 'float64',
+                 rule_backend: Optional[str] = None,
+                 tsk_memo=None, strict_hierarchy: bool = False,
+                 tsk_max_iterations: int = 1,
+                 tsk_tolerance: float = TSK_TOLERANCE,
+                 condition_mode: str = 'peak',
+                 condition_threshold: float = POSSIBILITY_THRESHOLD,
+                 deviation_metric: str = 'l1',
+                 deviation_weights: Optional[Dict[str, float]] = None):
         # uri=None позволяет создать навигатор без подключения к Neo4j —
-        # это используется в офлайн-тестах, где рёбра подаются вручную.
+        # это используется в офлайн-тестах, где рёбра подаются вручную,
+        # либо вместе с локальным хранилищем `graph`
+        # (scenario_graph.ScenarioGraph), из которого `step()` читает рёбра.
         self.driver = (GraphDatabase.driver(uri, auth=(user, password))
                        if uri else None)
-        self.emotional_model = EmotionalModel()
-        self.ethical_model = EthicalModel()
+        self.graph = graph
+        # Цепочки сценариев: терминальный узел может объявить следующий
+        # сценарий (свойства next_scenario / next_entry). Источники
+        # сценариев регистрируются через register_scenario и загружаются
+        # лениво — при первом входе.
+        self._base_graph = graph
+        self.scenario: Optional[str] = None
+        self.scenario_sources: Dict[str, Any] = {}
+        self.loaded_scenarios: Dict[str, Any] = {}
+        self.scenario_path: List[Tuple[str, str]] = []
+        # cache_bytes — бюджет LRU-кеша окрестностей узлов (None — без кеша:
+        # каждый шаг читает рёбра из источника заново).
+        self.edge_cache: Optional[NeighbourhoodCache] = (
+            NeighbourhoodCache(cache_bytes) if cache_bytes else None)
+        # Версия графа сверяется с кешем в каждом step(): у локального
+        # хранилища — всегда (чтение атрибута), у Neo4j — не чаще раза
+        # в version_check_interval секунд (запрос к базе)
+        self.version_check_interval = version_check_interval
+        self._version_checked_at: Optional[float] = None
+        # Версии графов сценариев цепочки, с которыми сверен кеш
+        self._scenario_versions: Dict[str, Any] = {}
+        # state_backend — хранение состояния агента: 'python' (словари
+        # списков, эталон) или 'numpy' (массивы, array_models)
+        self.state_backend = state_backend
+        # state_precision — формат хранения троек массивного состояния:
+        # 'float64' (эталон), 'float32' или 'fixed16' (array_models)
+        if state_precision != 'float64' and state_backend != 'numpy':
+            raise ValueError("state_precision поддерживается только "
+                             "для state_backend='numpy'")
+        self.state_precision = state_precision
+        # Допуск сравнения в неравенствах условий: не меньше ошибки
+        # округления компактного формата (array_models.PRECISION_ERROR),
+        # чтобы условие «на границе» выполнялось так же, как в эталоне
+        self.condition_eps = 1e-9
+        if state_precision != 'float64':
+            from array_models import PRECISION_ERROR
+            self.condition_eps = max(self.condition_eps,
+                                     PRECISION_ERROR.get(state_precision, 0.0))
+        # rule_backend — реализация TSK-вывода в обеих моделях: 'python'
+        # (эталон), движок из tsk_engine.RULE_BACKENDS или 'auto' (лучший
+        # доступный); None — по умолчанию для state_backend
+        if rule_backend == 'auto':
+            from tsk_engine import resolve_rule_backend
+            rule_backend = resolve_rule_backend(rule_backend)
+        self.rule_backend = rule_backend
+        # tsk_memo — общий для моделей (и для популяции навигаторов) кеш
+        # TSK-вывода по квантованному состоянию (tsk_engine.TSKMemo)
+        self.tsk_memo = tsk_memo
+        # strict_hierarchy — строгая иерархия норм в этической модели
+        # (EthicalModel.strict_hierarchy)
+        self.strict_hierarchy = strict_hierarchy
+        # Итерация TSK до неподвижной точки: при tsk_max_iterations > 1
+        # правила обеих моделей применяются повторно, пока вектор пиков
+        # меняется больше чем на tsk_tolerance (1 — один проход за шаг)
+        self.tsk_max_iterations = tsk_max_iterations
+        self.tsk_tolerance = tsk_tolerance
+        self.last_tsk_iterations = 0
+        self.last_tsk_converged: Optional[bool] = None
+        # condition_mode — проверка условий рёбер: 'peak' (неравенства
+        # пиков, эталон) либо 'possibility' / 'necessity' — степени
+        # Π / N неравенства полных троек Tri не ниже condition_threshold,
+        # с нечётким расстоянием вместо |Δb| в ΣΔE (condition_pack)
+        if condition_mode not in CONDITION_MODES:
+            raise ValueError(f"неизвестный condition_mode: {condition_mode!r} "
+                             f"(допустимо: {', '.join(CONDITION_MODES)})")
+        self.condition_mode = condition_mode
+        self.condition_threshold = condition_threshold
+        # deviation_metric — метрика ΣΔE из condition_pack.DEVIATION_METRICS
+        # ('l1' — эталон, 'l2', 'chebyshev'; 'hinge' — только в режимах
+        # 'possibility' / 'necessity'), deviation_weights — веса переменных
+        # {'emotion_<имя>' | 'ethic_<имя>': w}; отличные от эталона
+        # вычисляются для всех рёбер узла одним вызовом
+        self.metric = get_metric(deviation_metric)
+        check_metric_mode(self.metric, condition_mode)
+        self.deviation_metric = deviation_metric
+        self.deviation_weights = deviation_weights
+        self._weights = weight_vector(deviation_weights)
+        # Внешний файл правил с горячей заменой (rule_files); версия
+        # набора, применённого к моделям
+        self.rule_watcher = None
+        self._rules_version: Optional[int] = None
+        # Диапазоны пиков, вне которых правила моделей отсечены
+        # (`prune_rules`); применяются и к моделям новых агентов
+        self.rule_ranges: Optional[Dict[str, dict]] = None
+        self.emotional_model, self.ethical_model = self._new_models()
         self.path: List[Tuple] = []
+        # Рёбра, которые статический анализ (scenario_analysis) признал
+        # непроходимыми: они исключаются из кандидатов без вычислений.
+        # Ключ — (сценарий, id ребра): id уникальны лишь в пределах
+        # сценария, None — базовый граф.
+        self.dead_edges: Set[Tuple[Optional[str], str]] = set()
 
     def close(self):
         if self.driver is not None:
             self.driver.close()
 
+    def _new_models(self) -> Tuple[EmotionalModel, EthicalModel]:
+        """Создать пару моделей агента согласно `state_backend`."""
+        if self.state_backend == 'python':
+            models = EmotionalModel(), EthicalModel()
+        elif self.state_backend == 'numpy':
+            from array_models import ArrayEmotionalModel, ArrayEthicalModel
+            models = (ArrayEmotionalModel(precision=self.state_precision),
+                      ArrayEthicalModel(precision=self.state_precision))
+        else:
+            raise ValueError(f"неизвестный state_backend: {self.state_backend!r} "
+                             f"(допустимо: 'python', 'numpy')")
+        for model in models:
+            if self.rule_backend is not None:
+                model.rule_backend = self.rule_backend
+            model.tsk_memo = self.tsk_memo
+        models[1].strict_hierarchy = self.strict_hierarchy
+        if self.rule_watcher is not None:
+            self._apply_rule_set(models, self.rule_watcher.rule_set)
+            self._rules_version = self.rule_watcher.version
+        if self.rule_ranges is not None:
+            models[0].prune_rules(self.rule_ranges['emotion_'])
+            models[1].prune_rules(self.rule_ranges['ethic_'])
+        return models
+
+    # ── Внешние базы правил ────────────────────────────────────────
+
+    def attach_rule_file(self, path, cache_dir=None, poll_interval: float = 1.0):
+        """
+        Загрузить правила и термы моделей из файла JSON / YAML и следить
+        за ним: изменённый файл подхватывается без перезапуска — новая база
+        применяется к моделям перед очередным шагом, целиком (правила и
+        термы обеих моделей одновременно). Возвращает `RuleFileWatcher`.
+        """
+        from rule_files import RuleFileWatcher
+
+        backends = {m.rule_backend for m in (self.emotional_model, self.ethical_model)}
+        self.rule_watcher = RuleFileWatcher(path, cache_dir, sorted(backends),
+                                            poll_interval)
+        self.sync_rules()
+        return self.rule_watcher
+
+    def sync_rules(self) -> bool:
+        """Применить новую версию файла правил, если она есть. True — применена."""
+        if self.rule_watcher is None:
+            return False
+        self.rule_watcher.poll()
+        if self.rule_watcher.version == self._rules_version:
+            return False
+        self._apply_rule_set((self.emotional_model, self.ethical_model),
+                             self.rule_watcher.rule_set)
+        self._rules_version = self.rule_watcher.version
+        # Отсечение строилось по прежним правилам — для новых оно неверно
+        self.rule_ranges = None
+        return True
+
+    @staticmethod
+    def _apply_rule_set(models, rule_set):
+        """Базы из набора — моделям; отсутствующий раздел — встроенные правила."""
+        from rule_files import MODEL_SECTIONS
+
+        for model, base, kind in zip(models, (rule_set.emotion, rule_set.ethic),
+                                     ('emotion', 'ethic')):
+            _, default_rules, default_terms, _ = MODEL_SECTIONS[kind]
+            if base is None:
+                model.rules, model.terms = default_rules, default_terms
+            else:
+                model.rules, model.terms = base.rules, base.terms
+
+    def apply_reachability(self, report, scenario: Optional[str] = None) -> int:
+        """
+        Исключить из навигации мёртвые рёбра по отчёту
+        `scenario_analysis.ReachabilityReport`, построенному для сценария
+        `scenario` (None — базовый граф); прежние мёртвые рёбра этого
+        сценария заменяются. Возвращает их число.
+
+        Отчёт корректен только для агентов из стартовой коробки анализа
+        (по умолчанию — любые агенты) и только если анализ учёл не меньше
+        проходов TSK, чем делает навигатор (`tsk_max_iterations`), —
+        иначе ValueError.
+        """
+        self._check_tsk_passes(report)
+        self.dead_edges = {key for key in self.dead_edges if key[0] != scenario}
+        self.dead_edges.update((scenario, edge_id) for edge_id in report.dead_edges)
+        return len(report.dead_edges)
+
+    def prune_rules(self, report):
+        """
+        Отсечь правила обеих моделей, не срабатывающие в диапазонах пиков,
+        достижимых по отчёту `scenario_analysis.ReachabilityReport`
+        (`rule_analysis.reachable_ranges`). Отсечение действует и для
+        следующих агентов до смены файла правил. Те же ограничения, что у
+        `apply_reachability`. Возвращает отчёты (эмоции, этика).
+        """
+        from rule_analysis import reachable_ranges
+
+        self._check_tsk_passes(report)
+        ranges = {prefix: reachable_ranges(report, prefix, self.tsk_max_iterations)
+                  for prefix in ('emotion_', 'ethic_')}
+        self.rule_ranges = ranges
+        return (self.emotional_model.prune_rules(ranges['emotion_']),
+                self.ethical_model.prune_rules(ranges['ethic_']))
+
+    def _check_tsk_passes(self, report):
+        passes = getattr(report, 'tsk_passes', 1)
+        if self.tsk_max_iterations > passes:
+            raise ValueError(
+                f"отчёт анализа учитывает {passes} проход(ов) TSK, навигатор "
+                f"делает до {self.tsk_max_iterations} — повторите анализ с "
+                f"tsk_passes={self.tsk_max_iterations} (analyze_live_graph "
+                f"берёт его из навигатора)")
+
     # ── Инициализация агента ───────────────────────────────────────
 
     def init_agent(self, agent_params: dict):
@@ -94,9 +412,9 @@ class AgentNavigator:
                 ...
             })
         """
-        self.emotional_model = EmotionalModel()
-        self.ethical_model = EthicalModel()
+        self.emotional_model, self.ethical_model = self._new_models()
         self.path = []
+        self.last_tsk_iterations, self.last_tsk_converged = 0, None
 
         emotion_count = 0
         ethic_count = 0
@@ -130,6 +448,7 @@ class AgentNavigator:
         Подробная разбивка ΣΔE по каждому условию ребра.
         Возвращает список (param_name, req_peak, agent_peak, |deviation|).
         """
+        edge_props = unpack_conditions(edge_props)
         details = []
         for key, value in edge_props.items():
             if key.startswith('cond_em_') and (key.endswith('_le') or key.endswith('_ge')):
@@ -165,7 +484,7 @@ class AgentNavigator:
         'fear: 0.45 > 0.3 (≤)'.
         """
         failed: List[str] = []
-        eps = 1e-9
+        eps = self.condition_eps
         for key, value in edge_props.items():
             if key.startswith('cond_em_') and (key.endswith('_le') or key.endswith('_ge')):
                 name = key[8:-3]
@@ -196,6 +515,9 @@ class AgentNavigator:
           3. TSK-правила эмоциональной модели
           4. TSK-правила этической модели
 
+        При tsk_max_iterations > 1 шаги 3–4 повторяются до неподвижной
+        точки (`iterate_tsk`); дельты — суммарные за все проходы.
+
         Возвращает (em_deltas, eth_deltas).
         """
         self.emotional_model.apply_edge_updates(edge_props)
@@ -206,6 +528,9 @@ class AgentNavigator:
             self.emotional_model.apply_edge_updates(node_props)
             self.ethical_model.apply_edge_updates(node_props)
 
+        if self.tsk_max_iterations > 1:
+            return self.iterate_tsk(verbose=verbose)
+
         em_deltas = self.emotional_model.apply_tsk_rules(verbose=verbose)
         if verbose and em_deltas:
             print(f"  Δ эмоций (TSK): {em_deltas}")
@@ -214,6 +539,65 @@ class AgentNavigator:
         if verbose and eth_deltas:
             print(f"  Δ этики (TSK):  {eth_deltas}")
 
+        self.last_tsk_iterations, self.last_tsk_converged = 1, None
+        return em_deltas, eth_deltas
+
+    def _peak_vector(self):
+        """Вектор пиков обеих моделей (массив NumPy для array_models)."""
+        em, eth = self.emotional_model, self.ethical_model
+        if hasattr(em, 'peaks') and hasattr(eth, 'peaks'):
+            import numpy as np
+            return np.concatenate((em.peaks(), eth.peaks()))
+        return agent_peak_vector(em, eth)
+
+    def iterate_tsk(self, max_iterations: Optional[int] = None,
+                    tolerance: Optional[float] = None, verbose: bool = False
+                    ) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        Применять TSK-правила обеих моделей, пока вектор пиков не сойдётся
+        (max |Δпик| за проход ≤ tolerance) или не будет достигнут предел
+        проходов. Проверка сходимости — одна операция над вектором пиков
+        (для array_models — над массивом NumPy).
+
+        Число проходов и признак сходимости сохраняются в
+        last_tsk_iterations / last_tsk_converged (и в StepResult шага).
+        Возвращает суммарные (em_deltas, eth_deltas) — сдвиг пика каждой
+        переменной, изменённой правилами, от начала до конца итерации.
+        """
+        if max_iterations is None:
+            max_iterations = self.tsk_max_iterations
+        tolerance = self.tsk_tolerance if tolerance is None else tolerance
+        em, eth = self.emotional_model, self.ethical_model
+        em_start = {e: em.get_peak(e) for e in em.state}
+        eth_start = {e: eth.get_peak(e) for e in eth.state}
+        em_changed, eth_changed = set(), set()
+        prev = self._peak_vector()
+        converged = False
+        iterations = 0
+        while iterations < max_iterations:
+            iterations += 1
+            em_changed.update(em.apply_tsk_rules(verbose=verbose and iterations == 1))
+            eth_changed.update(eth.apply_tsk_rules(verbose=verbose and iterations == 1))
+            cur = self._peak_vector()
+            if hasattr(cur, 'dtype'):
+                change = float(abs(cur - prev).max()) if len(cur) else 0.0
+            else:
+                change = max((abs(a - b) for a, b in zip(cur, prev)), default=0.0)
+            prev = cur
+            if change <= tolerance:
+                converged = True
+                break
+
+        self.last_tsk_iterations, self.last_tsk_converged = iterations, converged
+        em_deltas = {n: round(em.get_peak(n) - em_start[n], 4) for n in em_changed}
+        eth_deltas = {n: round(eth.get_peak(n) - eth_start[n], 4) for n in eth_changed}
+        if verbose:
+            status = 'сошлось' if converged else 'предел проходов'
+            print(f"  TSK до неподвижной точки: {iterations} проход(ов), {status}")
+            if em_deltas:
+                print(f"  Δ эмоций (TSK): {em_deltas}")
+            if eth_deltas:
+                print(f"  Δ этики (TSK):  {eth_deltas}")
         return em_deltas, eth_deltas
 
     # ── Получение состояния ────────────────────────────────────────
@@ -238,14 +622,38 @@ class AgentNavigator:
 
         Для каждого ребра вычисляются ΣΔE (с разбивкой на эмоциональную
         и этическую части), допустимость (выполнение всех неравенств
-        условий перехода) и барьер активации β.
+        условий перехода) и барьер активации β. Мёртвые рёбра текущего
+        сценария (`dead_edges`) пропускаются. Рёбра с упакованными условиями (condition_pack)
+        обрабатываются все вместе одним векторизованным проходом.
+
+        В возможностных режимах (`condition_mode`) условия всех рёбер
+        упаковываются и оцениваются по полным тройкам одним проходом
+        `evaluate_possibilistic`; кандидат дополнительно получает
+        'condition_degree' — минимальную степень выполнения его условий.
         """
+        if self.condition_mode != 'peak':
+            return self._build_candidates_possibilistic(edges)
+        edges = self._live_edges(edges)
+        # Метрика, отличная от эталонной L1, — все рёбра через упаковку
+        custom = self.deviation_metric != 'l1' or self._weights is not None
+        packed = [item[2] if is_packed(item[2]) else pack_conditions(item[2])
+                  for item in edges if custom or is_packed(item[2])]
+        packed_results = iter(evaluate_packed(
+            packed, agent_peak_vector(self.emotional_model, self.ethical_model),
+            self.condition_eps, self.deviation_metric, self._weights)
+            if packed else [])
+
         candidates = []
         for item in edges:
             edge_id, next_id, edge_props = item[0], item[1], item[2]
             next_props = item[3] if len(item) > 3 else {}
-            total_dev, em_dev, eth_dev = self.compute_total_deviation(edge_props)
-            admissible, failed = self.check_edge_conditions(edge_props)
+            if custom or is_packed(edge_props):
+                em_raw, eth_raw, admissible, failed = next(packed_results)
+                total_dev, em_dev, eth_dev = (round(self.metric.combine(em_raw, eth_raw), 3),
+                                              round(em_raw, 3), round(eth_raw, 3))
+            else:
+                total_dev, em_dev, eth_dev = self.compute_total_deviation(edge_props)
+                admissible, failed = self.check_edge_conditions(edge_props)
             candidates.append({
                 'edge_id': edge_id,
                 'next_id': next_id,
@@ -260,6 +668,45 @@ class AgentNavigator:
             })
         return candidates
 
+    def _live_edges(self, edges: List[Tuple]) -> List[Tuple]:
+        """Рёбра без мёртвых (`dead_edges`) текущего сценария."""
+        if not self.dead_edges:
+            return edges
+        return [item for item in edges
+                if (self.scenario, item[0]) not in self.dead_edges]
+
+    def _build_candidates_possibilistic(self, edges: List[Tuple]) -> List[dict]:
+        """build_candidates для режимов 'possibility' / 'necessity'."""
+        # Анализ достижимости ведётся по пикам: при Π с порогом < 1
+        # «мёртвое» ребро может стать проходимым, поэтому dead_edges
+        # учитываются только в более строгом режиме необходимости
+        if self.condition_mode == 'necessity':
+            edges = self._live_edges(edges)
+        packed = [item[2] if is_packed(item[2]) else pack_conditions(item[2])
+                  for item in edges]
+        results = evaluate_possibilistic(
+            packed, agent_tri_vector(self.emotional_model, self.ethical_model),
+            self.condition_mode, self.condition_threshold, self.condition_eps,
+            self.deviation_metric, self._weights)
+
+        candidates = []
+        for item, (em_raw, eth_raw, admissible, failed, degree) in zip(edges, results):
+            edge_props = item[2]
+            candidates.append({
+                'edge_id': item[0],
+                'next_id': item[1],
+                'total_dev': round(self.metric.combine(em_raw, eth_raw), 3),
+                'em_dev': round(em_raw, 3),
+                'eth_dev': round(eth_raw, 3),
+                'admissible': admissible,
+                'failed_conditions': failed,
+                'condition_degree': round(degree, 4),
+                'barrier': float(edge_props.get('barrier', self.DEFAULT_BARRIER)),
+                'props': edge_props,
+                'next_props': item[3] if len(item) > 3 else {},
+            })
+        return candidates
+
     def select_and_apply(self, current_id: str, candidates: List[dict],
                          verbose: bool = False,
                          mode: str = 'combined') -> Optional[StepResult]:
@@ -344,15 +791,105 @@ class AgentNavigator:
             mode=mode,
             sem=sem,
             seth=seth,
+            tsk_iterations=self.last_tsk_iterations,
+            tsk_converged=self.last_tsk_converged,
+            deviation_metric=self.deviation_metric,
+            deviation_weights=self.deviation_weights,
         )
 
+    def fetch_edges(self, current_id: str) -> List[Tuple[str, str, dict, dict]]:
+        """
+        Исходящие рёбра узла: [(edge_id, next_id, edge_props, next_props), ...].
+
+        Источник — локальное хранилище `self.graph`, если оно задано,
+        иначе Cypher-запрос к Neo4j по узлам базового сценария (без
+        свойства scenario; узлы сценариев цепочки читает load_scenario).
+        При включённом кеше окрестностей повторные обращения к узлу
+        обслуживаются из памяти.
+        """
+        # Идентификаторы узлов уникальны лишь в пределах сценария
+        cache_key = (current_id if self.scenario is None
+                     else (self.scenario, current_id))
+        if self.edge_cache is not None:
+            cached = self.edge_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        if self.graph is not None:
+            edges = self.graph.edges_from(current_id)
+        else:
+            with self.driver.session() as session:
+                result = session.run("""
+                    MATCH (current:State {id: $current})-[e:TRANSITION]->(next:State)
+                    WHERE current.scenario IS NULL AND next.scenario IS NULL
+                    RETURN e, next.id AS next_id, e.id AS edge_id, next
+                """, current=current_id)
+                edges = [(rec['edge_id'], rec['next_id'], dict(rec['e']),
+                          dict(rec['next']))
+                         for rec in result]
+        if self.edge_cache is not None:
+            self.edge_cache.put(cache_key, edges)
+        return edges
+
+    def fetch_node(self, node_id: str) -> Optional[dict]:
+        """Свойства узла текущего сценария (None, если узла нет)."""
+        if self.graph is not None:
+            return self.graph.nodes.get(node_id)
+        with self.driver.session() as session:
+            rec = session.run("""
+                MATCH (n:State {id: $id}) WHERE n.scenario IS NULL RETURN n
+            """, id=node_id).single()
+            return dict(rec['n']) if rec else None
+
+    def fetch_graph_version(self) -> Any:
+        """
+        Версия базового графа: `version` локального хранилища либо свойство
+        `version` узла :ScenarioMeta, которое обновляют загрузчики сети
+        (None, если узла нет). Не зависит от текущего сценария цепочки —
+        графы сценариев сверяются в `refresh_graph_version` по отдельности.
+        """
+        if self._base_graph is not None:
+            return self._base_graph.version
+        with self.driver.session() as session:
+            rec = session.run(
+                "MATCH (m:ScenarioMeta) RETURN max(m.version) AS version").single()
+            return rec['version'] if rec else None
+
+    def refresh_graph_version(self, force: bool = True) -> bool:
+        """
+        Сверить версию графа с кешем окрестностей; при изменении кеш
+        очищается. True — кеш сброшен.
+
+        Вызывается в начале `navigate()` (force=True) и в каждом `step()`
+        (force=False): для Neo4j проверка тогда выполняется не чаще раза
+        в `version_check_interval` секунд. Граф текущего сценария цепочки
+        сверяется со своей, запомненной для него версией: переход между
+        сценариями кеш не сбрасывает.
+        """
+        if self.edge_cache is None:
+            return False
+        flushed = False
+        if self.scenario is not None:
+            version = self.graph.version
+            if self._scenario_versions.setdefault(self.scenario, version) != version:
+                self._scenario_versions[self.scenario] = version
+                self.edge_cache.clear()
+                flushed = True
+        if not force and self._base_graph is None:
+            now = time.monotonic()
+            if (self._version_checked_at is not None
+                    and now - self._version_checked_at < self.version_check_interval):
+                return flushed
+            self._version_checked_at = now
+        return self.edge_cache.set_version(self.fetch_graph_version()) or flushed
+
     def step(self, current_id: str, verbose: bool = False,
              mode: str = 'combined') -> Optional[StepResult]:
         """
         Выполнить ОДИН шаг навигации из узла `current_id`.
 
         Алгоритм:
-          1. Cypher-запрос исходящих рёбер `(:State {id})-[:TRANSITION]->(:State)`.
+          1. `fetch_edges` — исходящие рёбра `(:State {id})-[:TRANSITION]->(:State)`
+             из Neo4j или локального хранилища.
           2. `build_candidates` — ΣΔE, допустимость, барьеры β.
           3. `select_and_apply` — выбор ребра в режиме 'combined':
              выполнение всех неравенств условий И Sem + Seth > β,
@@ -361,14 +898,9 @@ class AgentNavigator:
         Возвращает `StepResult` или `None`, если из узла нет исходящих рёбер
         либо ни одно ребро не проходит по условиям/барьерам.
         """
-        with self.driver.session() as session:
-            result = session.run("""
-                MATCH (current:State {id: $current})-[e:TRANSITION]->(next:State)
-                RETURN e, next.id AS next_id, e.id AS edge_id, next
-            """, current=current_id)
-            edges = [(rec['edge_id'], rec['next_id'], dict(rec['e']),
-                      dict(rec['next']))
-                     for rec in result]
+        self.sync_rules()
+        self.refresh_graph_version(force=False)
+        edges = self.fetch_edges(current_id)
 
         if not edges:
             if verbose:
@@ -379,25 +911,130 @@ class AgentNavigator:
         return self.select_and_apply(current_id, candidates,
                                      verbose=verbose, mode=mode)
 
+    # ── Цепочки сценариев ──────────────────────────────────────────
+
+    def register_scenario(self, name: str, source):
+        """
+        Зарегистрировать сценарий для цепочек.
+
+        Args:
+            name: имя сценария (значение свойства next_scenario узла)
+            source: ScenarioGraph либо вызываемый объект без аргументов,
+                    возвращающий ScenarioGraph; вызывается лениво, при
+                    первом входе агента в сценарий
+        """
+        self.scenario_sources[name] = source
+        self.loaded_scenarios.pop(name, None)
+
+    def load_scenario(self, name: str):
+        """
+        Граф сценария `name` (загружается один раз и запоминается).
+
+        Незарегистрированные сценарии читаются из Neo4j — узлы :State
+        со свойством scenario = name и рёбра между ними.
+        """
+        graph = self.loaded_scenarios.get(name)
+        if graph is not None:
+            return graph
+        source = self.scenario_sources.get(name)
+        if source is None and self.driver is None:
+            raise KeyError(f"Сценарий {name!r} не зарегистрирован")
+        if source is None:
+            graph = self._load_scenario_from_neo4j(name)
+        elif callable(source):
+            graph = source()
+        else:
+            graph = source
+        self.loaded_scenarios[name] = graph
+        return graph
+
+    def _load_scenario_from_neo4j(self, name: str):
+        from scenario_graph import ScenarioGraph
+
+        graph = ScenarioGraph()
+        with self.driver.session() as session:
+            for rec in session.run("MATCH (n:State {scenario: $name}) RETURN n",
+                                   name=name):
+                graph.add_node(dict(rec['n']))
+            for rec in session.run("""
+                MATCH (a:State {scenario: $name})-[r:TRANSITION]->(b:State {scenario: $name})
+                RETURN a.id AS from_id, b.id AS to_id, r
+            """, name=name):
+                graph.add_edge({'from': rec['from_id'], 'to': rec['to_id'],
+                                **dict(rec['r'])})
+        return graph
+
+    def enter_scenario(self, name: str, entry_id: str, from_id: str = '',
+                       verbose: bool = False) -> str:
+        """
+        Перейти в сценарий `name` в узел `entry_id`, сохранив состояние агента.
+
+        Агент реагирует на ситуацию входного узла так же, как при обычном
+        переходе: применяются его update_em_*/update_eth_* и TSK-правила.
+        Переход записывается в `path` ребром 'chain:<name>' с ΣΔE = 0.
+        Возвращает `entry_id`.
+        """
+        graph = self.load_scenario(name)
+        if entry_id not in graph.nodes:
+            raise KeyError(f"В сценарии {name!r} нет входного узла {entry_id!r}")
+        self.graph = graph
+        self.scenario = name
+        self.scenario_path.append((name, entry_id))
+        self.path.append((from_id, f'chain:{name}', entry_id, 0.0))
+        if verbose:
+            print(f"\n⇒ ПЕРЕХОД В СЦЕНАРИЙ «{name}», узел {entry_id}")
+        # apply_all_updates обновляет last_tsk_iterations / last_tsk_converged
+        # — они относятся к входу в сценарий, а не к предыдущему шагу
+        self.apply_all_updates({}, verbose=verbose,
+                               node_props=graph.nodes[entry_id])
+        return entry_id
+
+    def follow_chain(self, node_id: str, node_props: Optional[dict],
+                     verbose: bool = False) -> Optional[str]:
+        """
+        Если узел, на котором остановился агент, объявляет следующий
+        сценарий (next_scenario, next_entry), перейти в него и вернуть
+        id входного узла; иначе вернуть None.
+        """
+        if not node_props or not node_props.get('next_scenario'):
+            return None
+        return self.enter_scenario(node_props['next_scenario'],
+                                   node_props.get('next_entry', 'V0'),
+                                   from_id=node_id, verbose=verbose)
+
     # ── Основной цикл навигации ────────────────────────────────────
 
     def navigate(self, start_id: str, agent_params: dict,
-                 verbose: bool = True, mode: str = 'combined') -> List[Tuple]:
+                 verbose: bool = True, mode: str = 'combined',
+                 max_scenarios: int = 100) -> List[Tuple]:
         """
         Основной цикл навигации по сценарной сети.
 
+        Если агент останавливается на узле с объявленным следующим
+        сценарием (next_scenario / next_entry), навигация продолжается
+        в нём с сохранённым состоянием агента — не более `max_scenarios`
+        переходов между сценариями. По завершении навигатор возвращается
+        к базовому графу (пройденные сценарии — в `scenario_path`).
+
         Args:
             start_id: идентификатор начального узла
             agent_params: характеристики агента (Tri(a,b,c) или float)
             verbose: подробный лог
             mode: режим выбора ребра (всегда 'combined': все неравенства
                   условий И Sem + Seth > β, затем минимальная ΣΔE)
+            max_scenarios: предел числа переходов между сценариями
 
         Returns:
             Список шагов [(from_node, edge_id, to_node, total_dev), ...]
         """
         self.init_agent(agent_params)
+        self.graph = self._base_graph
+        self.scenario = None
+        self.scenario_path = []
+        self.refresh_graph_version()
         current = start_id
+        # Стартовый узел сам может быть терминальным и вести в цепочку
+        current_props = self.fetch_node(start_id)
 
         if verbose:
             print(f"\n{'='*60}")
@@ -406,11 +1043,24 @@ class AgentNavigator:
             print(f"  Этика:  {self.ethical_model.get_nonzero()}")
             print(f"{'='*60}")
 
-        while True:
-            result = self.step(current, verbose=verbose, mode=mode)
-            if result is None:
-                break
-            current = result.to_node
+        try:
+            while True:
+                result = self.step(current, verbose=verbose, mode=mode)
+                if result is None:
+                    if len(self.scenario_path) >= max_scenarios:
+                        break
+                    entry = self.follow_chain(current, current_props,
+                                              verbose=verbose)
+                    if entry is None:
+                        break
+                    current = entry
+                    current_props = self.graph.nodes[entry]
+                    continue
+                current = result.to_node
+                current_props = result.chosen.get('next_props')
+        finally:
+            self.graph = self._base_graph
+            self.scenario = None
 
         if verbose:
             print(f"\n{'='*60}")
@@ -433,14 +1083,17 @@ class AgentNavigator:
         """
         Прочитать все узлы и рёбра графа сценарной сети.
         Возвращает (nodes, edges), где edges = [(from_id, to_id, edge_id), ...].
-        Используется внешними инструментами визуализации.
+        Используется внешними инструментами визуализации. Читается только
+        базовый сценарий — узлы без свойства scenario.
         """
         with self.driver.session() as session:
-            nodes_result = session.run("MATCH (n:State) RETURN n.id AS id")
+            nodes_result = session.run(
+                "MATCH (n:State) WHERE n.scenario IS NULL RETURN n.id AS id")
             nodes = [rec['id'] for rec in nodes_result]
 
             edges_result = session.run("""
                 MATCH (n:State)-[r:TRANSITION]->(m:State)
+                WHERE n.scenario IS NULL AND m.scenario IS NULL
                 RETURN n.id AS from_id, m.id AS to_id, r.id AS edge_id
             """)
             edges = [(rec['from_id'], rec['to_id'], rec['edge_id'])
@@ -461,10 +1114,15 @@ class AgentNavigator:
         Используется внешним UI (например, `app.py`) для построения tooltip'ов
         с описанием узлов и рёбер. Не заменяет публичный
         `fetch_graph_topology()` — он продолжает работать в старом формате
-        для обратной совместимости.
+        для обратной совместимости. При заданном локальном хранилище
+        `self.graph` читает сеть из него, иначе — базовый сценарий из
+        Neo4j (узлы без свойства scenario).
         """
+        if self.graph is not None:
+            return self.graph.to_lists()
         with self.driver.session() as session:
-            nodes_result = session.run("MATCH (n:State) RETURN n")
+            nodes_result = session.run(
+                "MATCH (n:State) WHERE n.scenario IS NULL RETURN n")
             nodes: List[Dict[str, Any]] = []
             for rec in nodes_result:
                 props = dict(rec['n'])
@@ -474,6 +1132,7 @@ class AgentNavigator:
 
             edges_result = session.run("""
                 MATCH (n:State)-[r:TRANSITION]->(m:State)
+                WHERE n.scenario IS NULL AND m.scenario IS NULL
                 RETURN n.id AS from_id, m.id AS to_id, r AS rel
             """)
             edges: List[Dict[str, Any]] = []
@@ -39,6 +39,7 @@ import pandas as pd
 import streamlit as st
 
 from agent_navigator import AgentNavigator, StepResult
+from condition_pack import unpack_conditions
 from emotional_model import ALL_EMOTIONS
 from ethical_model import ALL_ETHICS
 from seed_scenario import BASE_AGENT
@@ -137,20 +138,44 @@ def _ss_init():
             st.session_state[k] = v
 
 
+# Бюджет LRU-кеша окрестностей узлов навигатора
+_EDGE_CACHE_BYTES = 8 * 1024 * 1024
+
+
 def _connect(uri: str, user: str, password: str) -> Optional[AgentNavigator]:
     """Открыть подключение к Neo4j. Возвращает None при ошибке."""
     try:
-        nav = AgentNavigator(uri, user, password)
+        # Кеш окрестностей: повторные визиты узлов не обращаются к Neo4j
+        nav = AgentNavigator(uri, user, password, cache_bytes=_EDGE_CACHE_BYTES)
         # Пробный запрос — позволяет сразу поймать неверные креды.
         with nav.driver.session() as s:
             s.run("RETURN 1").single()
         st.session_state.connection_error = None
+        _attach_rules(nav)
         return nav
     except Exception as exc:  # noqa: BLE001
         st.session_state.connection_error = str(exc)
         return None
 
 
+def _attach_rules(nav: AgentNavigator):
+    """
+    Подключить внешний файл правил, если он указан в `st.secrets["rules"]`
+    (ключ path). Изменения файла подхватываются перед очередным шагом без
+    перезапуска приложения; скомпилированные базы кешируются рядом с
+    файлом в каталоге .rule_cache.
+    """
+    try:
+        path = st.secrets["rules"]["path"]
+    except Exception:  # noqa: BLE001
+        return
+    try:
+        nav.attach_rule_file(path, cache_dir=Path(path).parent / '.rule_cache')
+    except Exception as exc:  # noqa: BLE001
+        st.warning(f"Файл правил {path} не загружен, используются "
+                   f"встроенные правила: {exc}")
+
+
 def _step_to_dict(s: StepResult) -> Dict[str, Any]:
     """Сериализуемый снимок шага для истории/экспорта."""
     return {
@@ -256,8 +281,10 @@ def _node_tooltip(props: Dict[str, Any]) -> str:
 def _edge_tooltip(edge: Dict[str, Any]) -> str:
     """
     HTML-тултип ребра: id + cond_*/update_* отдельными секциями
-    + прочие свойства.
+    + прочие свойства. Упакованные условия (condition_pack) показываются
+    в именованном виде.
     """
+    edge = unpack_conditions(edge)
     eid = edge.get('id') or '—'
     rows = [f"<b>Ребро {eid}</b><br>"
             f"<span style='font-size:12px;color:#555'>"
@@ -673,6 +700,7 @@ def main():
             st.session_state.nav = nav
             try:
                 st.session_state.topology = nav.fetch_graph_topology_full()
+                nav.refresh_graph_version()
             except Exception as exc:  # noqa: BLE001
                 st.session_state.topology = None
                 st.warning(f"Не удалось прочитать топологию графа: {exc}")
@@ -685,6 +713,10 @@ def main():
 
     if reset_btn and st.session_state.nav is not None:
         st.session_state.nav.init_agent(profile)
+        try:
+            st.session_state.nav.refresh_graph_version()
+        except Exception:  # noqa: BLE001
+            pass
         st.session_state.current_node = start_node
         st.session_state.finished = False
         st.session_state.history = []
@@ -700,6 +732,14 @@ def main():
                 "«Подключить».")
         return
 
+    watcher = nav.rule_watcher
+    if watcher is not None:
+        st.sidebar.caption(f"Правила: {watcher.path.name} · версия {watcher.version} "
+                           f"· sha256 {watcher.rule_set.digest[:10]}")
+        if watcher.last_error:
+            st.sidebar.warning(f"Изменения файла правил не применены: "
+                               f"{watcher.last_error}")
+
     # ── Кнопки шага и авторежима ───────────────────────────────────
     st.markdown("---")
     ctrl_step, ctrl_auto, ctrl_export = st.columns([1, 1, 2])
@@ -0,0 +1,330 @@
+"""
+Эмоциональная и этическая модели с хранением состояния в массивах NumPy.
+
+`ArrayEmotionalModel` и `ArrayEthicalModel` — подклассы `EmotionalModel`
+и `EthicalModel`, хранящие тройки Tri(a, b, c) всех переменных в одном
+непрерывном массиве float формы (n, 3): 20×3 для эмоций, 7×3 для этики.
+Сдвиг с клиппингом, Sem/Seth и извлечение вектора пиков выполняются
+одной векторной операцией вместо циклов по словарям (при установленном
+Numba сдвиг — ядром jit_kernels). TSK-вывод по умолчанию выполняется
+лучшим доступным скомпилированным движком (`rule_backend='auto'`:
+'jit' с Numba, иначе 'numpy', см. tsk_engine).
+
+Атрибут `state` остаётся словарём по интерфейсу (`TriArrayState` —
+представление строк массива), поэтому `get_peak()`, `as_table()`,
+`get_nonzero()`, `set_values()` и запись `model.state[name] = tri`
+из `AgentNavigator.init_agent` работают без изменений.
+
+Требует NumPy. Выбор в навигаторе: `AgentNavigator(state_backend='numpy')`.
+
+Точность хранения (`precision`, для больших популяций):
+
+    'float64'  — эталон, 8 байт на компоненту (24 на тройку)
+    'float32'  — 4 байта; |ошибка| ≤ 2⁻²⁵ ≈ 3·10⁻⁸ на компоненту в [0, 1]
+    'fixed16'  — uint16 с шагом 1/65535, 2 байта; |ошибка| ≤ 1/131070 ≈ 7.6·10⁻⁶
+
+Вычисления всегда выполняются в float64; преобразование происходит на
+границах — при каждой записи в состояние модели (тройка округляется до
+сетки выбранного формата) и при упаковке в `TriPopulation` (27 троек
+агента: 648 байт во float64, 324 во float32, 162 в fixed16). Поэтому
+одиночная модель с `precision='fixed16'` проходит ровно те же состояния,
+что агент, хранимый в упакованной популяции.
+
+Границы ошибки (`precision_bounds`): при погрешности ε каждой компоненты
+Sem и Seth отличаются от вычисленных по точным пикам не более чем на ε,
+сумма отклонений ΣΔE по k условиям — не более чем на k·ε, допустимость
+неравенства не меняется, если его запас больше ε (навигатор сравнивает
+неравенства с допуском ε, поэтому условие «на границе» — пик агента
+равен порогу — выполняется так же, как в эталоне). Сдвиг с клиппингом —
+нерастягивающее отображение, поэтому за n записей ошибка состояния
+растёт не быстрее n·ε (для TSK-прохода — с коэффициентом наклонов
+термов; эквивалентность путей с эталоном проверяется тестами). Выбор
+ребра совпадает с эталоном, если запасы решения (разрыв ΣΔE между
+лучшим и следующим ребром, Sem + Seth − β, запасы неравенств) больше
+накопленной границы; ближе к порогу результат может отличаться, как и
+при округлениях round(…, 3/4) в самом навигаторе.
+"""
+
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from emotional_model import (ALL_EMOTIONS, NEGATIVE_EMOTIONS, POSITIVE_EMOTIONS,
+                             EmotionalModel, Tri, make_tri, shift_tri)
+from ethical_model import ALL_ETHICS, EthicalModel
+from jit_kernels import NUMBA_AVAILABLE, shift_tri_clip
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Точность хранения состояния
+# ──────────────────────────────────────────────────────────────────────
+
+STATE_PRECISIONS = ('float64', 'float32', 'fixed16')
+
+# Масштаб 16-битного формата с фиксированной точкой: x ≈ q / FIXED16_SCALE
+FIXED16_SCALE = 65535
+
+STATE_DTYPES = {'float64': np.float64, 'float32': np.float32,
+                'fixed16': np.uint16}
+
+# Максимальная абсолютная ошибка округления компоненты из [0, 1]
+PRECISION_ERROR = {'float64': 0.0,
+                   'float32': 2.0 ** -25,
+                   'fixed16': 0.5 / FIXED16_SCALE}
+
+
+def _check_precision(precision: str):
+    if precision not in STATE_PRECISIONS:
+        raise ValueError(f"неизвестная точность состояния: {precision!r} "
+                         f"(допустимо: {', '.join(STATE_PRECISIONS)})")
+
+
+def encode_tri(tri: np.ndarray, precision: str) -> np.ndarray:
+    """Упаковать массив троек (…, 3) в формат хранения `precision`."""
+    _check_precision(precision)
+    if precision == 'fixed16':
+        q = np.rint(np.clip(tri, 0.0, 1.0) * FIXED16_SCALE)
+        return q.astype(np.uint16)
+    return np.asarray(tri, dtype=STATE_DTYPES[precision])
+
+
+def decode_tri(data: np.ndarray, precision: str) -> np.ndarray:
+    """Распаковать массив формата `precision` в float64."""
+    _check_precision(precision)
+    if precision == 'fixed16':
+        return data / float(FIXED16_SCALE)
+    return np.asarray(data, dtype=np.float64)
+
+
+def quantize_tri(tri: np.ndarray, precision: str) -> np.ndarray:
+    """Округлить float64-массив троек до сетки `precision` (на месте)."""
+    if precision == 'float32':
+        tri[...] = tri.astype(np.float32)
+    elif precision == 'fixed16':
+        np.clip(tri, 0.0, 1.0, out=tri)
+        tri *= FIXED16_SCALE
+        np.rint(tri, out=tri)
+        tri /= FIXED16_SCALE
+    return tri
+
+
+def precision_bounds(precision: str, n_conditions: int = 1) -> Dict[str, float]:
+    """
+    Документированные границы ошибки одного преобразования в `precision`:
+    компонента тройки, Sem, Seth и ΣΔE по `n_conditions` условиям ребра
+    (см. docstring модуля).
+    """
+    _check_precision(precision)
+    eps = PRECISION_ERROR[precision]
+    return {'component': eps, 'sem': eps, 'seth': eps,
+            'deviation': n_conditions * eps}
+
+
+class TriPopulation:
+    """
+    Состояния N агентов в одном массиве формы (N, V, 3) в формате
+    `precision`: V = 27 переменных (ALL_EMOTIONS + ALL_ETHICS).
+
+    `store(i, em, eth)` упаковывает состояние пары массивных моделей,
+    `load(i, em, eth)` распаковывает его обратно (float64); `peaks()` —
+    матрица пиков (N, V) для пакетного TSK-вывода
+    (`CompiledRuleBase.evaluate_arrays` по срезам эмоций и этики).
+    """
+
+    def __init__(self, n_agents: int, precision: str = 'fixed16'):
+        _check_precision(precision)
+        self.precision = precision
+        self.names = list(ALL_EMOTIONS) + list(ALL_ETHICS)
+        self.data = np.zeros((n_agents, len(self.names), 3),
+                             dtype=STATE_DTYPES[precision])
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    def store(self, i: int, em: 'ArrayEmotionalModel', eth: 'ArrayEthicalModel'):
+        n_em = len(ALL_EMOTIONS)
+        self.data[i, :n_em] = encode_tri(em._tri, self.precision)
+        self.data[i, n_em:] = encode_tri(eth._tri, self.precision)
+
+    def load(self, i: int, em: 'ArrayEmotionalModel', eth: 'ArrayEthicalModel'):
+        n_em = len(ALL_EMOTIONS)
+        tri = decode_tri(self.data[i], self.precision)
+        em._tri[...] = tri[:n_em]
+        eth._tri[...] = tri[n_em:]
+        for model in (em, eth):
+            quantize_tri(model._tri, model.precision)
+
+    def peaks(self) -> np.ndarray:
+        """Пики всех агентов (N, V) во float64."""
+        return decode_tri(self.data[:, :, 1], self.precision)
+
+
+class TriArrayState(MutableMapping):
+    """
+    Словарное представление массива троек формы (n, 3).
+
+    Чтение `state[name]` возвращает Tri(a, b, c) (копию строки), запись
+    копирует тройку в строку массива. Имена вне фиксированного списка
+    переменных (их допускает `init_agent`) хранятся в обычном словаре.
+    """
+
+    def __init__(self, names: Sequence[str], tri: np.ndarray,
+                 precision: str = 'float64'):
+        self._index: Dict[str, int] = {n: i for i, n in enumerate(names)}
+        self._names = list(names)
+        self._tri = tri
+        self._extra: Dict[str, Tri] = {}
+        self.precision = precision
+
+    def __getitem__(self, name: str) -> Tri:
+        i = self._index.get(name)
+        if i is None:
+            return self._extra[name]
+        return Tri._make(self._tri[i].tolist())
+
+    def __setitem__(self, name: str, tri) -> None:
+        i = self._index.get(name)
+        if i is None:
+            self._extra[name] = make_tri(tri)
+        else:
+            self._tri[i] = tri
+            if self.precision != 'float64':
+                quantize_tri(self._tri[i], self.precision)
+
+    def __delitem__(self, name: str) -> None:
+        if name in self._index:
+            raise KeyError(f"переменную {name!r} нельзя удалить из состояния")
+        del self._extra[name]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._names
+        yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self._names) + len(self._extra)
+
+    def __contains__(self, name) -> bool:
+        return name in self._index or name in self._extra
+
+
+class _ArrayStateMixin:
+    """Общая реализация хранения Tri в массиве для обеих моделей."""
+
+    _update_prefix = ''
+
+    def _init_array(self, names: Sequence[str], precision: str = 'float64'):
+        _check_precision(precision)
+        self.precision = precision
+        self._names = list(names)
+        self._index = {n: i for i, n in enumerate(names)}
+        self._tri = np.zeros((len(names), 3), dtype=np.float64)
+        self.state = TriArrayState(names, self._tri, precision)
+
+    def get_peak(self, name: str) -> float:
+        i = self._index.get(name)
+        if i is not None:
+            return float(self._tri[i, 1])
+        tri = self.state._extra.get(name)
+        return tri[1] if tri is not None else 0.0
+
+    def peaks(self) -> np.ndarray:
+        """Вектор пиков (копия) в порядке ALL_EMOTIONS / ALL_ETHICS."""
+        return self._tri[:, 1].copy()
+
+    def shift_all(self, deltas: np.ndarray, rows: Optional[Sequence[int]] = None):
+        """
+        Сдвинуть тройки на вектор дельт с клиппингом в [0, 1].
+
+        Сдвигаются и клиппируются только строки `rows` (по умолчанию — с
+        ненулевой дельтой): эталон вызывает shift_tri лишь для изменённых
+        переменных, и значения остальных вне [0, 1] сохраняются.
+        """
+        if rows is None:
+            rows = np.flatnonzero(deltas)
+        if not len(rows):
+            return
+        if len(rows) == len(deltas):
+            if NUMBA_AVAILABLE:
+                shift_tri_clip(self._tri, deltas)
+            else:
+                self._tri += deltas[:, None]
+                np.clip(self._tri, 0.0, 1.0, out=self._tri)
+            if self.precision != 'float64':
+                quantize_tri(self._tri, self.precision)
+            return
+        sub = self._tri[rows] + deltas[rows, None]
+        np.clip(sub, 0.0, 1.0, out=sub)
+        if self.precision != 'float64':
+            quantize_tri(sub, self.precision)
+        self._tri[rows] = sub
+
+    def shift_peaks(self, deltas: Dict[str, float]):
+        """Сдвиг по дельтам TSK-вывода {имя: δ} одной векторной операцией."""
+        vec = np.zeros(len(self._names))
+        rows = []
+        for name, delta in deltas.items():
+            i = self._index.get(name)
+            if i is not None:
+                vec[i] = delta
+                rows.append(i)
+            elif name in self.state:
+                self.state[name] = shift_tri(self.state[name], delta)
+        self.shift_all(vec, rows)
+
+    def apply_edge_updates(self, edge_props: dict):
+        """Применить обновления update_*: сбор дельт и один векторный сдвиг."""
+        prefix = self._update_prefix
+        deltas = None
+        for key, delta in edge_props.items():
+            if not key.startswith(prefix):
+                continue
+            name = key[len(prefix):]
+            i = self._index.get(name)
+            if i is not None:
+                if deltas is None:
+                    deltas, rows = np.zeros(len(self._names)), []
+                deltas[i] = float(delta)
+                rows.append(i)
+            elif name in self.state:
+                self.state[name] = shift_tri(self.state[name], float(delta))
+        if deltas is not None:
+            self.shift_all(deltas, rows)
+
+
+class ArrayEmotionalModel(_ArrayStateMixin, EmotionalModel):
+    """Эмоциональная модель с состоянием в массиве 20×3."""
+
+    _update_prefix = 'update_em_'
+
+    def __init__(self, rule_backend: str = 'auto', precision: str = 'float64'):
+        super().__init__(rule_backend)
+        self._init_array(ALL_EMOTIONS, precision)
+        self._pos = np.array([self._index[e] for e in POSITIVE_EMOTIONS])
+        self._neg = np.array([self._index[e] for e in NEGATIVE_EMOTIONS])
+
+    def compute_sem(self) -> float:
+        peaks = self._tri[:, 1]
+        return round(float(0.5 + (peaks[self._pos].mean()
+                                  - peaks[self._neg].mean()) / 2.0), 4)
+
+
+class ArrayEthicalModel(_ArrayStateMixin, EthicalModel):
+    """Этическая модель с состоянием в массиве 7×3."""
+
+    _update_prefix = 'update_eth_'
+
+    def __init__(self, rule_backend: str = 'auto', precision: str = 'float64'):
+        super().__init__(rule_backend)
+        self._init_array(ALL_ETHICS, precision)
+        self._evil = self._index['evil']
+        self._virtues = np.array([i for n, i in self._index.items() if n != 'evil'])
+
+    def compute_seth(self) -> float:
+        peaks = self._tri[:, 1]
+        return round(float(0.5 + (peaks[self._virtues].mean()
+                                  - peaks[self._evil]) / 2.0), 4)
@@ -0,0 +1,505 @@
+"""
+Упакованное (массивное) представление условий перехода на рёбрах.
+
+Обычная схема хранит каждое условие отдельным свойством ребра
+(`cond_em_fear_le`, `cond_eth_honesty_ge`, …), и на каждом шаге навигатор
+разбирает десятки именованных ключей. Упакованная схема хранит условия
+тремя списками фиксированного порядка:
+
+    cond_pack_slots — номера переменных (индексы в VARIABLE_SLOTS)
+    cond_pack_ops   — операторы: 0 — '≤' (_le), 1 — '≥' (_ge)
+    cond_pack_tri   — плоский список порогов Tri: a0, b0, c0, a1, b1, c1, …
+
+Neo4j хранит такие свойства как однородные массивы примитивов, а
+навигатор вычисляет ΣΔE и допустимость сразу для всех рёбер-кандидатов
+одним векторизованным проходом (`evaluate_packed`). При отсутствии NumPy
+используется эквивалентный цикл на чистом Python.
+
+Возможностный режим (`evaluate_possibilistic`) сравнивает не пики, а
+треугольные числа целиком — тройку агента X = Tri(a₁, b₁, c₁) и порог
+Y = Tri(a₂, b₂, c₂):
+
+    Π(X ≤ Y) = 1,                                    b₁ ≤ b₂
+             = 0,                                    a₁ ≥ c₂
+             = (c₂ − a₁) / ((b₁ − a₁) + (c₂ − b₂)),  иначе
+    N(X ≤ Y) = 1 − Π(Y < X)
+
+(возможность и необходимость по Дюбуа — Праду; X ≥ Y ≡ Y ≤ X).
+Условие выполнено, если степень выбранного вида не меньше порога α;
+при α = 1 возможностный режим совпадает с проверкой по пикам.
+Отклонение — нечёткое расстояние между тройками
+d(X, Y) = (|a₁ − a₂| + 2·|b₁ − b₂| + |c₁ − c₂|) / 4, равное |b₁ − b₂|
+для треугольников одинаковой формы.
+
+Метрики отклонения (`DEVIATION_METRICS`, `register_metric`): вклад
+условия — функция term(d, e) расстояния d = |ΔE| (или нечёткого
+расстояния) и превышения e (> 0 — неравенство нарушено на e) с весом
+переменной w, свёртка по условиям ребра — сумма, корень суммы (L2) или
+максимум; ΣΔE ребра собирается из эмоциональной и этической частей той
+же свёрткой:
+
+    'l1'         Σ w·d           (эталон; с весами — взвешенная L1)
+    'l2'         √(Σ w·d²)
+    'chebyshev'  max w·d
+    'hinge'      Σ w·max(0, e)   — только нарушения неравенств
+
+'hinge' различает рёбра только в возможностных режимах: при проверке по
+пикам допустимые рёбра не нарушают ни одного неравенства, и у всех
+ΣΔE = 0, поэтому в режиме 'peak' такая метрика отвергается
+(`check_metric_mode`).
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from emotional_model import ALL_EMOTIONS, ZERO_TRI, get_peak
+from ethical_model import ALL_ETHICS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен
+    np = None
+
+# Фиксированный порядок переменных: 20 эмоций, затем 7 этических
+VARIABLE_SLOTS: List[Tuple[str, str]] = (
+    [('em', e) for e in ALL_EMOTIONS] + [('eth', e) for e in ALL_ETHICS])
+N_EMOTION_SLOTS = len(ALL_EMOTIONS)
+SLOT_INDEX: Dict[Tuple[str, str], int] = {v: i for i, v in enumerate(VARIABLE_SLOTS)}
+
+OP_LE = 0
+OP_GE = 1
+
+PACK_KEYS = ('cond_pack_slots', 'cond_pack_ops', 'cond_pack_tri')
+
+_EPS = 1e-9
+
+# Режимы проверки условий: по пикам (эталон) и возможностные по полным Tri
+CONDITION_MODES = ('peak', 'possibility', 'necessity')
+
+# Порог α степени выполнения условия по умолчанию
+POSSIBILITY_THRESHOLD = 0.5
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Метрики отклонения ΣΔE
+# ──────────────────────────────────────────────────────────────────────
+
+@dataclass(frozen=True)
+class DeviationMetric:
+    """
+    Метрика отклонения: term(d, e) — вклад условия (работает и с числами,
+    и с массивами NumPy), reduce — свёртка вкладов: 'sum', 'l2' (корень
+    суммы) или 'max'; peak_mode — метрика различает рёбра, допустимые
+    по пикам (False — только для возможностных режимов).
+    """
+    name: str
+    term: Callable
+    reduce: str = 'sum'
+    peak_mode: bool = True
+
+    def combine(self, em: float, eth: float) -> float:
+        """ΣΔE ребра из эмоциональной и этической частей."""
+        if self.reduce == 'l2':
+            return (em * em + eth * eth) ** 0.5
+        if self.reduce == 'max':
+            return max(em, eth)
+        return em + eth
+
+
+DEVIATION_METRICS: Dict[str, DeviationMetric] = {}
+
+
+def register_metric(name: str, term: Callable, reduce: str = 'sum',
+                    peak_mode: bool = True) -> DeviationMetric:
+    """Добавить метрику в реестр (под именем `name`)."""
+    if reduce not in ('sum', 'l2', 'max'):
+        raise ValueError(f"неизвестная свёртка {reduce!r} (допустимо: 'sum', 'l2', 'max')")
+    metric = DEVIATION_METRICS[name] = DeviationMetric(name, term, reduce, peak_mode)
+    return metric
+
+
+def get_metric(name: str) -> DeviationMetric:
+    try:
+        return DEVIATION_METRICS[name]
+    except KeyError:
+        raise ValueError(f"неизвестная метрика отклонения: {name!r} "
+                         f"(допустимо: {', '.join(map(repr, DEVIATION_METRICS))})"
+                         ) from None
+
+
+def check_metric_mode(metric: DeviationMetric, mode: str):
+    """ValueError, если метрика не различает рёбра в режиме условий `mode`."""
+    if mode == 'peak' and not metric.peak_mode:
+        raise ValueError(f"метрика {metric.name!r} применима только в режимах "
+                         f"'possibility' / 'necessity': по пикам все допустимые "
+                         f"рёбра получают ΣΔE = 0")
+
+
+register_metric('l1', lambda d, e: d)
+register_metric('l2', lambda d, e: d * d, 'l2')
+register_metric('chebyshev', lambda d, e: d, 'max')
+# (e + |e|) / 2 = max(0, e) — и для чисел, и для массивов
+register_metric('hinge', lambda d, e: (e + abs(e)) / 2.0, peak_mode=False)
+
+
+def weight_vector(weights: Optional[Dict[str, float]]) -> Optional[List[float]]:
+    """
+    Веса переменных {'emotion_<имя>' | 'ethic_<имя>': w} → список в
+    порядке VARIABLE_SLOTS (по умолчанию 1.0); None — без весов.
+    """
+    if weights is None:
+        return None
+    out = [1.0] * len(VARIABLE_SLOTS)
+    for key, w in weights.items():
+        if key.startswith('emotion_'):
+            slot = ('em', key[len('emotion_'):])
+        elif key.startswith('ethic_'):
+            slot = ('eth', key[len('ethic_'):])
+        else:
+            slot = None
+        if slot not in SLOT_INDEX:
+            raise ValueError(f"вес {key!r}: ожидается emotion_<имя> или ethic_<имя> "
+                             f"известной переменной")
+        out[SLOT_INDEX[slot]] = float(w)
+    return out
+
+
+def _reduce_segments(metric: DeviationMetric, contrib, seg, n_edges: int):
+    """Свёртка вкладов по рёбрам (seg — номер ребра условия), NumPy."""
+    if metric.reduce == 'max':
+        out = np.zeros(n_edges)
+        np.maximum.at(out, seg, contrib)
+        return out
+    out = np.bincount(seg, weights=contrib, minlength=n_edges)
+    return np.sqrt(out) if metric.reduce == 'l2' else out
+
+
+def reduce_rows(metric: DeviationMetric, contrib):
+    """Свёртка вкладов (N, K) по условиям → (N,) (NumPy)."""
+    if metric.reduce == 'max':
+        return contrib.max(axis=1, initial=0.0)
+    out = contrib.sum(axis=1)
+    return np.sqrt(out) if metric.reduce == 'l2' else out
+
+
+def combine_rows(metric: DeviationMetric, em, eth):
+    """`DeviationMetric.combine` для массивов частей (NumPy)."""
+    return np.maximum(em, eth) if metric.reduce == 'max' else metric.combine(em, eth)
+
+
+def _reduce_python(metric: DeviationMetric, contrib: List[float]) -> float:
+    if metric.reduce == 'max':
+        return max(contrib, default=0.0)
+    total = 0.0
+    for c in contrib:
+        total += c
+    return total ** 0.5 if metric.reduce == 'l2' else total
+
+
+def _parse_cond_key(key: str) -> Optional[Tuple[str, str, int]]:
+    """'cond_em_fear_le' → ('em', 'fear', OP_LE); прочие ключи → None."""
+    if not (key.endswith('_le') or key.endswith('_ge')):
+        return None
+    op = OP_LE if key.endswith('_le') else OP_GE
+    if key.startswith('cond_em_'):
+        return 'em', key[8:-3], op
+    if key.startswith('cond_eth_'):
+        return 'eth', key[9:-3], op
+    return None
+
+
+def is_packed(props: dict) -> bool:
+    return 'cond_pack_slots' in props
+
+
+def pack_conditions(props: dict, keep_named: bool = False) -> dict:
+    """
+    Перевести условия ребра в упакованную схему.
+
+    Порядок условий сохраняется (он определяет порядок сообщений о
+    нарушениях). При keep_named=True именованные свойства остаются —
+    ребро читается и старыми клиентами.
+    """
+    slots: List[int] = []
+    ops: List[int] = []
+    tri: List[float] = []
+    out = {}
+    for key, value in props.items():
+        parsed = _parse_cond_key(key)
+        if parsed is None:
+            out[key] = value
+            continue
+        kind, name, op = parsed
+        if (kind, name) not in SLOT_INDEX:
+            raise ValueError(f"условие {key}: неизвестная переменная {name!r}")
+        slots.append(SLOT_INDEX[(kind, name)])
+        ops.append(op)
+        if isinstance(value, (list, tuple)) and len(value) == 3:
+            tri.extend(float(v) for v in value)
+        else:
+            peak = get_peak(value)
+            tri.extend((peak, peak, peak))
+        if keep_named:
+            out[key] = value
+    out['cond_pack_slots'] = slots
+    out['cond_pack_ops'] = ops
+    out['cond_pack_tri'] = tri
+    return out
+
+
+def unpack_conditions(props: dict) -> dict:
+    """Обратное преобразование: именованные cond_* вместо массивов."""
+    if not is_packed(props):
+        return props
+    out = {k: v for k, v in props.items() if k not in PACK_KEYS}
+    tri = props['cond_pack_tri']
+    for i, (slot, op) in enumerate(zip(props['cond_pack_slots'],
+                                       props['cond_pack_ops'])):
+        kind, name = VARIABLE_SLOTS[int(slot)]
+        suffix = '_le' if int(op) == OP_LE else '_ge'
+        out[f'cond_{kind}_{name}{suffix}'] = [float(v) for v in tri[3 * i:3 * i + 3]]
+    return out
+
+
+def agent_peak_vector(emotional_model, ethical_model) -> List[float]:
+    """Пики агента в порядке VARIABLE_SLOTS."""
+    return ([emotional_model.get_peak(e) for e in ALL_EMOTIONS]
+            + [ethical_model.get_peak(e) for e in ALL_ETHICS])
+
+
+def agent_tri_vector(emotional_model, ethical_model) -> List[Sequence[float]]:
+    """Тройки Tri агента в порядке VARIABLE_SLOTS."""
+    em, eth = emotional_model.state, ethical_model.state
+    return ([em.get(e, ZERO_TRI) for e in ALL_EMOTIONS]
+            + [eth.get(e, ZERO_TRI) for e in ALL_ETHICS])
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Пакетное вычисление ΣΔE и допустимости
+# ──────────────────────────────────────────────────────────────────────
+
+def _failed_message(slot: int, op: int, agent: float, req: float) -> str:
+    name = VARIABLE_SLOTS[slot][1]
+    if op == OP_LE:
+        return f"{name}: {agent:.3f} > {req:.3f} (≤)"
+    return f"{name}: {agent:.3f} < {req:.3f} (≥)"
+
+
+def evaluate_packed(props_list: Sequence[dict], peaks: Sequence[float],
+                    eps: float = _EPS, metric: str = 'l1',
+                    weights: Optional[Sequence[float]] = None
+                    ) -> List[Tuple[float, float, bool, List[str]]]:
+    """
+    Для каждого упакованного ребра вычислить (em_dev, eth_dev,
+    допустимо, нарушенные_условия) — как `compute_deviation` обеих моделей
+    и `AgentNavigator.check_edge_conditions` для именованной схемы;
+    `eps` — допуск сравнения неравенств, `metric` — метрика отклонения
+    из DEVIATION_METRICS, `weights` — веса переменных (`weight_vector`).
+
+    Все условия всех рёбер обрабатываются одним проходом NumPy.
+    """
+    metric = get_metric(metric)
+    if np is None:
+        return [_evaluate_one_python(p, peaks, eps, metric, weights)
+                for p in props_list]
+    counts = [len(p['cond_pack_slots']) for p in props_list]
+    n_edges = len(props_list)
+    if not sum(counts):
+        return [(0.0, 0.0, True, []) for _ in props_list]
+    slots = np.fromiter((s for p in props_list for s in p['cond_pack_slots']),
+                        dtype=np.intp, count=sum(counts))
+    ops = np.fromiter((o for p in props_list for o in p['cond_pack_ops']),
+                      dtype=np.int8, count=sum(counts))
+    req = np.fromiter((t for p in props_list for t in p['cond_pack_tri']),
+                      dtype=np.float64, count=3 * sum(counts))[1::3]
+    seg = np.repeat(np.arange(n_edges), counts)
+    agent = np.asarray(peaks, dtype=np.float64)[slots]
+
+    dev = np.abs(req - agent)
+    is_em = slots < N_EMOTION_SLOTS
+    em_dev, eth_dev = _edge_deviations(metric, weights, dev, agent, req, ops,
+                                       slots, seg, is_em, n_edges)
+    violated = np.where(ops == OP_LE, agent > req + eps, agent < req - eps)
+
+    failed: List[List[str]] = [[] for _ in range(n_edges)]
+    for i in np.flatnonzero(violated):
+        failed[seg[i]].append(_failed_message(int(slots[i]), int(ops[i]),
+                                              float(agent[i]), float(req[i])))
+    return [(float(em_dev[k]), float(eth_dev[k]), not failed[k], failed[k])
+            for k in range(n_edges)]
+
+
+def _edge_deviations(metric: DeviationMetric, weights, dev, agent, req, ops,
+                     slots, seg, is_em, n_edges: int):
+    """Эмоциональная и этическая части ΣΔE всех рёбер (NumPy)."""
+    contrib = metric.term(dev, np.where(ops == OP_LE, agent - req, req - agent))
+    if weights is not None:
+        contrib = contrib * np.asarray(weights, dtype=np.float64)[slots]
+    return (_reduce_segments(metric, contrib[is_em], seg[is_em], n_edges),
+            _reduce_segments(metric, contrib[~is_em], seg[~is_em], n_edges))
+
+
+def _evaluate_one_python(props: dict, peaks: Sequence[float], eps: float = _EPS,
+                         metric: Optional[DeviationMetric] = None,
+                         weights: Optional[Sequence[float]] = None
+                         ) -> Tuple[float, float, bool, List[str]]:
+    metric = metric or DEVIATION_METRICS['l1']
+    em: List[float] = []
+    eth: List[float] = []
+    failed: List[str] = []
+    tri = props['cond_pack_tri']
+    for i, (slot, op) in enumerate(zip(props['cond_pack_slots'],
+                                       props['cond_pack_ops'])):
+        agent, req = peaks[slot], float(tri[3 * i + 1])
+        excess = agent - req if op == OP_LE else req - agent
+        contrib = metric.term(abs(req - agent), excess)
+        if weights is not None:
+            contrib *= weights[slot]
+        (em if slot < N_EMOTION_SLOTS else eth).append(contrib)
+        if (agent > req + eps) if op == OP_LE else (agent < req - eps):
+            failed.append(_failed_message(slot, op, agent, req))
+    return (_reduce_python(metric, em), _reduce_python(metric, eth),
+            not failed, failed)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Возможностная оценка условий по полным тройкам Tri
+# ──────────────────────────────────────────────────────────────────────
+
+def possibility_le(x: Sequence[float], y: Sequence[float],
+                   eps: float = _EPS) -> float:
+    """Π(X ≤ Y) для треугольных чисел X, Y = (a, b, c)."""
+    if x[1] <= y[1] + eps:
+        return 1.0
+    if x[0] >= y[2]:
+        return 0.0
+    return min(1.0, (y[2] - x[0]) / ((x[1] - x[0]) + (y[2] - y[1])))
+
+
+def necessity_le(x: Sequence[float], y: Sequence[float],
+                 eps: float = _EPS) -> float:
+    """N(X ≤ Y) = 1 − Π(Y < X)."""
+    if y[1] < x[1] - eps:
+        return 0.0
+    if y[0] >= x[2] - eps:
+        return 1.0
+    return max(0.0, 1.0 - (x[2] - y[0]) / ((y[1] - y[0]) + (x[2] - x[1])))
+
+
+def fuzzy_distance(x: Sequence[float], y: Sequence[float]) -> float:
+    """d(X, Y) = (|Δa| + 2·|Δb| + |Δc|) / 4."""
+    return (abs(x[0] - y[0]) + 2.0 * abs(x[1] - y[1]) + abs(x[2] - y[2])) / 4.0
+
+
+def _degree_message(slot: int, op: int, mode: str, degree: float,
+                    threshold: float) -> str:
+    name = VARIABLE_SLOTS[slot][1]
+    symbol = 'Π' if mode == 'possibility' else 'N'
+    sign = '≤' if op == OP_LE else '≥'
+    return f"{name}: {symbol}({sign}) = {degree:.3f} < {threshold:.3f}"
+
+
+def _check_mode(mode: str):
+    if mode not in CONDITION_MODES[1:]:
+        raise ValueError(f"неизвестный возможностный режим: {mode!r} "
+                         f"(допустимо: 'possibility', 'necessity')")
+
+
+def evaluate_possibilistic(props_list: Sequence[dict],
+                           agent_tri: Sequence[Sequence[float]],
+                           mode: str = 'possibility',
+                           threshold: float = POSSIBILITY_THRESHOLD,
+                           eps: float = _EPS, metric: str = 'l1',
+                           weights: Optional[Sequence[float]] = None
+                           ) -> List[Tuple[float, float, bool, List[str], float]]:
+    """
+    Для каждого упакованного ребра вычислить (em_dev, eth_dev, допустимо,
+    нарушенные_условия, степень) по полным тройкам: отклонения — нечёткие
+    расстояния d(X, Y), допустимость — все степени Π или N (`mode`)
+    не меньше `threshold`, степень ребра — минимум по его условиям
+    (1.0 без условий). Метрика `metric` сворачивает нечёткие расстояния
+    (превышение для 'hinge' — по пикам), `weights` — как в evaluate_packed.
+
+    `agent_tri` — 27 троек агента в порядке VARIABLE_SLOTS
+    (`agent_tri_vector`). Все условия всех рёбер — один проход NumPy.
+    """
+    _check_mode(mode)
+    metric = get_metric(metric)
+    if np is None:
+        return [_evaluate_possibilistic_python(p, agent_tri, mode, threshold, eps,
+                                               metric, weights)
+                for p in props_list]
+    counts = [len(p['cond_pack_slots']) for p in props_list]
+    n_edges = len(props_list)
+    total = sum(counts)
+    if not total:
+        return [(0.0, 0.0, True, [], 1.0) for _ in props_list]
+    slots = np.fromiter((s for p in props_list for s in p['cond_pack_slots']),
+                        dtype=np.intp, count=total)
+    ops = np.fromiter((o for p in props_list for o in p['cond_pack_ops']),
+                      dtype=np.int8, count=total)
+    req = np.fromiter((t for p in props_list for t in p['cond_pack_tri']),
+                      dtype=np.float64, count=3 * total).reshape(total, 3)
+    seg = np.repeat(np.arange(n_edges), counts)
+    agent = np.asarray(agent_tri, dtype=np.float64).reshape(-1, 3)[slots]
+
+    # X ≤ Y: для '≤' X — агент, Y — порог; для '≥' наоборот
+    le = (ops == OP_LE)[:, None]
+    x = np.where(le, agent, req)
+    y = np.where(le, req, agent)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if mode == 'possibility':
+            ratio = (y[:, 2] - x[:, 0]) / ((x[:, 1] - x[:, 0]) + (y[:, 2] - y[:, 1]))
+            degree = np.where(x[:, 1] <= y[:, 1] + eps, 1.0,
+                              np.where(x[:, 0] >= y[:, 2], 0.0,
+                                       np.minimum(1.0, ratio)))
+        else:
+            ratio = (x[:, 2] - y[:, 0]) / ((y[:, 1] - y[:, 0]) + (x[:, 2] - x[:, 1]))
+            degree = np.where(y[:, 1] < x[:, 1] - eps, 0.0,
+                              np.where(y[:, 0] >= x[:, 2] - eps, 1.0,
+                                       np.maximum(0.0, 1.0 - ratio)))
+
+    diff = np.abs(agent - req)
+    dev = (diff[:, 0] + 2.0 * diff[:, 1] + diff[:, 2]) / 4.0
+    is_em = slots < N_EMOTION_SLOTS
+    em_dev, eth_dev = _edge_deviations(metric, weights, dev, agent[:, 1], req[:, 1],
+                                       ops, slots, seg, is_em, n_edges)
+    edge_degree = np.ones(n_edges)
+    np.minimum.at(edge_degree, seg, degree)
+    violated = degree < threshold - eps
+
+    failed: List[List[str]] = [[] for _ in range(n_edges)]
+    for i in np.flatnonzero(violated):
+        failed[seg[i]].append(_degree_message(int(slots[i]), int(ops[i]), mode,
+                                              float(degree[i]), threshold))
+    return [(float(em_dev[k]), float(eth_dev[k]), not failed[k], failed[k],
+             float(edge_degree[k])) for k in range(n_edges)]
+
+
+def _evaluate_possibilistic_python(props: dict, agent_tri: Sequence[Sequence[float]],
+                                   mode: str, threshold: float, eps: float,
+                                   metric: Optional[DeviationMetric] = None,
+                                   weights: Optional[Sequence[float]] = None
+                                   ) -> Tuple[float, float, bool, List[str], float]:
+    degree_fn = possibility_le if mode == 'possibility' else necessity_le
+    metric = metric or DEVIATION_METRICS['l1']
+    em: List[float] = []
+    eth: List[float] = []
+    edge_degree = 1.0
+    failed: List[str] = []
+    tri = props['cond_pack_tri']
+    for i, (slot, op) in enumerate(zip(props['cond_pack_slots'],
+                                       props['cond_pack_ops'])):
+        agent, req = agent_tri[slot], [float(v) for v in tri[3 * i:3 * i + 3]]
+        excess = agent[1] - req[1] if op == OP_LE else req[1] - agent[1]
+        contrib = metric.term(fuzzy_distance(agent, req), excess)
+        if weights is not None:
+            contrib *= weights[slot]
+        (em if slot < N_EMOTION_SLOTS else eth).append(contrib)
+        degree = (degree_fn(agent, req, eps) if op == OP_LE
+                  else degree_fn(req, agent, eps))
+        edge_degree = min(edge_degree, degree)
+        if degree < threshold - eps:
+            failed.append(_degree_message(slot, op, mode, degree, threshold))
+    return (_reduce_python(metric, em), _reduce_python(metric, eth),
+            not failed, failed, edge_degree)
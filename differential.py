@@ -0,0 +1,457 @@
+"""
+Дифференциальное тестирование быстрых реализаций против эталона.
+
+Эталон — навигатор на чистом Python: `AgentNavigator` со словарным
+состоянием (state_backend='python') и интерпретатором TSK-правил
+(rule_backend по умолчанию). Каждая быстрая реализация описана
+`BackendSpec` — фабрикой навигатора и допуском сравнения:
+
+    rules:<имя>    движки tsk_engine.RULE_BACKENDS (numpy, codegen, …)
+    array-state    состояние в массивах (array_models)
+    edge-cache     LRU-кеш окрестностей узлов
+    packed-graph   упакованные условия рёбер (condition_pack)
+    jsonl-store    сеть, сохранённая и прочитанная из JSON Lines
+
+Приближённые реализации (таблицы LUT, TSKMemo, float32 / fixed16) — в
+APPROXIMATE_BACKENDS, по умолчанию не запускаются.
+
+Генератор случайных случаев (`make_case`) строит профиль агента, базы
+эмоциональных и этических правил (rule_generator) и сценарную сеть
+(scenario_generator). Для каждого случая все реализации проходят сеть
+бок о бок с одинаковым зерном `random` (ничьи разрешаются одинаково);
+сравниваются выбранные рёбра, Sem / Seth и пики всех 27 переменных
+после каждого шага. Первое расхождение сужается жадным перебором
+(`shrink`): сеть — до узлов пути до расхождения, затем по одному
+удаляются рёбра, правила и переменные профиля, пока расхождение
+сохраняется. Итог — `Reproducer`: минимальный случай в JSON, который
+воспроизводится `python differential.py --replay файл.json`.
+
+Запуск:
+    python differential.py --cases 50
+    python differential.py --cases 20 --backends rules:lut --approximate
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import tempfile
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from agent_navigator import AgentNavigator
+from condition_pack import agent_peak_vector, pack_conditions
+from emotional_model import ALL_EMOTIONS
+from ethical_model import ALL_ETHICS
+from rule_generator import generate_rule_base
+from scenario_generator import generate_scenario, random_profile
+from scenario_graph import ScenarioGraph
+from tsk_engine import RULE_BACKENDS, TSKMemo
+
+# Предел шагов одного прогона (сети со случайными циклами)
+MAX_STEPS = 50
+
+# Допуски сравнения Sem / Seth: значения округлены до 4 знаков, поэтому
+# разница в ulp может сдвинуть округление на одну единицу
+SCORE_TOLERANCE = 1e-4 + 1e-12
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Случаи и реализации
+# ──────────────────────────────────────────────────────────────────────
+
+@dataclass
+class Case:
+    """Случай: профиль, базы правил (None — встроенные), сеть и старт."""
+    seed: int
+    profile: Dict[str, List[float]]
+    nodes: List[dict]
+    edges: List[dict]
+    start: str
+    em_rules: Optional[List[dict]] = None
+    eth_rules: Optional[List[dict]] = None
+
+    def size(self) -> Dict[str, int]:
+        return {'nodes': len(self.nodes), 'edges': len(self.edges),
+                'em_rules': len(self.em_rules or ()),
+                'eth_rules': len(self.eth_rules or ()),
+                'profile': len(self.profile)}
+
+    def to_json(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Case':
+        return cls(**data)
+
+
+@dataclass
+class BackendSpec:
+    """
+    Реализация для сравнения: factory(case) → навигатор с подключённой
+    сетью; state_tolerance — допуск по пикам (0 — побитовое совпадение).
+    """
+    name: str
+    factory: Callable[[Case], AgentNavigator]
+    state_tolerance: float = 1e-9
+
+
+def _graph(case: Case) -> ScenarioGraph:
+    return ScenarioGraph.from_lists(copy.deepcopy(case.nodes),
+                                    copy.deepcopy(case.edges))
+
+
+def _packed_graph(case: Case) -> ScenarioGraph:
+    return ScenarioGraph.from_lists(copy.deepcopy(case.nodes),
+                                    [pack_conditions(e) for e in case.edges])
+
+
+def _jsonl_graph(case: Case) -> ScenarioGraph:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'case.jsonl')
+        _graph(case).save_jsonl(path)
+        return ScenarioGraph.load_jsonl(path)
+
+
+def reference_backend() -> BackendSpec:
+    return BackendSpec('reference', lambda case: AgentNavigator(graph=_graph(case)), 0.0)
+
+
+def _rules_backend(name: str, tolerance: float = 1e-9) -> BackendSpec:
+    return BackendSpec(f'rules:{name}',
+                       lambda case: AgentNavigator(graph=_graph(case), rule_backend=name),
+                       tolerance)
+
+
+def default_backends() -> List[BackendSpec]:
+    """Реализации, обязанные совпадать с эталоном (с точностью до ulp)."""
+    specs = [_rules_backend(name) for name in RULE_BACKENDS if name != 'lut']
+    specs += [
+        BackendSpec('array-state',
+                    lambda case: AgentNavigator(graph=_graph(case), state_backend='numpy')),
+        BackendSpec('edge-cache',
+                    lambda case: AgentNavigator(graph=_graph(case), cache_bytes=1 << 20),
+                    0.0),
+        BackendSpec('packed-graph',
+                    lambda case: AgentNavigator(graph=_packed_graph(case)), 0.0),
+        BackendSpec('jsonl-store',
+                    lambda case: AgentNavigator(graph=_jsonl_graph(case)), 0.0),
+    ]
+    return specs
+
+
+APPROXIMATE_BACKENDS: Dict[str, Callable[[], BackendSpec]] = {
+    'rules:lut': lambda: _rules_backend('lut', 1e-2),
+    'tsk-memo': lambda: BackendSpec(
+        'tsk-memo', lambda case: AgentNavigator(graph=_graph(case),
+                                                tsk_memo=TSKMemo(grid=1e-3)), 1e-2),
+    'float32': lambda: BackendSpec(
+        'float32', lambda case: AgentNavigator(graph=_graph(case), state_backend='numpy',
+                                               state_precision='float32'), 1e-6),
+    'fixed16': lambda: BackendSpec(
+        'fixed16', lambda case: AgentNavigator(graph=_graph(case), state_backend='numpy',
+                                               state_precision='fixed16'), 1e-3),
+}
+
+
+def make_case(seed: int, n_nodes: int = 30, n_em_rules: int = 20,
+              n_eth_rules: int = 10, cycle_prob: float = 0.4) -> Case:
+    """
+    Случайный случай: профиль, базы правил и сеть по зерну `seed`.
+
+    Сеть глубокая, с частыми обратными рёбрами, редкими условиями и
+    низкими барьерами — чтобы пути были длинными (в среднем ~10 шагов)
+    и расхождения успевали накопиться.
+    """
+    rng = random.Random(seed)
+    nodes, edges = generate_scenario(n_nodes=n_nodes, depth=max(2, n_nodes // 3),
+                                     cycle_prob=cycle_prob, cond_density=0.02,
+                                     update_density=0.15, barrier_range=(0.0, 0.5),
+                                     seed=rng.randrange(1 << 30), prefix='D')
+    return Case(
+        seed=seed,
+        profile=random_profile(rng),
+        nodes=nodes,
+        edges=edges,
+        start='D0',
+        em_rules=generate_rule_base(n_em_rules, ALL_EMOTIONS,
+                                    seed=rng.randrange(1 << 30)),
+        eth_rules=generate_rule_base(n_eth_rules, ALL_ETHICS, priorities=True,
+                                     seed=rng.randrange(1 << 30)))
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Прогон и сравнение
+# ──────────────────────────────────────────────────────────────────────
+
+# Снимок шага: (ребро, узел, Sem, Seth, пики 27 переменных); шаг 0 —
+# начальное состояние (ребро и узел — None и старт)
+Snapshot = Tuple[Optional[str], str, float, float, Tuple[float, ...]]
+
+
+def run_case(case: Case, spec: BackendSpec, max_steps: int = MAX_STEPS) -> List[Snapshot]:
+    """Прогнать случай реализацией `spec` и собрать снимки по шагам."""
+    random.seed(case.seed)
+    nav = spec.factory(case)
+    with contextlib.redirect_stdout(io.StringIO()):
+        nav.init_agent(copy.deepcopy(case.profile))
+    if case.em_rules is not None:
+        nav.emotional_model.rules = case.em_rules
+    if case.eth_rules is not None:
+        nav.ethical_model.rules = case.eth_rules
+    em, eth = nav.emotional_model, nav.ethical_model
+    trace = [(None, case.start, em.compute_sem(), eth.compute_seth(),
+              tuple(agent_peak_vector(em, eth)))]
+    current = case.start
+    for _ in range(max_steps):
+        result = nav.step(current)
+        if result is None:
+            break
+        current = result.to_node
+        trace.append((result.edge_id, current, result.sem, result.seth,
+                      tuple(agent_peak_vector(nav.emotional_model, nav.ethical_model))))
+    return trace
+
+
+@dataclass
+class Divergence:
+    """Первое расхождение реализации с эталоном на шаге `step`."""
+    backend: str
+    seed: int
+    step: int
+    kind: str                   # 'edge' | 'length' | 'sem' | 'seth' | 'state'
+    expected: object
+    actual: object
+
+    def format(self) -> str:
+        return (f"{self.backend}, случай {self.seed}, шаг {self.step}: "
+                f"{self.kind} — эталон {self.expected!r}, получено {self.actual!r}")
+
+
+def compare_traces(ref: List[Snapshot], got: List[Snapshot], spec: BackendSpec,
+                   seed: int = 0) -> Optional[Divergence]:
+    """
+    Первое расхождение трасс (None — совпадают в пределах допусков).
+    Sem / Seth сравниваются с допуском не меньше state_tolerance реализации.
+    """
+    score_tolerance = max(SCORE_TOLERANCE, spec.state_tolerance)
+    for step, (r, g) in enumerate(zip(ref, got)):
+        if r[0] != g[0]:
+            return Divergence(spec.name, seed, step, 'edge', r[0], g[0])
+        for kind, i in (('sem', 2), ('seth', 3)):
+            if abs(r[i] - g[i]) > score_tolerance:
+                return Divergence(spec.name, seed, step, kind, r[i], g[i])
+        diffs = [abs(a - b) for a, b in zip(r[4], g[4])]
+        worst = max(range(len(diffs)), key=diffs.__getitem__)
+        if diffs[worst] > spec.state_tolerance:
+            names = ALL_EMOTIONS + ALL_ETHICS
+            return Divergence(spec.name, seed, step, 'state',
+                              (names[worst], r[4][worst]), (names[worst], g[4][worst]))
+    if len(ref) != len(got):
+        step = min(len(ref), len(got))
+        return Divergence(spec.name, seed, step, 'length', len(ref) - 1, len(got) - 1)
+    return None
+
+
+def check_case(case: Case, spec: BackendSpec,
+               reference: Optional[BackendSpec] = None) -> Optional[Divergence]:
+    """Сравнить реализацию с эталоном на одном случае."""
+    reference = reference or reference_backend()
+    return compare_traces(run_case(case, reference), run_case(case, spec), spec,
+                          case.seed)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Сужение случая до минимального воспроизведения
+# ──────────────────────────────────────────────────────────────────────
+
+def _restrict_to_path(case: Case, divergence: Divergence) -> Case:
+    """Оставить узлы пути эталона до шага расхождения и их исходящие рёбра."""
+    trace = run_case(case, reference_backend())
+    on_path = {snap[1] for snap in trace[:divergence.step + 1]}
+    edges = [e for e in case.edges if e['from'] in on_path]
+    keep = on_path | {e['to'] for e in edges}
+    nodes = [n for n in case.nodes if n['id'] in keep]
+    return Case(case.seed, case.profile, nodes, edges, case.start,
+                case.em_rules, case.eth_rules)
+
+
+def _shrink_list(items: list, still_fails: Callable[[list], bool]) -> list:
+    """Жадное удаление: сначала блоками (половины, четверти, …), затем по одному."""
+    chunk = max(1, len(items) // 2)
+    while True:
+        i = 0
+        while i < len(items):
+            candidate = items[:i] + items[i + chunk:]
+            if still_fails(candidate):
+                items = candidate
+            else:
+                i += chunk
+        if chunk == 1:
+            return items
+        chunk = max(1, chunk // 2)
+
+
+def shrink(case: Case, spec: BackendSpec, divergence: Divergence) -> Case:
+    """Минимизировать случай, сохраняя расхождение реализации `spec`."""
+    def fails(candidate: Case) -> bool:
+        try:
+            return check_case(candidate, spec) is not None
+        except Exception:
+            return False
+
+    restricted = _restrict_to_path(case, divergence)
+    if fails(restricted):
+        case = restricted
+
+    def with_(**changes) -> Case:
+        fields = {**asdict(case), **changes}
+        return Case(**fields)
+
+    case = with_(edges=_shrink_list(case.edges, lambda e: fails(with_(edges=e))))
+    if case.em_rules is not None:
+        case = with_(em_rules=_shrink_list(case.em_rules,
+                                           lambda r: fails(with_(em_rules=r))))
+    if case.eth_rules is not None:
+        case = with_(eth_rules=_shrink_list(case.eth_rules,
+                                            lambda r: fails(with_(eth_rules=r))))
+    keys = _shrink_list(sorted(case.profile),
+                        lambda k: fails(with_(profile={x: case.profile[x] for x in k})))
+    case = with_(profile={k: case.profile[k] for k in keys})
+    used = {case.start} | {e['from'] for e in case.edges} | {e['to'] for e in case.edges}
+    return with_(nodes=[n for n in case.nodes if n['id'] in used])
+
+
+@dataclass
+class Reproducer:
+    """Минимальный случай, на котором реализация расходится с эталоном."""
+    backend: str
+    case: Case
+    divergence: Divergence
+
+    def to_json(self) -> dict:
+        return {'backend': self.backend, 'case': self.case.to_json(),
+                'divergence': asdict(self.divergence)}
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str) -> 'Reproducer':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['backend'], Case.from_json(data['case']),
+                   Divergence(**data['divergence']))
+
+    def format(self) -> str:
+        size = ', '.join(f"{k} {v}" for k, v in self.case.size().items())
+        return f"Воспроизведение ({self.backend}): {size}\n  {self.divergence.format()}"
+
+
+@dataclass
+class DifferentialReport:
+    """Итог: число случаев, реализации, расхождения и воспроизведение первого."""
+    cases: int
+    backends: List[str]
+    divergences: List[Divergence] = field(default_factory=list)
+    reproducer: Optional[Reproducer] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.divergences
+
+    def format(self) -> str:
+        lines = [f"Дифференциальный прогон: {self.cases} случаев × "
+                 f"{len(self.backends)} реализаций — "
+                 + ("расхождений нет ✓" if self.ok
+                    else f"расхождений {len(self.divergences)}")]
+        for d in self.divergences:
+            lines.append(f"  ✗ {d.format()}")
+        if self.reproducer is not None:
+            lines.append(self.reproducer.format())
+        return "\n".join(lines)
+
+
+def run_differential(n_cases: int = 20, backends: Optional[Sequence[BackendSpec]] = None,
+                     seed: int = 0, stop_on_first: bool = True,
+                     minimize: bool = True, **case_kwargs) -> DifferentialReport:
+    """
+    Прогнать `n_cases` случайных случаев (зёрна seed, seed + 1, …) всеми
+    реализациями. Первое расхождение сужается до `Reproducer`; при
+    stop_on_first=False собираются первые расхождения всех реализаций.
+    """
+    backends = list(backends) if backends is not None else default_backends()
+    reference = reference_backend()
+    report = DifferentialReport(n_cases, [b.name for b in backends])
+    failed = set()
+    for case_seed in range(seed, seed + n_cases):
+        case = make_case(case_seed, **case_kwargs)
+        ref = run_case(case, reference)
+        for spec in backends:
+            if spec.name in failed:
+                continue
+            divergence = compare_traces(ref, run_case(case, spec), spec, case_seed)
+            if divergence is None:
+                continue
+            failed.add(spec.name)
+            report.divergences.append(divergence)
+            if report.reproducer is None:
+                small = shrink(case, spec, divergence) if minimize else case
+                report.reproducer = Reproducer(spec.name, small,
+                                               check_case(small, spec) or divergence)
+            if stop_on_first:
+                return report
+    return report
+
+
+def _backend_by_name(name: str) -> BackendSpec:
+    for spec in default_backends():
+        if spec.name == name:
+            return spec
+    if name in APPROXIMATE_BACKENDS:
+        return APPROXIMATE_BACKENDS[name]()
+    raise ValueError(f"неизвестная реализация: {name!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Дифференциальное тестирование реализаций против эталона')
+    parser.add_argument('--cases', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--nodes', type=int, default=30)
+    parser.add_argument('--backends', nargs='+', default=None,
+                        help='Имена реализаций (по умолчанию — все точные)')
+    parser.add_argument('--approximate', action='store_true',
+                        help='Добавить приближённые реализации (LUT, memo, float32, fixed16)')
+    parser.add_argument('--all', action='store_true',
+                        help='Не останавливаться на первом расхождении')
+    parser.add_argument('--out', help='Файл JSON для минимального воспроизведения')
+    parser.add_argument('--replay', help='Перепроверить сохранённое воспроизведение')
+    args = parser.parse_args()
+
+    if args.replay:
+        repro = Reproducer.load(args.replay)
+        divergence = check_case(repro.case, _backend_by_name(repro.backend))
+        print(divergence.format() if divergence else 'Расхождение не воспроизводится ✓')
+        return
+
+    if args.backends:
+        backends = [_backend_by_name(n) for n in args.backends]
+    else:
+        backends = default_backends()
+        if args.approximate:
+            backends += [make() for make in APPROXIMATE_BACKENDS.values()]
+    report = run_differential(args.cases, backends, args.seed,
+                              stop_on_first=not args.all, n_nodes=args.nodes)
+    print(report.format())
+    if report.reproducer is not None and args.out:
+        report.reproducer.save(args.out)
+        print(f"Сохранено: {args.out}")
+
+
+if __name__ == '__main__':
+    main()
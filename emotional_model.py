@@ -8,7 +8,7 @@
 эмоциональное состояние агента.
 """
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, NamedTuple, Sequence, Tuple
 
 
 # ──────────────────────────────────────────────────────────────────────
@@ -38,6 +38,34 @@ def tri_membership(x: float, a: float, b: float, c: float) -> float:
     return (c - x) / (c - b) if (c - b) > 1e-9 else 1.0
 
 
+class Tri(NamedTuple):
+    """
+    Значение характеристики агента — тройка Tri(a, b, c).
+
+    Неизменяемый кортеж из трёх float (без __dict__): занимает меньше
+    памяти, чем список, и может разделяться между состояниями без
+    копирования. Индексация (tri[1]), распаковка и сравнение с кортежами
+    работают как раньше; операции возвращают новую тройку.
+    """
+    a: float
+    b: float
+    c: float
+
+    @property
+    def peak(self) -> float:
+        return self.b
+
+    def shift(self, delta: float) -> 'Tri':
+        return shift_tri(self, delta)
+
+    def __str__(self) -> str:
+        return format_tri(self)
+
+
+# Конструктор без проверок — для горячего пути shift_tri / make_tri
+_new_tri = tuple.__new__
+
+
 def get_peak(tri) -> float:
     """Возвращает пиковое значение (b) треугольной функции Tri(a, b, c)."""
     if isinstance(tri, (list, tuple)) and len(tri) == 3:
@@ -45,27 +73,32 @@ def get_peak(tri) -> float:
     return float(tri) if isinstance(tri, (int, float)) else 0.0
 
 
-def make_tri(value) -> List[float]:
-    """Нормализует значение в формат [a, b, c]."""
+def make_tri(value) -> Tri:
+    """Нормализует значение в Tri(a, b, c) (Tri возвращается как есть)."""
+    if type(value) is Tri:
+        return value
     if isinstance(value, (list, tuple)) and len(value) == 3:
-        return [float(value[0]), float(value[1]), float(value[2])]
+        return _new_tri(Tri, (float(value[0]), float(value[1]), float(value[2])))
     v = float(value) if isinstance(value, (int, float)) else 0.0
     # Скалярное значение → симметричная тройка с шириной 0.1
-    return [max(0.0, v - 0.1), v, min(1.0, v + 0.1)]
+    return _new_tri(Tri, (max(0.0, v - 0.1), v, min(1.0, v + 0.1)))
 
 
-def shift_tri(tri: List[float], delta: float) -> List[float]:
+def shift_tri(tri, delta: float) -> Tri:
     """
-    Сдвигает всю треугольную функцию на delta: [a+δ, b+δ, c+δ].
+    Сдвигает всю треугольную функцию на delta: Tri(a+δ, b+δ, c+δ).
 
     Каждая компонента ограничивается отрезком [0, 1]. Так как ограничение
     монотонно и все три точки сдвигаются на одну и ту же дельту,
     инвариант a ≤ b ≤ c сохраняется.
     """
-    return [max(0.0, min(1.0, v + delta)) for v in tri]
+    a, b, c = tri
+    return _new_tri(Tri, (max(0.0, min(1.0, a + delta)),
+                          max(0.0, min(1.0, b + delta)),
+                          max(0.0, min(1.0, c + delta))))
 
 
-def format_tri(tri: List[float]) -> str:
+def format_tri(tri) -> str:
     """Форматирует тройку для вывода."""
     return f"Tri({tri[0]:.2f}, {tri[1]:.2f}, {tri[2]:.2f})"
 
@@ -74,6 +107,8 @@ def format_tri(tri: List[float]) -> str:
 #  Лингвистические термы для эмоций
 # ──────────────────────────────────────────────────────────────────────
 
+# Треугольные термы (a, b, c); допустимы и термы других форм вида
+# ('trap' | 'gauss' | 'sigmoid', *параметры) — см. membership_shapes
 EMOTION_TERMS = {
     'low':    (0.0, 0.0, 0.4),
     'medium': (0.2, 0.5, 0.8),
@@ -178,8 +213,94 @@ NEGATIVE_EMOTIONS = [
     'disgust', 'envy', 'jealousy', 'contempt',
 ]
 
-# Нулевая тройка
-ZERO_TRI = [0.0, 0.0, 0.0]
+# Нулевая тройка (неизменяемая — разделяется всеми состояниями)
+ZERO_TRI = Tri(0.0, 0.0, 0.0)
+
+
+class TriState(dict):
+    """
+    Состояние модели {имя: Tri} с текущими суммами пиков групп переменных.
+
+    groups — {имя: номер группы}; `sums[g]` — сумма пиков переменных
+    группы g, обновляемая при каждой записи (`state[name] = tri`, update,
+    удаление), поэтому Sem / Seth вычисляются за O(1) без обхода
+    переменных. Суммы накапливают погрешность округления порядка 1e-15
+    на запись; `resync()` пересчитывает их заново.
+    """
+
+    def __init__(self, items, groups: Dict[str, int], n_groups: int):
+        super().__init__(items)
+        self.groups = groups
+        self.sums = [0.0] * n_groups
+        self.resync()
+
+    def resync(self):
+        """Пересчитать суммы групп по текущим значениям."""
+        sums = [0.0] * len(self.sums)
+        for name, tri in self.items():
+            g = self.groups.get(name)
+            if g is not None:
+                sums[g] += tri[1]
+        self.sums = sums
+
+    def __setitem__(self, name, tri, _get=dict.get, _set=dict.__setitem__):
+        g = self.groups.get(name)
+        if g is not None:
+            old = _get(self, name)
+            self.sums[g] += tri[1] - (old[1] if old is not None else 0.0)
+        _set(self, name, tri)
+
+    def __delitem__(self, name):
+        g = self.groups.get(name)
+        if g is not None:
+            self.sums[g] -= self[name][1]
+        dict.__delitem__(self, name)
+
+    def update(self, *args, **kwargs):
+        for name, tri in dict(*args, **kwargs).items():
+            self[name] = tri
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def pop(self, name, *default):
+        if name in self:
+            tri = self[name]
+            del self[name]
+            return tri
+        return dict.pop(self, name, *default)
+
+    def popitem(self):
+        name, tri = dict.popitem(self)
+        g = self.groups.get(name)
+        if g is not None:
+            self.sums[g] -= tri[1]
+        return name, tri
+
+    def clear(self):
+        dict.clear(self)
+        self.sums = [0.0] * len(self.sums)
+
+    def __reduce__(self):
+        # Суммы копируются как есть, а не пересчитываются
+        return (self.__class__, (dict(self), self.groups, len(self.sums)),
+                {'sums': list(self.sums)})
+
+
+# Группы переменных для сумм пиков TriState: 0 — позитивные, 1 — негативные
+SEM_GROUPS: Dict[str, int] = {**{e: 0 for e in POSITIVE_EMOTIONS},
+                              **{e: 1 for e in NEGATIVE_EMOTIONS}}
+
+
+def _check_sums(label: str, running: Sequence[float], full: Sequence[float],
+                tol: float = 1e-9):
+    """Сверка текущих сумм TriState с полным пересчётом (check_aggregates)."""
+    for g, (got, want) in enumerate(zip(running, full)):
+        if abs(got - want) > tol:
+            raise AssertionError(f"{label}: сумма группы {g} разошлась с пересчётом: "
+                                 f"{got!r} ≠ {want!r}")
 
 
 class EmotionalModel:
@@ -190,9 +311,27 @@ class EmotionalModel:
     Применяет TSK-правила для обновления эмоций после каждого перехода.
     """
 
-    def __init__(self):
-        self.state: Dict[str, List[float]] = {e: list(ZERO_TRI) for e in ALL_EMOTIONS}
+    # Отладка: сверять O(1)-значение Sem с полным пересчётом по пикам
+    check_aggregates: bool = False
+
+    def __init__(self, rule_backend: str = 'python'):
+        # Суммы пиков позитивных и негативных эмоций ведутся при записи
+        self.state: Dict[str, Tri] = TriState(
+            {e: ZERO_TRI for e in ALL_EMOTIONS}, SEM_GROUPS, 2)
         self.rules = EMOTION_TSK_RULES
+        # Лингвистические термы, на которые ссылаются условия правил
+        # (заменяются вместе с rules при загрузке базы из файла — rule_files)
+        self.terms = EMOTION_TERMS
+        # Реализация TSK-вывода: 'python' — эталонный интерпретатор правил
+        # ниже; иначе — движок из tsk_engine.RULE_BACKENDS (например, 'numpy');
+        # 'auto' — лучший доступный (tsk_engine.resolve_rule_backend).
+        if rule_backend == 'auto':
+            from tsk_engine import resolve_rule_backend
+            rule_backend = resolve_rule_backend(rule_backend)
+        self.rule_backend = rule_backend
+        # Необязательный кеш вывода по квантованному состоянию
+        # (tsk_engine.TSKMemo), общий для популяции агентов
+        self.tsk_memo = None
         # Список (rule_id, w, description) — заполняется на каждом apply_tsk_rules.
         # Используется внешними интерфейсами (Streamlit и т. п.) для отображения
         # активированных правил без перехвата stdout.
@@ -210,7 +349,7 @@ class EmotionalModel:
         tri = self.state.get(emotion_name, ZERO_TRI)
         return tri[1]
 
-    def get_all(self) -> Dict[str, List[float]]:
+    def get_all(self) -> Dict[str, Tri]:
         """Получить все эмоции с префиксом emotion_."""
         return {f'emotion_{k}': v for k, v in self.state.items()}
 
@@ -238,8 +377,13 @@ class EmotionalModel:
         activations = []
         for emotion_name, term_name in rule['conditions'].items():
             peak = self.get_peak(emotion_name)
-            term_params = EMOTION_TERMS[term_name]
-            mu = tri_membership(peak, *term_params)
+            try:
+                mu = tri_membership(peak, *self.terms[term_name])
+            except (KeyError, TypeError):
+                # Терм другой формы или спецификация в самом правиле
+                # (membership_shapes); треугольники идут без проверок
+                from membership_shapes import membership
+                mu = membership(peak, term_name, self.terms)
             activations.append(mu)
         return min(activations) if activations else 0.0
 
@@ -255,6 +399,10 @@ class EmotionalModel:
         Сдвигает всю тройку Tri(a, b, c) на вычисленную дельту.
         Возвращает словарь изменений (deltas по пиковым значениям).
         """
+        if self.rule_backend != 'python' or (
+                self.tsk_memo is not None and self.tsk_memo.enabled):
+            return self._apply_engine_rules(verbose)
+
         weighted_outputs: Dict[str, float] = {}
         weight_sums: Dict[str, float] = {}
         rule_log = []
@@ -288,6 +436,37 @@ class EmotionalModel:
 
         return deltas
 
+    def _apply_engine_rules(self, verbose: bool = False) -> Dict[str, float]:
+        """TSK-вывод движком `rule_backend` или через `tsk_memo` (tsk_engine)."""
+        from tsk_engine import engine_for
+
+        engine = engine_for(self, ALL_EMOTIONS, self.terms)
+        deltas, fired = engine.evaluate([self.get_peak(e) for e in ALL_EMOTIONS])
+        self.last_activations = [(rule['id'], round(w, 4), rule['description'])
+                                 for rule, w in fired]
+        if verbose and fired:
+            print("  [Эмоциональные TSK-правила]")
+            for rule, w in fired:
+                print(f"  {rule['id']}: w={w:.4f} — {rule['description']}")
+        self.shift_peaks(deltas)
+        return {name: round(delta, 4) for name, delta in deltas.items()}
+
+    def shift_peaks(self, deltas: Dict[str, float]):
+        """Сдвинуть тройки эмоций на дельты {имя: δ}."""
+        for name, delta in deltas.items():
+            self.state[name] = shift_tri(self.state[name], delta)
+
+    def prune_rules(self, ranges=None):
+        """
+        Исключить из вывода правила, которые не срабатывают ни при каких
+        пиках из `ranges` ({эмоция: (lo, hi)}, по умолчанию [0, 1]).
+        Возвращает отчёт rule_analysis со списком исключённых правил.
+        """
+        from rule_analysis import prune_rule_base
+
+        self.rules, report = prune_rule_base(self.rules, self.terms, ranges)
+        return report
+
     def apply_edge_updates(self, edge_props: dict):
         """Применить обновления из ребра: сдвигает Tri(a,b,c) на delta."""
         for key, delta in edge_props.items():
@@ -309,9 +488,19 @@ class EmotionalModel:
 
         Используется в режиме выбора действия по барьерам активации:
         Sem + Seth > β_i.
+
+        Суммы пиков групп берутся из TriState за O(1); при
+        check_aggregates они сверяются с полным пересчётом.
         """
-        mean_pos = sum(self.get_peak(e) for e in POSITIVE_EMOTIONS) / len(POSITIVE_EMOTIONS)
-        mean_neg = sum(self.get_peak(e) for e in NEGATIVE_EMOTIONS) / len(NEGATIVE_EMOTIONS)
+        sums = getattr(self.state, 'sums', None)
+        if sums is None or self.check_aggregates:
+            full = (sum(self.get_peak(e) for e in POSITIVE_EMOTIONS),
+                    sum(self.get_peak(e) for e in NEGATIVE_EMOTIONS))
+            if sums is not None:
+                _check_sums('Sem', sums, full)
+            sums = full
+        mean_pos = sums[0] / len(POSITIVE_EMOTIONS)
+        mean_neg = sums[1] / len(NEGATIVE_EMOTIONS)
         return round(0.5 + (mean_pos - mean_neg) / 2.0, 4)
 
     def compute_deviation(self, edge_props: dict) -> float:
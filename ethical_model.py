@@ -7,9 +7,9 @@
 На каждом шаге применяется от 4 до 10 TSK-правил.
 """
 
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from emotional_model import (tri_membership, get_peak, make_tri, shift_tri,
-                              format_tri, ZERO_TRI)
+                              format_tri, Tri, TriState, ZERO_TRI, _check_sums)
 
 
 # ──────────────────────────────────────────────────────────────────────
@@ -22,6 +22,15 @@ ETHIC_TERMS = {
     'high':   (0.6, 1.0, 1.0),
 }
 
+# Иерархия норм: веса приоритетов в агрегации TSK и их подписи
+PRIORITY_WEIGHTS = {1: 2.0, 2: 1.5, 3: 1.0}
+PRIORITY_LABELS = {1: 'ВЫСШИЙ', 2: 'СРЕДНИЙ', 3: 'БАЗОВЫЙ'}
+
+# Строгая иерархия (EthicalModel.strict_hierarchy): если правило уровня
+# приоритета сработало для переменной с w ≥ порога, заключения более
+# низких уровней для этой переменной не вычисляются.
+HIERARCHY_THRESHOLD = 0.5
+
 # 7 этических переменных сценария:
 #   responsibility — свобода и ответственность; goodness — добро;
 #   conscience — совесть; evil — зло; honesty — честность;
@@ -31,6 +40,12 @@ ALL_ETHICS = [
     'honesty', 'justice', 'fairness',
 ]
 
+# «Добродетельные» переменные (все, кроме evil) — для Seth
+VIRTUES = [e for e in ALL_ETHICS if e != 'evil']
+
+# Группы переменных для сумм пиков TriState: 0 — добродетели, 1 — зло
+SETH_GROUPS: Dict[str, int] = {**{e: 0 for e in VIRTUES}, 'evil': 1}
+
 
 # ──────────────────────────────────────────────────────────────────────
 #  TSK правила для этической модели (4–10 правил)
@@ -88,13 +103,39 @@ class EthicalModel:
     Применяет TSK-правила с учётом иерархии норм.
     """
 
-    def __init__(self):
-        self.state: Dict[str, List[float]] = {e: list(ZERO_TRI) for e in ALL_ETHICS}
+    # Отладка: сверять O(1)-значение Seth с полным пересчётом по пикам
+    check_aggregates: bool = False
+
+    def __init__(self, rule_backend: str = 'python'):
+        # Суммы пиков добродетелей и зла ведутся при записи (TriState)
+        self.state: Dict[str, Tri] = TriState(
+            {e: ZERO_TRI for e in ALL_ETHICS}, SETH_GROUPS, 2)
         self.rules = ETHIC_TSK_RULES
+        self.terms = ETHIC_TERMS
+        # Реализация TSK-вывода (см. EmotionalModel.rule_backend)
+        if rule_backend == 'auto':
+            from tsk_engine import resolve_rule_backend
+            rule_backend = resolve_rule_backend(rule_backend)
+        self.rule_backend = rule_backend
+        # Кеш вывода по квантованному состоянию (см. EmotionalModel.tsk_memo)
+        self.tsk_memo = None
+        # Строгая иерархия норм: высший уровень вытесняет низшие для
+        # переменных, где он сработал с w ≥ hierarchy_threshold. Вычисляется
+        # эталонным интерпретатором при любом rule_backend (движки
+        # tsk_engine смешивают уровни по PRIORITY_WEIGHTS).
+        self.strict_hierarchy = False
+        self.hierarchy_threshold = HIERARCHY_THRESHOLD
+        # Правила, упорядоченные по приоритету, — пересчитываются только
+        # при замене self.rules
+        self._sorted_rules: List[dict] = []
+        self._sorted_for: Optional[List[dict]] = None
         # Список (rule_id, w, description, priority) — заполняется на каждом
         # apply_tsk_rules. Используется внешними интерфейсами (Streamlit и т. п.)
         # для отображения активированных правил с иерархией приоритетов.
         self.last_activations: List[Tuple[str, float, str, int]] = []
+        # id правил, заключения которых (хотя бы частично) вытеснены
+        # высшим уровнем на последнем шаге строгой иерархии
+        self.last_preempted: List[str] = []
 
     def set_values(self, values: dict):
         """Установить значения из словаря {ethic_<n>: [a,b,c] или float}."""
@@ -108,7 +149,7 @@ class EthicalModel:
         tri = self.state.get(ethic_name, ZERO_TRI)
         return tri[1]
 
-    def get_all(self) -> Dict[str, List[float]]:
+    def get_all(self) -> Dict[str, Tri]:
         return {f'ethic_{k}': v for k, v in self.state.items()}
 
     def get_nonzero(self) -> Dict[str, str]:
@@ -133,8 +174,13 @@ class EthicalModel:
         activations = []
         for ethic_name, term_name in rule['conditions'].items():
             peak = self.get_peak(ethic_name)
-            term_params = ETHIC_TERMS[term_name]
-            mu = tri_membership(peak, *term_params)
+            try:
+                mu = tri_membership(peak, *self.terms[term_name])
+            except (KeyError, TypeError):
+                # Терм другой формы или спецификация в самом правиле
+                # (membership_shapes); треугольники идут без проверок
+                from membership_shapes import membership
+                mu = membership(peak, term_name, self.terms)
             activations.append(mu)
         return min(activations) if activations else 0.0
 
@@ -144,34 +190,70 @@ class EthicalModel:
         return p0 + p1 * current
 
     def apply_tsk_rules(self, verbose: bool = False) -> Dict[str, float]:
-        """Применить TSK-правила с иерархией. Сдвигает Tri(a,b,c)."""
-        rules_by_priority = sorted(self.rules, key=lambda r: r.get('priority', 3))
+        """
+        Применить TSK-правила с иерархией. Сдвигает Tri(a,b,c).
+
+        По умолчанию уровни приоритета смешиваются с весами
+        PRIORITY_WEIGHTS. При strict_hierarchy уровни обходятся сверху
+        вниз: переменная, для которой правило уровня сработало с
+        w ≥ hierarchy_threshold, закрывается для более низких уровней —
+        их заключения по ней не вычисляются, а правила, все заключения
+        которых закрыты, не вычисляются вовсе.
+        """
+        strict = self.strict_hierarchy
+        if not strict and (self.rule_backend != 'python' or (
+                self.tsk_memo is not None and self.tsk_memo.enabled)):
+            return self._apply_engine_rules(verbose)
+
+        if self._sorted_for is not self.rules:
+            self._sorted_rules = sorted(self.rules, key=lambda r: r.get('priority', 3))
+            self._sorted_for = self.rules
+        rules_by_priority = self._sorted_rules
 
         weighted_outputs: Dict[str, float] = {}
         weight_sums: Dict[str, float] = {}
         rule_log = []
         self.last_activations = []
+        self.last_preempted = []
+        # Строгая иерархия: закрытые переменные и max w по ним на текущем уровне
+        locked: set = set()
+        tier_max: Dict[str, float] = {}
+        tier = None
 
         for rule in rules_by_priority:
+            targets = rule['consequents']
+            if strict:
+                if rule.get('priority', 3) != tier:
+                    locked.update(v for v, w in tier_max.items()
+                                  if w >= self.hierarchy_threshold)
+                    tier_max = {}
+                    tier = rule.get('priority', 3)
+                if locked:
+                    targets = [v for v in targets if v not in locked]
+                    if len(targets) < len(rule['consequents']):
+                        self.last_preempted.append(rule['id'])
+                    if not targets:
+                        continue
             w = self._compute_rule_activation(rule)
             if w < 1e-6:
                 continue
             priority = rule.get('priority', 3)
-            priority_label = {1: 'ВЫСШИЙ', 2: 'СРЕДНИЙ', 3: 'БАЗОВЫЙ'}.get(priority, '?')
+            priority_label = PRIORITY_LABELS.get(priority, '?')
             self.last_activations.append(
                 (rule['id'], round(w, 4), rule['description'], priority))
             if verbose:
                 rule_log.append(
                     f"  {rule['id']} [{priority_label}]: w={w:.4f} — {rule['description']}")
-            for ethic_name in rule['consequents']:
+            priority_weight = PRIORITY_WEIGHTS.get(priority, 1.0)
+            for ethic_name in targets:
                 y = self._compute_rule_output(rule, ethic_name)
-                priority_weight = {1: 2.0, 2: 1.5, 3: 1.0}.get(
-                    rule.get('priority', 3), 1.0)
                 effective_w = w * priority_weight
                 weighted_outputs[ethic_name] = (
                     weighted_outputs.get(ethic_name, 0.0) + effective_w * y)
                 weight_sums[ethic_name] = (
                     weight_sums.get(ethic_name, 0.0) + effective_w)
+                if strict and w > tier_max.get(ethic_name, 0.0):
+                    tier_max[ethic_name] = w
 
         if verbose and rule_log:
             print("  [Этические TSK-правила]")
@@ -189,6 +271,36 @@ class EthicalModel:
 
         return all_deltas
 
+    def _apply_engine_rules(self, verbose: bool = False) -> Dict[str, float]:
+        """TSK-вывод движком `rule_backend` или через `tsk_memo` (tsk_engine)."""
+        from tsk_engine import engine_for
+
+        engine = engine_for(self, ALL_ETHICS, self.terms, PRIORITY_WEIGHTS)
+        deltas, fired = engine.evaluate([self.get_peak(e) for e in ALL_ETHICS])
+        self.last_activations = [
+            (rule['id'], round(w, 4), rule['description'], rule.get('priority', 3))
+            for rule, w in fired]
+        if verbose and fired:
+            print("  [Этические TSK-правила]")
+            for rule, w in fired:
+                label = PRIORITY_LABELS.get(rule.get('priority', 3), '?')
+                print(f"  {rule['id']} [{label}]: w={w:.4f} — {rule['description']}")
+        self.shift_peaks(deltas)
+        return {name: round(delta, 4) for name, delta in deltas.items()}
+
+    def shift_peaks(self, deltas: Dict[str, float]):
+        """Сдвинуть тройки этических переменных на дельты {имя: δ}."""
+        for name, delta in deltas.items():
+            self.state[name] = shift_tri(self.state[name], delta)
+
+    def prune_rules(self, ranges=None):
+        """Исключить недостижимые в `ranges` правила (см. EmotionalModel.prune_rules)."""
+        from rule_analysis import prune_rule_base
+
+        self.rules, report = prune_rule_base(self.rules, self.terms, ranges,
+                                             PRIORITY_WEIGHTS)
+        return report
+
     def apply_edge_updates(self, edge_props: dict):
         """Применить обновления из ребра: сдвигает Tri(a,b,c) на delta."""
         for key, delta in edge_props.items():
@@ -208,11 +320,17 @@ class EthicalModel:
         > 0.5 — этичное состояние, < 0.5 — неэтичное.
 
         Используется в режиме выбора действия по барьерам активации:
-        Sem + Seth > β_i.
+        Sem + Seth > β_i. Суммы пиков — из TriState за O(1) (см.
+        EmotionalModel.compute_sem).
         """
-        virtues = [e for e in ALL_ETHICS if e != 'evil']
-        mean_virtues = sum(self.get_peak(e) for e in virtues) / len(virtues)
-        return round(0.5 + (mean_virtues - self.get_peak('evil')) / 2.0, 4)
+        sums = getattr(self.state, 'sums', None)
+        if sums is None or self.check_aggregates:
+            full = (sum(self.get_peak(e) for e in VIRTUES), self.get_peak('evil'))
+            if sums is not None:
+                _check_sums('Seth', sums, full)
+            sums = full
+        mean_virtues = sums[0] / len(VIRTUES)
+        return round(0.5 + (mean_virtues - sums[1]) / 2.0, 4)
 
     def compute_deviation(self, edge_props: dict) -> float:
         """Вычислить ΣΔE для этических условий ребра (по пикам)."""
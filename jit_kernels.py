@@ -0,0 +1,105 @@
+"""
+JIT-ядра нечёткого вывода для пакетных (популяционных) прогонов.
+
+Ядра — явные циклы над массивами NumPy, которые при установленном Numba
+компилируются `numba.njit` в машинный код:
+
+    tri_membership_kernel  — μ треугольного терма (ветви `tri_membership`)
+    tsk_activations        — w = min μ по условиям для пакета (N, V) пиков
+    tsk_aggregate          — взвешенное среднее заключений → дельты пиков
+    shift_tri_clip         — сдвиг троек Tri на дельты с клиппингом в [0, 1]
+
+Без Numba те же функции выполняются интерпретатором (медленно, но с тем
+же результатом — так они проверяются тестами эквивалентности), а
+`tsk_engine.JitRuleBase` и array_models по умолчанию используют NumPy.
+Порядок накопления сумм повторяет эталонные модели, поэтому результат
+совпадает с ними бит в бит.
+
+Выбор движка: `rule_backend='jit'` или `'auto'` (jit при установленном
+Numba, иначе numpy, без NumPy — эталонный 'python').
+"""
+
+import math
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - Numba необязателен
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+
+def _jit(fn):
+    """numba.njit при установленном Numba, иначе функция как есть."""
+    if numba is None:
+        return fn
+    return numba.njit(cache=True)(fn)
+
+
+@_jit
+def tri_membership_kernel(x, a, b, c):
+    """Скалярная μ Tri(a, b, c) — те же ветви, что `tri_membership`."""
+    if x < a or x > c:
+        return 0.0
+    if abs(x - b) < 1e-9:
+        return 1.0
+    if x < b:
+        return (x - a) / (b - a) if (b - a) > 1e-9 else 1.0
+    return (c - x) / (c - b) if (c - b) > 1e-9 else 1.0
+
+
+@_jit
+def tsk_activations(peaks, ante_idx, ante_abc, ante_mask, out):
+    """
+    Активации правил для пакета пиков: peaks (N, V) → out (N, R).
+    Массивы условий — как в `CompiledRuleBase` (ante_idx, ante_abc, ante_mask).
+    """
+    n_states = peaks.shape[0]
+    n_rules, k = ante_mask.shape
+    for i in range(n_states):
+        for r in range(n_rules):
+            w = math.inf
+            for j in range(k):
+                if ante_mask[r, j]:
+                    mu = tri_membership_kernel(peaks[i, ante_idx[r, j]],
+                                               ante_abc[0, r, j],
+                                               ante_abc[1, r, j],
+                                               ante_abc[2, r, j])
+                    if mu < w:
+                        w = mu
+            out[i, r] = 0.0 if w == math.inf else w
+
+
+@_jit
+def tsk_aggregate(peaks, w, weights, p0, p1, cons_mask, eps, deltas, touched):
+    """
+    Дельты пиков (N, V): для каждой переменной — Σ w·k·y / Σ w·k − x по
+    сработавшим правилам (w ≥ eps) в порядке базы; k — вес приоритета.
+    """
+    n_states, n_vars = peaks.shape
+    n_rules = w.shape[1]
+    for i in range(n_states):
+        for v in range(n_vars):
+            num = 0.0
+            den = 0.0
+            x = peaks[i, v]
+            for r in range(n_rules):
+                if cons_mask[r, v] and w[i, r] >= eps:
+                    ew = w[i, r] * weights[r]
+                    num += ew * (p0[r, v] + p1[r, v] * x)
+                    den += ew
+            if den > eps:
+                deltas[i, v] = num / den - x
+                touched[i, v] = True
+            else:
+                deltas[i, v] = 0.0
+                touched[i, v] = False
+
+
+@_jit
+def shift_tri_clip(tri, deltas):
+    """Сдвиг троек tri (M, 3) на deltas (M,) с клиппингом в [0, 1] (на месте)."""
+    for m in range(tri.shape[0]):
+        for j in range(3):
+            v = tri[m, j] + deltas[m]
+            tri[m, j] = 0.0 if v < 0.0 else (1.0 if v > 1.0 else v)
@@ -0,0 +1,191 @@
+"""
+Библиотека форм функций принадлежности лингвистических термов.
+
+Помимо треугольных термов Tri(a, b, c) (`EMOTION_TERMS` / `ETHIC_TERMS`)
+поддерживаются:
+
+    'trap'    (a, b, c, d)     — трапеция: рост на [a, b], 1 на [b, c],
+                                 спад на [c, d]; «плечевые» множества
+    'gauss'   (m, sigma)       — гауссиана exp(−½((x − m)/σ)²)
+    'sigmoid' (k, x0)          — сигмоида 1 / (1 + exp(−k(x − x0)));
+                                 k > 0 — правое плечо, k < 0 — левое
+
+Терм задаётся кортежем параметров. Тройка чисел (a, b, c) — треугольник
+(прежний формат, без изменений); иначе первый элемент — имя формы:
+('trap', 0.6, 0.8, 1.0, 1.0). В условиях правил терм указывается именем
+из словаря термов модели ('high') или непосредственно такой спецификацией:
+
+    {'conditions': {'fear': ('sigmoid', 12.0, 0.7), 'anger': 'low'}, ...}
+
+У каждой формы есть скалярная функция и векторная (NumPy): x и параметры
+— массивы, согласуемые по broadcasting. Новые формы добавляются через
+`register_shape`. Треугольные термы по-прежнему вычисляются
+`tri_membership` напрямую, так что эталонный путь не замедляется.
+"""
+
+import math
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from emotional_model import tri_membership
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен
+    np = None
+
+# Нормализованная спецификация терма: (имя формы, параметры)
+TermSpec = Tuple[str, Tuple[float, ...]]
+
+
+class Shape(NamedTuple):
+    """Форма функции принадлежности."""
+    n_params: int
+    scalar: Callable[..., float]                   # (x, *params) → μ
+    vector: Optional[Callable[..., 'np.ndarray']]  # (x, *params) → μ, массивы
+    # Липшицева константа по параметрам (для оценки погрешности таблиц)
+    lipschitz: Callable[..., float]
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Скалярные функции
+# ──────────────────────────────────────────────────────────────────────
+
+def trap_membership(x: float, a: float, b: float, c: float, d: float) -> float:
+    """Трапеция Trap(a, b, c, d); вырожденные плечи (a == b, c == d) дают 1."""
+    if x < a or x > d:
+        return 0.0
+    if b <= x <= c:
+        return 1.0
+    if x < b:
+        return (x - a) / (b - a) if (b - a) > 1e-9 else 1.0
+    return (d - x) / (d - c) if (d - c) > 1e-9 else 1.0
+
+
+def gauss_membership(x: float, m: float, sigma: float) -> float:
+    """Гауссиана с центром m и шириной sigma."""
+    z = (x - m) / sigma
+    return math.exp(-0.5 * z * z)
+
+
+def sigmoid_membership(x: float, k: float, x0: float) -> float:
+    """Сигмоида с крутизной k и точкой перегиба x0 (μ(x0) = 0.5)."""
+    t = -k * (x - x0)
+    if t > 700.0:                     # переполнение exp
+        return 0.0
+    return 1.0 / (1.0 + math.exp(t))
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Векторные функции
+# ──────────────────────────────────────────────────────────────────────
+
+def tri_membership_vec(x, a, b, c):
+    """
+    Векторный аналог `emotional_model.tri_membership` (те же ветви,
+    включая вырожденные «плечи»). Аргументы согласуются по broadcasting.
+    """
+    left_w = b - a
+    right_w = c - b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        left = np.where(left_w > 1e-9, (x - a) / left_w, 1.0)
+        right = np.where(right_w > 1e-9, (c - x) / right_w, 1.0)
+    mu = np.where(x < b, left, right)
+    mu = np.where(np.abs(x - b) < 1e-9, 1.0, mu)
+    return np.where((x < a) | (x > c), 0.0, mu)
+
+
+def trap_membership_vec(x, a, b, c, d):
+    """Векторный аналог `trap_membership`."""
+    left_w = b - a
+    right_w = d - c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        left = np.where(left_w > 1e-9, (x - a) / left_w, 1.0)
+        right = np.where(right_w > 1e-9, (d - x) / right_w, 1.0)
+    mu = np.where(x < b, left, np.where(x > c, right, 1.0))
+    return np.where((x < a) | (x > d), 0.0, mu)
+
+
+def gauss_membership_vec(x, m, sigma):
+    """Векторный аналог `gauss_membership`."""
+    z = (x - m) / sigma
+    return np.exp(-0.5 * z * z)
+
+
+def sigmoid_membership_vec(x, k, x0):
+    """Векторный аналог `sigmoid_membership`."""
+    t = -k * (x - x0)
+    return np.where(t > 700.0, 0.0, 1.0 / (1.0 + np.exp(np.minimum(t, 700.0))))
+
+
+def _shoulder_slope(*widths: float) -> float:
+    widths = [w for w in widths if w > 1e-9]
+    return 1.0 / min(widths) if widths else 0.0
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Реестр форм
+# ──────────────────────────────────────────────────────────────────────
+
+SHAPES: Dict[str, Shape] = {
+    'tri': Shape(3, tri_membership, tri_membership_vec,
+                 lambda a, b, c: _shoulder_slope(b - a, c - b)),
+    'trap': Shape(4, trap_membership, trap_membership_vec,
+                  lambda a, b, c, d: _shoulder_slope(b - a, d - c)),
+    'gauss': Shape(2, gauss_membership, gauss_membership_vec,
+                   lambda m, sigma: 1.0 / (abs(sigma) * math.sqrt(math.e))),
+    'sigmoid': Shape(2, sigmoid_membership, sigmoid_membership_vec,
+                     lambda k, x0: abs(k) / 4.0),
+}
+
+
+def register_shape(name: str, n_params: int, scalar: Callable[..., float],
+                   vector: Optional[Callable] = None,
+                   lipschitz: Optional[Callable[..., float]] = None):
+    """
+    Зарегистрировать форму терма. Без `vector` векторные движки применяют
+    скалярную функцию поэлементно (медленно, но корректно); без
+    `lipschitz` оценка погрешности таблиц для формы не гарантируется.
+    """
+    if name in SHAPES:
+        raise ValueError(f"форма {name!r} уже зарегистрирована")
+    if vector is None and np is not None:
+        vector = np.vectorize(scalar, otypes=[float])
+    SHAPES[name] = Shape(n_params, scalar, vector,
+                         lipschitz or (lambda *params: math.inf))
+
+
+def resolve_term(term, terms: Dict[str, tuple]) -> TermSpec:
+    """
+    Нормализовать терм условия правила: имя из `terms` или спецификация
+    → (имя формы, параметры). Ошибки описания — ValueError.
+    """
+    params = terms.get(term) if isinstance(term, str) else term
+    if params is None:
+        raise ValueError(f"неизвестный терм {term!r}")
+    params = tuple(params)
+    if params and isinstance(params[0], str):
+        shape, params = params[0], tuple(float(p) for p in params[1:])
+    else:
+        shape, params = 'tri', tuple(float(p) for p in params)
+    spec = SHAPES.get(shape)
+    if spec is None:
+        raise ValueError(f"неизвестная форма терма {shape!r} "
+                         f"(допустимо: {', '.join(SHAPES)})")
+    if len(params) != spec.n_params:
+        raise ValueError(f"форма {shape!r} ожидает {spec.n_params} "
+                         f"параметра(ов), получено {len(params)}: {term!r}")
+    return shape, params
+
+
+def membership(x: float, term, terms: Optional[Dict[str, tuple]] = None) -> float:
+    """μ для терма любой формы: имя из `terms`, спецификация или тройка Tri."""
+    shape, params = resolve_term(term, terms or {})
+    return SHAPES[shape].scalar(x, *params)
+
+
+def membership_vec(shape: str, x, params: Sequence) -> 'np.ndarray':
+    """
+    Векторное μ формы `shape`: x — массив, params — последовательность
+    массивов параметров (по одному на параметр), согласуемых с x.
+    """
+    return SHAPES[shape].vector(x, *params)
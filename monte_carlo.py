@@ -0,0 +1,378 @@
+"""
+Распространение неопределённости профиля агента методом Монте-Карло.
+
+Профиль вида `[0.4, 0.5, 0.6]` задаёт не точку, а треугольное
+распределение, но навигатор видит только пик. Здесь из профиля
+извлекается N чётких агентов: пик каждой переменной — выборка из
+Triangular(a, b, c), тройка сдвигается к нему с сохранением формы
+(как `shift_tri`; скалярное значение v предварительно раскрывается
+`make_tri` в Tri(v − 0.1, v, v + 0.1)). Все N агентов проходят сеть
+одним пакетом:
+
+  • состояние — массив (N, 27, 3) в порядке condition_pack.VARIABLE_SLOTS;
+  • агенты группируются по текущему узлу; ΣΔE, неравенства условий и
+    Sem + Seth > β для всех рёбер узла и всех агентов группы — векторные
+    операции над упакованными условиями (pack_conditions);
+  • обновления update_* ребра и узла — сдвиг столбца с клиппингом;
+  • TSK-проход обеих моделей — один вызов `evaluate_arrays` движка
+    tsk_engine на всех агентов, сделавших шаг.
+
+Выбор ребра повторяет `AgentNavigator.select_and_apply` в режиме
+'combined' (допустимость, барьер, минимум ΣΔE по выбранной метрике
+condition_pack.DEVIATION_METRICS, ничьи — случайно) с
+одним TSK-проходом за шаг; пути совпадают с поагентным прогоном
+навигатора (проверяется тестом). Результат — распределение вероятностей
+путей и вердиктов (свойство 'verdict' конечного узла) с доверительными
+интервалами Уилсона; `fragility` — вероятность вердикта, отличного от
+наиболее частого.
+
+Требует NumPy. Запуск (BASE_AGENT в сети «Кредитный скоринг»):
+    python monte_carlo.py --samples 10000 --seed 0
+"""
+
+import argparse
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from condition_pack import (N_EMOTION_SLOTS, OP_LE, SLOT_INDEX, check_metric_mode,
+                            combine_rows, get_metric, is_packed, pack_conditions,
+                            reduce_rows, weight_vector)
+from emotional_model import (ALL_EMOTIONS, NEGATIVE_EMOTIONS, POSITIVE_EMOTIONS,
+                             EmotionalModel, make_tri)
+from ethical_model import ALL_ETHICS, PRIORITY_WEIGHTS, VIRTUES, EthicalModel
+from tsk_engine import get_engine, resolve_rule_backend
+
+# Те же допуски, что у навигатора: неравенства условий и ничьи по ΣΔE
+_EPS = 1e-9
+_TIE_EPS = 1e-6
+DEFAULT_BARRIER = 1.0
+
+Path = Tuple[str, ...]
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Оценки вероятностей
+# ──────────────────────────────────────────────────────────────────────
+
+def wilson_interval(count: int, n: int,
+                    confidence: float = 0.95) -> Tuple[float, float]:
+    """Доверительный интервал Уилсона для доли count / n."""
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+    p = count / n
+    denom = 1.0 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1.0 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+
+@dataclass
+class Estimate:
+    """Частота исхода: число выборок, доля и доверительный интервал."""
+    count: int
+    probability: float
+    low: float
+    high: float
+
+    def __str__(self):
+        return (f"{self.probability:.3f} [{self.low:.3f}, {self.high:.3f}] "
+                f"({self.count})")
+
+
+def _estimates(counter: Counter, n: int, confidence: float) -> Dict:
+    return {key: Estimate(c, c / n, *wilson_interval(c, n, confidence))
+            for key, c in counter.most_common()}
+
+
+@dataclass
+class MonteCarloResult:
+    """
+    Итог прогона: распределения путей (кортежи узлов) и вердиктов
+    (None — конечный узел без вердикта), выборочные пики агентов (N, 27),
+    пути и признаки ничьих (выбор ребра был случайным) по выборкам.
+    """
+    n_samples: int
+    confidence: float
+    paths: Dict[Path, Estimate]
+    verdicts: Dict[Optional[str], Estimate]
+    samples: np.ndarray
+    sample_paths: List[Path] = field(repr=False)
+    tied: np.ndarray = field(repr=False)
+
+    @property
+    def fragility(self) -> float:
+        """Вероятность вердикта, отличного от наиболее частого."""
+        if not self.verdicts:
+            return 0.0
+        return 1.0 - max(e.probability for e in self.verdicts.values())
+
+    def format(self, title: str = 'Монте-Карло') -> str:
+        """Текстовый отчёт для консоли/логов."""
+        lines = [f"{title}: {self.n_samples} выборок, доверие "
+                 f"{self.confidence:.0%}, хрупкость вердикта "
+                 f"{self.fragility:.3f}, ничьих {int(self.tied.sum())}",
+                 "  Пути:"]
+        for path, est in self.paths.items():
+            lines.append(f"    {' → '.join(path)}: {est}")
+        lines.append("  Вердикты:")
+        for verdict, est in self.verdicts.items():
+            lines.append(f"    {verdict or '(нет вердикта)'}: {est}")
+        return "\n".join(lines)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Выборка чётких профилей
+# ──────────────────────────────────────────────────────────────────────
+
+def profile_tri(profile: dict) -> np.ndarray:
+    """Профиль {emotion_*/ethic_*: Tri | float} → массив (27, 3)."""
+    tri = np.zeros((len(SLOT_INDEX), 3))
+    for key, value in profile.items():
+        if key.startswith('emotion_'):
+            slot = ('em', key[len('emotion_'):])
+        elif key.startswith('ethic_'):
+            slot = ('eth', key[len('ethic_'):])
+        else:
+            continue
+        if slot not in SLOT_INDEX:
+            raise ValueError(f"{key}: неизвестная переменная {slot[1]!r}")
+        tri[SLOT_INDEX[slot]] = make_tri(value)
+    return tri
+
+
+def sample_profiles(profile: dict, n: int,
+                    rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    N чётких агентов из профиля: массив (N, 27, 3), пик каждой переменной
+    ~ Triangular(a, b, c), тройка сдвинута к пику с клиппингом в [0, 1].
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    base = profile_tri(profile)
+    out = np.empty((n,) + base.shape)
+    for v, (a, b, c) in enumerate(base):
+        if c > a:
+            peaks = rng.triangular(a, b, c, n)
+        else:
+            peaks = np.full(n, b)
+        out[:, v] = np.clip(base[v] + (peaks - b)[:, None], 0.0, 1.0)
+    return out
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Пакетная навигация
+# ──────────────────────────────────────────────────────────────────────
+
+@dataclass
+class _EdgePlan:
+    edge_id: str
+    next_id: str
+    barrier: float
+    slots: np.ndarray
+    le: np.ndarray
+    req: np.ndarray
+    is_em: np.ndarray
+    updates: List[Tuple[int, float]]
+
+
+def _updates(props: dict) -> List[Tuple[int, float]]:
+    """Сдвиги update_em_* затем update_eth_* (порядок apply_edge_updates)."""
+    out = []
+    for prefix, kind in (('update_em_', 'em'), ('update_eth_', 'eth')):
+        for key, delta in props.items():
+            if key.startswith(prefix):
+                slot = SLOT_INDEX.get((kind, key[len(prefix):]))
+                if slot is not None:
+                    out.append((slot, float(delta)))
+    return out
+
+
+def _node_plan(graph, node_id: str) -> List[_EdgePlan]:
+    plans = []
+    for edge_id, next_id, props, next_props in graph.edges_from(node_id):
+        packed = props if is_packed(props) else pack_conditions(props)
+        slots = np.asarray(packed['cond_pack_slots'], dtype=np.intp)
+        plans.append(_EdgePlan(
+            edge_id=edge_id,
+            next_id=next_id,
+            barrier=float(props.get('barrier', DEFAULT_BARRIER)),
+            slots=slots,
+            le=np.asarray(packed['cond_pack_ops'], dtype=np.int8) == OP_LE,
+            req=np.asarray(packed['cond_pack_tri'], dtype=np.float64)[1::3],
+            is_em=slots < N_EMOTION_SLOTS,
+            updates=_updates(props) + _updates(next_props or {})))
+    return plans
+
+
+class BatchNavigator:
+    """
+    Навигация N агентов по ScenarioGraph одним пакетом.
+
+    rule_backend — движок TSK из tsk_engine.RULE_BACKENDS или 'auto';
+    правила и термы берутся из эталонных моделей (либо из переданных
+    `models` — пары EmotionalModel / EthicalModel, например после
+    `prune_rules` или загрузки файла правил). deviation_metric и
+    deviation_weights — как у AgentNavigator (condition_pack).
+    """
+
+    def __init__(self, graph, rule_backend: str = 'auto', models=None,
+                 deviation_metric: str = 'l1',
+                 deviation_weights: Optional[Dict[str, float]] = None):
+        self.graph = graph
+        self.metric = get_metric(deviation_metric)
+        check_metric_mode(self.metric, 'peak')     # условия — по пикам
+        weights = weight_vector(deviation_weights)
+        self._weights = None if weights is None else np.asarray(weights)
+        em, eth = models if models is not None else (EmotionalModel(), EthicalModel())
+        backend = resolve_rule_backend(rule_backend)
+        if backend == 'python':
+            backend = 'numpy'
+        self.em_engine = get_engine(backend, em.rules, ALL_EMOTIONS, em.terms)
+        self.eth_engine = get_engine(backend, eth.rules, ALL_ETHICS, eth.terms,
+                                     PRIORITY_WEIGHTS)
+        self._plans: Dict[str, List[_EdgePlan]] = {}
+        self._pos = np.array([SLOT_INDEX[('em', e)] for e in POSITIVE_EMOTIONS])
+        self._neg = np.array([SLOT_INDEX[('em', e)] for e in NEGATIVE_EMOTIONS])
+        self._virtues = np.array([SLOT_INDEX[('eth', e)] for e in VIRTUES])
+        self._evil = SLOT_INDEX[('eth', 'evil')]
+
+    def _plan(self, node_id: str) -> List[_EdgePlan]:
+        plan = self._plans.get(node_id)
+        if plan is None:
+            plan = self._plans[node_id] = _node_plan(self.graph, node_id)
+        return plan
+
+    def _select(self, plan: List[_EdgePlan], peaks: np.ndarray,
+                rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """Номер выбранного ребра для каждого агента (−1 — конец) и ничьи."""
+        sem = np.round(0.5 + (peaks[:, self._pos].sum(axis=1) / len(self._pos)
+                              - peaks[:, self._neg].sum(axis=1) / len(self._neg))
+                       / 2.0, 4)
+        seth = np.round(0.5 + (peaks[:, self._virtues].sum(axis=1) / len(self._virtues)
+                               - peaks[:, self._evil]) / 2.0, 4)
+        resource = sem + seth
+        dev = np.empty((peaks.shape[0], len(plan)))
+        feasible = np.empty(dev.shape, dtype=bool)
+        for e, edge in enumerate(plan):
+            agent = peaks[:, edge.slots]
+            contrib = self.metric.term(np.abs(edge.req - agent),
+                                       np.where(edge.le, agent - edge.req,
+                                                edge.req - agent))
+            if self._weights is not None:
+                contrib = contrib * self._weights[edge.slots]
+            em = reduce_rows(self.metric, contrib[:, edge.is_em])
+            eth = reduce_rows(self.metric, contrib[:, ~edge.is_em])
+            dev[:, e] = np.round(combine_rows(self.metric, em, eth), 3)
+            violated = np.where(edge.le, agent > edge.req + _EPS,
+                                agent < edge.req - _EPS)
+            feasible[:, e] = ~violated.any(axis=1) & (resource > edge.barrier)
+
+        masked = np.where(feasible, dev, np.inf)
+        best = masked.min(axis=1)
+        with np.errstate(invalid='ignore'):
+            tied = feasible & (np.abs(masked - best[:, None]) < _TIE_EPS)
+        n_tied = tied.sum(axis=1)
+        choice = np.where(n_tied > 0, tied.argmax(axis=1), -1)
+        for i in np.flatnonzero(n_tied > 1):
+            choice[i] = rng.choice(np.flatnonzero(tied[i]))
+        return choice, n_tied > 1
+
+    def _apply_tsk(self, tri: np.ndarray, idx: np.ndarray):
+        """Один TSK-проход эмоций, затем этики, для агентов idx."""
+        for engine, part in ((self.em_engine, slice(0, N_EMOTION_SLOTS)),
+                             (self.eth_engine, slice(N_EMOTION_SLOTS, None))):
+            block = tri[idx, part]
+            deltas, _, _ = engine.evaluate_arrays(block[:, :, 1])
+            tri[idx, part] = np.clip(block + deltas[:, :, None], 0.0, 1.0)
+
+    def run(self, start_id: str, tri: np.ndarray, max_steps: int = 100,
+            rng: Optional[np.random.Generator] = None
+            ) -> Tuple[List[Path], np.ndarray]:
+        """
+        Прогнать агентов tri (N, 27, 3) из `start_id` (массив изменяется
+        на месте). Возвращает пути (кортежи узлов) и признаки ничьих.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        n = tri.shape[0]
+        paths = [[start_id] for _ in range(n)]
+        current = np.full(n, start_id, dtype=object)
+        tied = np.zeros(n, dtype=bool)
+        active = np.arange(n)
+        for _ in range(max_steps):
+            moved = []
+            for node_id in dict.fromkeys(current[active]):
+                idx = active[current[active] == node_id]
+                plan = self._plan(node_id)
+                if not plan:
+                    continue
+                choice, ties = self._select(plan, tri[idx, :, 1], rng)
+                tied[idx[ties]] = True
+                for e, edge in enumerate(plan):
+                    sel = idx[choice == e]
+                    if not sel.size:
+                        continue
+                    for slot, delta in edge.updates:
+                        tri[sel, slot] = np.clip(tri[sel, slot] + delta, 0.0, 1.0)
+                    current[sel] = edge.next_id
+                    for i in sel:
+                        paths[i].append(edge.next_id)
+                    moved.append(sel)
+            if not moved:
+                break
+            active = np.sort(np.concatenate(moved))
+            self._apply_tsk(tri, active)
+        return [tuple(p) for p in paths], tied
+
+
+def monte_carlo(graph, start_id: str, profile: dict, n_samples: int = 1000,
+                seed: Optional[int] = None, confidence: float = 0.95,
+                rule_backend: str = 'auto', max_steps: int = 100,
+                models=None, deviation_metric: str = 'l1',
+                deviation_weights: Optional[Dict[str, float]] = None
+                ) -> MonteCarloResult:
+    """
+    Распределение путей и вердиктов для `n_samples` чётких агентов,
+    извлечённых из треугольных распределений профиля (см. docstring модуля).
+    """
+    rng = np.random.default_rng(seed)
+    tri = sample_profiles(profile, n_samples, rng)
+    samples = tri[:, :, 1].copy()
+    navigator = BatchNavigator(graph, rule_backend, models, deviation_metric,
+                               deviation_weights)
+    paths, tied = navigator.run(start_id, tri, max_steps, rng)
+    verdicts = Counter(graph.nodes[p[-1]].get('verdict') for p in paths)
+    return MonteCarloResult(
+        n_samples=n_samples,
+        confidence=confidence,
+        paths=_estimates(Counter(paths), n_samples, confidence),
+        verdicts=_estimates(verdicts, n_samples, confidence),
+        samples=samples,
+        sample_paths=paths,
+        tied=tied)
+
+
+def main():
+    from scenario_graph import ScenarioGraph
+    from seed_scenario import BASE_AGENT, EDGES, NODES
+
+    parser = argparse.ArgumentParser(
+        description='Монте-Карло по треугольным распределениям профиля')
+    parser.add_argument('--start', default='V0', help='Начальный узел')
+    parser.add_argument('--samples', type=int, default=10000,
+                        help='Число выборок')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=0.95)
+    args = parser.parse_args()
+
+    result = monte_carlo(ScenarioGraph.from_lists(NODES, EDGES), args.start,
+                         BASE_AGENT, args.samples, args.seed, args.confidence)
+    print(result.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""
+Статический анализ баз TSK-правил и отсечение мёртвых правил.
+
+По носителям термов и достижимым диапазонам переменных (интервал пика
+каждой характеристики) для каждого правила вычисляется верхняя граница
+активации w = min μ_term(x) по всем x из диапазонов — точная для
+треугольных, трапециевидных, гауссовых и сигмоидных термов, поскольку
+условия правила зависят от разных переменных. Находки:
+
+  • unreachable — граница w < ACTIVATION_EPS: правило ни разу не будет
+    учтено выводом (ни в эталонном интерпретаторе, ни в движках), его
+    можно исключить из горячего пути без изменения результата;
+  • subsumed    — правило срабатывает только вместе с другим (его
+    условия — надмножество условий другого) и повторяет часть его
+    заключений с теми же коэффициентами (включая точные дубликаты);
+  • conflict    — правила могут сработать одновременно и тянут общую
+    переменную в противоположные стороны на всём её диапазоне.
+
+Отсекаются только unreachable: subsumed и conflict меняют взвешенное
+среднее TSK и выводятся в отчёт для ручного разбора.
+
+Отсечение: `prune_rule_base()`, параметр `ranges` в
+`tsk_engine.get_engine()` (компиляция только живых правил) и
+`prune_rules()` моделей (действует для всех rule_backend, включая
+'python'). Диапазоны по умолчанию — [0, 1]; достижимые в сценарной сети
+диапазоны даёт `reachable_ranges()` по отчёту scenario_analysis.
+
+Запуск:
+    python rule_analysis.py                       # диапазоны [0, 1]
+    python rule_analysis.py --range 0.15 0.65     # рабочий диапазон пиков
+    python rule_analysis.py --scenario --profile  # достижимое в сети из BASE_AGENT
+"""
+
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from membership_shapes import SHAPES, TermSpec, resolve_term
+from scenario_analysis import Box, Interval, ReachabilityReport
+
+# Порог активации, ниже которого правило не учитывается выводом
+# (совпадает с tsk_engine.ACTIVATION_EPS и порогом моделей)
+ACTIVATION_EPS = 1e-6
+
+_EPS = 1e-9
+
+
+@dataclass
+class RuleFinding:
+    """Находка анализа по одному правилу."""
+    rule_id: str
+    kind: str                        # 'unreachable' | 'subsumed' | 'conflict'
+    reason: str
+    other_id: Optional[str] = None   # второе правило пары (subsumed / conflict)
+
+
+@dataclass
+class RuleAnalysisReport:
+    """
+    Результат анализа базы правил.
+
+    max_activation — верхняя граница w каждого правила по диапазонам;
+    pruned — id правил, исключённых из горячего пути (заполняется при
+    отсечении).
+    """
+    total: int
+    ranges: Dict[str, Interval]
+    max_activation: Dict[str, float]
+    findings: List[RuleFinding] = field(default_factory=list)
+    pruned: List[str] = field(default_factory=list)
+
+    def by_kind(self, kind: str) -> List[RuleFinding]:
+        return [f for f in self.findings if f.kind == kind]
+
+    @property
+    def dead_ids(self) -> List[str]:
+        """id недостижимых правил (в порядке базы)."""
+        return [f.rule_id for f in self.by_kind('unreachable')]
+
+    def format(self, title: str = 'База правил') -> str:
+        """Текстовый отчёт для консоли/логов."""
+        lines = [f"{title}: {self.total} правил, "
+                 f"недостижимых {len(self.dead_ids)}, "
+                 f"поглощённых {len(self.by_kind('subsumed'))}, "
+                 f"конфликтов {len(self.by_kind('conflict'))}"]
+        marks = {'unreachable': '✗', 'subsumed': '≈', 'conflict': '⇄'}
+        for f in self.findings:
+            pair = f" ↔ {f.other_id}" if f.other_id else ''
+            lines.append(f"  {marks[f.kind]} {f.rule_id}{pair}: {f.reason}")
+        if self.pruned:
+            lines.append(f"  Исключены из вывода: {', '.join(self.pruned)}")
+        return "\n".join(lines)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Границы функций принадлежности на интервале
+# ──────────────────────────────────────────────────────────────────────
+
+def _clamp(x: float, interval: Interval) -> float:
+    return max(interval[0], min(interval[1], x))
+
+
+def max_membership(interval: Interval, spec: TermSpec) -> float:
+    """
+    max μ(x) по x ∈ interval. Для встроенных форм — точное значение
+    (максимум унимодальной функции — в ближайшей к моде точке, у
+    сигмоиды — на конце интервала); для прочих форм — 1.0 (оценка сверху).
+    """
+    shape, params = spec
+    fn = SHAPES[shape].scalar
+    lo, hi = interval
+    if shape == 'tri':
+        candidates = [_clamp(params[1], interval)]
+    elif shape == 'trap':
+        candidates = [_clamp(params[1], interval), _clamp(params[2], interval)]
+    elif shape == 'gauss':
+        candidates = [_clamp(params[0], interval)]
+    elif shape == 'sigmoid':
+        candidates = [lo, hi]
+    else:
+        return 1.0
+    return max(fn(x, *params) for x in candidates)
+
+
+def _support(spec: TermSpec) -> Interval:
+    """Отрезок, вне которого μ = 0 (для форм без носителя — вся ось)."""
+    shape, params = spec
+    if shape in ('tri', 'trap'):
+        return params[0], params[-1]
+    return float('-inf'), float('inf')
+
+
+def _delta_range(coeffs: Tuple[float, float], interval: Interval) -> Interval:
+    """Диапазон сдвига пика y − x = p0 + (p1 − 1)·x на интервале."""
+    p0, p1 = coeffs
+    ends = (p0 + (p1 - 1.0) * interval[0], p0 + (p1 - 1.0) * interval[1])
+    return min(ends), max(ends)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Анализ
+# ──────────────────────────────────────────────────────────────────────
+
+def _range_of(ranges: Dict[str, Interval], var: str) -> Interval:
+    return ranges.get(var, (0.0, 1.0))
+
+
+def _may_cofire(a: dict, b: dict, specs: Dict[int, Dict[str, TermSpec]],
+                ranges: Dict[str, Interval]) -> bool:
+    """Пересекаются ли носители условий по общим переменным (в диапазонах)."""
+    for var in a['conditions'].keys() & b['conditions'].keys():
+        lo, hi = _range_of(ranges, var)
+        a_lo, a_hi = _support(specs[id(a)][var])
+        b_lo, b_hi = _support(specs[id(b)][var])
+        if max(lo, a_lo, b_lo) > min(hi, a_hi, b_hi) + _EPS:
+            return False
+    return True
+
+
+def _subsumes(general: dict, specific: dict) -> bool:
+    """Условия general ⊆ условий specific, заключения specific ⊆ general."""
+    if general.get('priority') != specific.get('priority'):
+        return False
+    if any(specific['conditions'].get(v) != t
+           for v, t in general['conditions'].items()):
+        return False
+    return all(v in general['consequents'] and
+               tuple(general['consequents'][v]) == tuple(c)
+               for v, c in specific['consequents'].items())
+
+
+def analyze_rule_base(rules: Sequence[dict], terms: Dict[str, tuple],
+                      ranges: Optional[Dict[str, Interval]] = None,
+                      priority_weights: Optional[Dict[int, float]] = None
+                      ) -> RuleAnalysisReport:
+    """
+    Найти недостижимые, поглощённые и конфликтующие правила.
+
+    ranges — {переменная: (lo, hi)} достижимых пиков; переменные без
+    диапазона считаются лежащими в [0, 1]. priority_weights (этическая
+    модель) только уточняют текст конфликтов между приоритетами.
+    """
+    ranges = dict(ranges or {})
+    specs = {id(r): {v: resolve_term(t, terms) for v, t in r['conditions'].items()}
+             for r in rules}
+    report = RuleAnalysisReport(total=len(rules), ranges=ranges, max_activation={})
+
+    live = []
+    for rule in rules:
+        bounds = {v: max_membership(_range_of(ranges, v), spec)
+                  for v, spec in specs[id(rule)].items()}
+        w_max = min(bounds.values()) if bounds else 0.0
+        report.max_activation[rule['id']] = w_max
+        if w_max < ACTIVATION_EPS:
+            var = min(bounds, key=bounds.get) if bounds else None
+            lo, hi = _range_of(ranges, var) if var else (0.0, 0.0)
+            term = rule['conditions'].get(var) if var else None
+            report.findings.append(RuleFinding(
+                rule['id'], 'unreachable',
+                f"{var} = {term!r} не выполняется ни при каком пике "
+                f"из [{lo:.3f}, {hi:.3f}] (w ≤ {w_max:.2g})"
+                if var else "нет условий"))
+        else:
+            live.append(rule)
+
+    for i, a in enumerate(live):
+        for b in live[i + 1:]:
+            for general, specific in ((a, b), (b, a)):
+                if _subsumes(general, specific):
+                    same = general['conditions'] == specific['conditions']
+                    report.findings.append(RuleFinding(
+                        specific['id'], 'subsumed',
+                        f"дублирует {general['id']}" if same and
+                        general['consequents'] == specific['consequents'] else
+                        f"срабатывает только вместе с {general['id']} "
+                        f"и повторяет его заключения",
+                        general['id']))
+                    break
+            else:
+                _check_conflict(a, b, specs, ranges, priority_weights, report)
+    return report
+
+
+def _check_conflict(a: dict, b: dict, specs, ranges, priority_weights,
+                    report: RuleAnalysisReport):
+    if not _may_cofire(a, b, specs, ranges):
+        return
+    for var in a['consequents'].keys() & b['consequents'].keys():
+        interval = _range_of(ranges, var)
+        a_lo, a_hi = _delta_range(a['consequents'][var], interval)
+        b_lo, b_hi = _delta_range(b['consequents'][var], interval)
+        if (a_lo > _EPS and b_hi < -_EPS) or (a_hi < -_EPS and b_lo > _EPS):
+            reason = f"{var}: противоположные сдвиги при совместном срабатывании"
+            pa, pb = a.get('priority'), b.get('priority')
+            if priority_weights is not None and pa != pb:
+                reason += (f" (приоритеты {pa} и {pb}: "
+                           f"веса {priority_weights.get(pa, 1.0)} / "
+                           f"{priority_weights.get(pb, 1.0)})")
+            report.findings.append(RuleFinding(a['id'], 'conflict', reason, b['id']))
+
+
+def prune_rule_base(rules: Sequence[dict], terms: Dict[str, tuple],
+                    ranges: Optional[Dict[str, Interval]] = None,
+                    priority_weights: Optional[Dict[int, float]] = None
+                    ) -> Tuple[List[dict], RuleAnalysisReport]:
+    """
+    База без недостижимых правил (порядок сохраняется) и отчёт анализа
+    с заполненным `pruned`. Результат вывода на состояниях из `ranges`
+    не меняется: отсечённые правила там никогда не срабатывают.
+    """
+    report = analyze_rule_base(rules, terms, ranges, priority_weights)
+    dead = set(report.dead_ids)
+    report.pruned = [r['id'] for r in rules if r['id'] in dead]
+    return [r for r in rules if r['id'] not in dead], report
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Диапазоны переменных
+# ──────────────────────────────────────────────────────────────────────
+
+def uniform_ranges(var_names: Sequence[str], lo: float, hi: float
+                   ) -> Dict[str, Interval]:
+    """Одинаковый диапазон пиков для всех переменных."""
+    return {v: (lo, hi) for v in var_names}
+
+
+def ranges_from_box(box: Box, prefix: str) -> Dict[str, Interval]:
+    """Коробка scenario_analysis → диапазоны переменных модели ('emotion_' / 'ethic_')."""
+    return {k[len(prefix):]: iv for k, iv in box.items() if k.startswith(prefix)}
+
+
+def reachable_ranges(report: ReachabilityReport, prefix: str,
+                     tsk_passes: int = 1) -> Dict[str, Interval]:
+    """
+    Оболочка коробок всех достижимых узлов сети — диапазоны пиков, при
+    которых модели вообще применяют TSK-правила в сценарии.
+
+    `tsk_passes` — проходов TSK за шаг у навигатора, для которого
+    отсекаются правила; отчёт, построенный для меньшего числа проходов,
+    не покрывает его состояния, и диапазоны не выдаются (ValueError).
+    """
+    if tsk_passes > report.tsk_passes:
+        raise ValueError(
+            f"reachable_ranges: отчёт учитывает {report.tsk_passes} проход(ов) TSK, "
+            f"навигатор делает до {tsk_passes} — повторите анализ "
+            f"с tsk_passes={tsk_passes}")
+    boxes = [b for b in report.node_boxes.values() if b is not None]
+    if not boxes:
+        raise ValueError('reachable_ranges: нет достижимых узлов')
+    hull = dict(boxes[0])
+    for box in boxes[1:]:
+        hull = {k: (min(hull[k][0], box[k][0]), max(hull[k][1], box[k][1]))
+                for k in hull}
+    return ranges_from_box(hull, prefix)
+
+
+def main():
+    from emotional_model import ALL_EMOTIONS, EMOTION_TERMS, EMOTION_TSK_RULES
+    from ethical_model import ALL_ETHICS, ETHIC_TERMS, ETHIC_TSK_RULES, PRIORITY_WEIGHTS
+
+    parser = argparse.ArgumentParser(
+        description='Статический анализ баз TSK-правил')
+    parser.add_argument('--range', type=float, nargs=2, metavar=('LO', 'HI'),
+                        help='Диапазон пиков всех переменных (по умолчанию [0, 1])')
+    parser.add_argument('--scenario', action='store_true',
+                        help='Диапазоны, достижимые в сети «Кредитный скоринг»')
+    parser.add_argument('--profile', action='store_true',
+                        help='С --scenario: старт из окрестности BASE_AGENT')
+    parser.add_argument('--spread', type=float, default=0.1)
+    parser.add_argument('--tsk-passes', type=int, default=1,
+                        help='С --scenario: проходов TSK за шаг навигатора')
+    args = parser.parse_args()
+
+    em_ranges = eth_ranges = None
+    if args.scenario:
+        from scenario_analysis import analyze_reachability, profile_box
+        from seed_scenario import BASE_AGENT, EDGES, NODES
+        box = profile_box([BASE_AGENT], args.spread) if args.profile else None
+        reach = analyze_reachability(NODES, EDGES, start_box=box,
+                                     tsk_passes=args.tsk_passes)
+        em_ranges = reachable_ranges(reach, 'emotion_')
+        eth_ranges = reachable_ranges(reach, 'ethic_')
+    elif args.range:
+        em_ranges = uniform_ranges(ALL_EMOTIONS, *args.range)
+        eth_ranges = uniform_ranges(ALL_ETHICS, *args.range)
+
+    _, em = prune_rule_base(EMOTION_TSK_RULES, EMOTION_TERMS, em_ranges)
+    _, eth = prune_rule_base(ETHIC_TSK_RULES, ETHIC_TERMS, eth_ranges, PRIORITY_WEIGHTS)
+    print(em.format('Эмоциональные правила'))
+    print(eth.format('Этические правила'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+"""
+Загрузка баз TSK-правил и термов из внешних файлов (JSON / YAML).
+
+Формат файла — разделы моделей, каждый необязателен (отсутствующий
+раздел — встроенные правила модели):
+
+    {
+      "emotion": {
+        "terms": {"low": [0.0, 0.0, 0.4], "calm": ["trap", 0, 0, 0.2, 0.5]},
+        "rules": [
+          {"id": "ER01", "conditions": {"joy": "medium", "guilt": "low"},
+           "consequents": {"joy": [0.05, 1.0], "pride": [0.03, 1.0]},
+           "description": "Радость при низкой вине → радость и гордость растут"}
+        ]
+      },
+      "ethic": {"rules": [{"id": "ETH01", "priority": 1, ...}]}
+    }
+
+`terms` раздела необязателен (встроенные EMOTION_TERMS / ETHIC_TERMS);
+термы и условия допускают формы membership_shapes. YAML читается при
+установленном PyYAML.
+
+Файл проверяется (`validate_rule_base`) и компилируется один раз:
+при заданном `cache_dir` проверенная база и скомпилированные движки
+(`backends`) сохраняются на диск под SHA-256 содержимого файла, и
+повторная загрузка того же содержимого — в том числе другим процессом —
+не разбирает и не компилирует его заново. Кеш — pickle, поэтому
+`cache_dir` должен быть доверенным каталогом этого приложения.
+
+Горячая замена: `RuleFileWatcher` отслеживает файл и подменяет базу
+целиком одной ссылкой; `AgentNavigator.attach_rule_file()` применяет
+новую базу к моделям только между шагами навигации. Файл с ошибками не
+применяется — остаётся прежняя база, ошибка в `last_error`.
+
+Запуск:
+    python rule_files.py --export rules.json       # встроенные правила в файл
+    python rule_files.py --check rules.yaml        # проверить файл
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import pickle
+import re
+import stat
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from emotional_model import ALL_EMOTIONS, EMOTION_TERMS, EMOTION_TSK_RULES
+from ethical_model import ALL_ETHICS, ETHIC_TERMS, ETHIC_TSK_RULES, PRIORITY_WEIGHTS
+from membership_shapes import resolve_term
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - PyYAML необязателен
+    yaml = None
+
+# Версия формата дискового кеша (меняется при несовместимых изменениях)
+CACHE_FORMAT = 1
+
+# Допустимые id правил: id попадают в отчёты, имена и генерируемый код
+RULE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+# Раздел файла → (переменные, встроенные правила, встроенные термы, веса приоритетов)
+MODEL_SECTIONS: Dict[str, Tuple[List[str], List[dict], Dict[str, tuple],
+                                Optional[Dict[int, float]]]] = {
+    'emotion': (ALL_EMOTIONS, EMOTION_TSK_RULES, EMOTION_TERMS, None),
+    'ethic': (ALL_ETHICS, ETHIC_TSK_RULES, ETHIC_TERMS, PRIORITY_WEIGHTS),
+}
+
+
+class RuleFileError(ValueError):
+    """Ошибка формата или содержимого файла правил."""
+
+
+@dataclass
+class RuleBase:
+    """Проверенная база правил одной модели."""
+    kind: str                        # 'emotion' | 'ethic'
+    rules: List[dict]
+    terms: Dict[str, Any]
+
+
+@dataclass
+class RuleSet:
+    """Содержимое файла правил: базы моделей и хеш содержимого."""
+    digest: str
+    emotion: Optional[RuleBase] = None
+    ethic: Optional[RuleBase] = None
+    source: Optional[str] = None
+    from_cache: bool = False
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Разбор и проверка
+# ──────────────────────────────────────────────────────────────────────
+
+def parse_rule_text(text: str, fmt: str = 'json') -> Any:
+    """Разобрать текст файла правил ('json' | 'yaml')."""
+    if fmt == 'json':
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise RuleFileError(f"некорректный JSON: {exc}") from None
+    if fmt == 'yaml':
+        if yaml is None:
+            raise RuleFileError("для файлов YAML нужен PyYAML (pip install pyyaml)")
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError as exc:
+            raise RuleFileError(f"некорректный YAML: {exc}") from None
+    raise RuleFileError(f"неизвестный формат файла правил: {fmt!r}")
+
+
+def _format_of(path: Path) -> str:
+    return 'yaml' if path.suffix.lower() in ('.yaml', '.yml') else 'json'
+
+
+def _normalize_term(term, where: str, terms: Dict[str, Any]):
+    """Имя терма остаётся строкой, спецификация — кортежем; проверка формы."""
+    if isinstance(term, list):
+        term = tuple(term)
+    try:
+        resolve_term(term, terms)
+    except (ValueError, TypeError) as exc:
+        raise RuleFileError(f"{where}: {exc}") from None
+    return term
+
+
+def _number(value, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleFileError(f"{where}: ожидалось число, получено {value!r}")
+    if not math.isfinite(value):
+        raise RuleFileError(f"{where}: ожидалось конечное число, получено {value!r}")
+    return float(value)
+
+
+def validate_rule_base(kind: str, section: Any) -> RuleBase:
+    """
+    Проверить и нормализовать раздел файла (`emotion` / `ethic`).
+
+    Проверяется: уникальность id, известные переменные условий и
+    заключений, разрешимость термов, числовые коэффициенты (p0, p1),
+    приоритет 1…3 для этических правил.
+    """
+    if kind not in MODEL_SECTIONS:
+        raise RuleFileError(f"неизвестный раздел {kind!r} "
+                            f"(допустимо: {', '.join(MODEL_SECTIONS)})")
+    var_names, _, default_terms, weights = MODEL_SECTIONS[kind]
+    if not isinstance(section, dict) or not isinstance(section.get('rules'), list):
+        raise RuleFileError(f"{kind}: раздел должен содержать список 'rules'")
+    unknown_keys = set(section) - {'rules', 'terms'}
+    if unknown_keys:
+        raise RuleFileError(f"{kind}: неизвестные ключи {sorted(unknown_keys)}")
+
+    raw_terms = section.get('terms')
+    if raw_terms is None:
+        terms = default_terms
+    else:
+        if not isinstance(raw_terms, dict) or not raw_terms:
+            raise RuleFileError(f"{kind}.terms: ожидался непустой словарь термов")
+        terms = {}
+        for name, spec in raw_terms.items():
+            spec = _normalize_term(spec, f"{kind}.terms.{name}", {})
+            if isinstance(spec, str):
+                raise RuleFileError(f"{kind}.terms.{name}: ожидались параметры "
+                                    f"терма, получено имя {spec!r}")
+            terms[str(name)] = spec
+
+    known_vars = set(var_names)
+    seen_ids = set()
+    rules = []
+    for i, raw in enumerate(section['rules']):
+        where = f"{kind}.rules[{i}]"
+        if not isinstance(raw, dict):
+            raise RuleFileError(f"{where}: правило должно быть словарём")
+        rule_id = raw.get('id')
+        if not isinstance(rule_id, str) or not rule_id:
+            raise RuleFileError(f"{where}: нет строкового 'id'")
+        if not RULE_ID_PATTERN.match(rule_id):
+            raise RuleFileError(f"{where}: id {rule_id!r} — допустимы только "
+                                f"латиница, цифры и символы _ . -")
+        where = f"{where} ({rule_id})"
+        if rule_id in seen_ids:
+            raise RuleFileError(f"{where}: повторяющийся id")
+        seen_ids.add(rule_id)
+
+        conditions = raw.get('conditions')
+        consequents = raw.get('consequents')
+        if not isinstance(conditions, dict) or not conditions:
+            raise RuleFileError(f"{where}: 'conditions' — непустой словарь")
+        if not isinstance(consequents, dict) or not consequents:
+            raise RuleFileError(f"{where}: 'consequents' — непустой словарь")
+        for var in (*conditions, *consequents):
+            if var not in known_vars:
+                raise RuleFileError(f"{where}: неизвестная переменная {var!r}")
+
+        rule = {
+            'id': rule_id,
+            'conditions': {var: _normalize_term(term, f"{where}.conditions.{var}", terms)
+                           for var, term in conditions.items()},
+            'consequents': {},
+            'description': str(raw.get('description', '')),
+        }
+        for var, coeffs in consequents.items():
+            if not isinstance(coeffs, (list, tuple)) or len(coeffs) != 2:
+                raise RuleFileError(f"{where}.consequents.{var}: ожидалось [p0, p1]")
+            rule['consequents'][var] = (
+                _number(coeffs[0], f"{where}.consequents.{var}"),
+                _number(coeffs[1], f"{where}.consequents.{var}"))
+        if 'priority' in raw:
+            priority = raw['priority']
+            if weights is not None and (type(priority) is not int
+                                        or priority not in weights):
+                raise RuleFileError(f"{where}: приоритет должен быть одним из "
+                                    f"{sorted(weights)}, получено {priority!r}")
+            rule['priority'] = priority
+        rules.append(rule)
+    return RuleBase(kind, rules, terms)
+
+
+def parse_rule_set(data: Any, digest: str, source: Optional[str] = None) -> RuleSet:
+    """Проверить разобранный файл целиком."""
+    if not isinstance(data, dict) or not data:
+        raise RuleFileError("файл правил должен содержать разделы "
+                            f"{', '.join(MODEL_SECTIONS)}")
+    unknown = set(data) - set(MODEL_SECTIONS)
+    if unknown:
+        raise RuleFileError(f"неизвестные разделы {sorted(unknown)}")
+    bases = {kind: validate_rule_base(kind, section) for kind, section in data.items()}
+    return RuleSet(digest, bases.get('emotion'), bases.get('ethic'), source)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Компиляция и дисковый кеш
+# ──────────────────────────────────────────────────────────────────────
+
+def _compile(rule_set: RuleSet, backends: Sequence[str]) -> Dict[tuple, Any]:
+    """Скомпилировать базы набора движками `backends`: {(раздел, движок): движок}."""
+    from tsk_engine import get_engine
+
+    engines = {}
+    for base in (rule_set.emotion, rule_set.ethic):
+        if base is None:
+            continue
+        var_names, _, _, weights = MODEL_SECTIONS[base.kind]
+        for backend in backends:
+            if backend != 'python':
+                engines[(base.kind, backend)] = get_engine(
+                    backend, base.rules, var_names, base.terms, weights)
+    return engines
+
+
+def _register(rule_set: RuleSet, engines: Dict[tuple, Any]):
+    from tsk_engine import register_engine
+
+    for (kind, backend), engine in engines.items():
+        base = getattr(rule_set, kind)
+        var_names, _, _, weights = MODEL_SECTIONS[kind]
+        register_engine(backend, base.rules, var_names, base.terms, engine, weights)
+
+
+def _write_atomic(path: Path, payload: bytes):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _trusted_cache_dir(path: Path) -> bool:
+    """Каталог кеша не доступен на запись всем (POSIX; иначе — True)."""
+    try:
+        mode = path.stat().st_mode
+    except OSError:
+        return True                             # нет каталога — нечего читать
+    return os.name != 'posix' or not mode & stat.S_IWOTH
+
+
+def load_rule_bytes(data: bytes, fmt: str = 'json',
+                    cache_dir: Optional[os.PathLike] = None,
+                    backends: Sequence[str] = (),
+                    source: Optional[str] = None) -> RuleSet:
+    """
+    Загрузить набор правил из содержимого файла.
+
+    При `cache_dir` результат (проверенные базы и движки `backends`)
+    берётся из `<cache_dir>/<sha256>.pkl`, если он есть и содержит все
+    нужные движки; иначе вычисляется и записывается туда атомарно.
+
+    Кеш хранится в формате pickle, а чтение pickle исполняет код, поэтому
+    `cache_dir` должен быть доверенным: писать в него может только это
+    приложение (его пользователь). Каталог, доступный на запись всем,
+    не читается; запись, чей хеш не совпадает с содержимым файла,
+    отбрасывается и пересобирается.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = Path(cache_dir) / f'{digest}.pkl'
+        try:
+            if not _trusted_cache_dir(cache_path.parent):
+                raise OSError(f"каталог кеша доступен на запись всем: {cache_dir}")
+            with open(cache_path, 'rb') as f:
+                cached = pickle.load(f)
+            if (cached.get('format') == CACHE_FORMAT
+                    and cached['rule_set'].digest == digest
+                    and {b for _, b in cached['engines']} >= set(backends) - {'python'}):
+                rule_set = cached['rule_set']
+                rule_set.source, rule_set.from_cache = source, True
+                _register(rule_set, cached['engines'])
+                return rule_set
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError,
+                AttributeError, TypeError):
+            pass                                # нет или устарел — пересобрать
+
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError as exc:
+        raise RuleFileError(f"файл правил не в UTF-8: {exc}") from None
+    rule_set = parse_rule_set(parse_rule_text(text, fmt), digest, source)
+    engines = _compile(rule_set, backends)
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        source_name, rule_set.source = rule_set.source, None
+        try:
+            _write_atomic(cache_path, pickle.dumps(
+                {'format': CACHE_FORMAT, 'rule_set': rule_set, 'engines': engines}))
+        except OSError:
+            pass                                # кеш — лишь ускорение
+        finally:
+            rule_set.source = source_name
+    return rule_set
+
+
+def load_rule_file(path: os.PathLike, cache_dir: Optional[os.PathLike] = None,
+                   backends: Sequence[str] = ()) -> RuleSet:
+    """Загрузить набор правил из файла JSON / YAML (см. load_rule_bytes)."""
+    path = Path(path)
+    return load_rule_bytes(path.read_bytes(), _format_of(path), cache_dir,
+                           backends, str(path))
+
+
+def dump_rule_file(path: os.PathLike,
+                   emotion_rules: Optional[List[dict]] = EMOTION_TSK_RULES,
+                   ethic_rules: Optional[List[dict]] = ETHIC_TSK_RULES,
+                   emotion_terms: Optional[Dict[str, Any]] = EMOTION_TERMS,
+                   ethic_terms: Optional[Dict[str, Any]] = ETHIC_TERMS):
+    """Записать базы правил в файл JSON / YAML (по расширению)."""
+    data = {}
+    for kind, rules, terms in (('emotion', emotion_rules, emotion_terms),
+                               ('ethic', ethic_rules, ethic_terms)):
+        if rules is None:
+            continue
+        section: Dict[str, Any] = {'rules': json.loads(json.dumps(rules))}
+        if terms is not None:
+            section = {'terms': json.loads(json.dumps(terms)), **section}
+        data[kind] = section
+    path = Path(path)
+    if _format_of(path) == 'yaml':
+        if yaml is None:
+            raise RuleFileError("для файлов YAML нужен PyYAML (pip install pyyaml)")
+        text = yaml.safe_dump(data, allow_unicode=True, sort_keys=False)
+    else:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+    path.write_text(text, encoding='utf-8')
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Горячая замена
+# ──────────────────────────────────────────────────────────────────────
+
+class RuleFileWatcher:
+    """
+    Отслеживание файла правил с заменой набора одной ссылкой.
+
+    `poll()` не чаще раза в `poll_interval` секунд сравнивает mtime/размер
+    файла; при изменении сверяет SHA-256 содержимого и, если оно новое,
+    загружает и компилирует файл (через дисковый кеш). Успешно
+    загруженный набор подменяет `rule_set` целиком и увеличивает
+    `version`; при ошибке остаётся прежний набор, текст ошибки — в
+    `last_error`. Первая загрузка в конструкторе ошибки не скрывает.
+    """
+
+    def __init__(self, path: os.PathLike, cache_dir: Optional[os.PathLike] = None,
+                 backends: Sequence[str] = (), poll_interval: float = 1.0):
+        self.path = Path(path)
+        self.cache_dir = cache_dir
+        self.backends = tuple(backends)
+        self.poll_interval = poll_interval
+        self._stat = self._signature()
+        self.rule_set = load_rule_file(self.path, cache_dir, self.backends)
+        self.version = 1
+        self.last_error: Optional[str] = None
+        self._last_poll = time.monotonic()
+
+    def _signature(self) -> Tuple[int, int]:
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self, force: bool = False) -> bool:
+        """Проверить файл; True — загружен новый набор правил."""
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+        try:
+            signature = self._signature()
+            if signature == self._stat:
+                return False
+            self._stat = signature
+            data = self.path.read_bytes()
+            if hashlib.sha256(data).hexdigest() == self.rule_set.digest:
+                self.last_error = None          # содержимое = действующий набор
+                return False
+            rule_set = load_rule_bytes(data, _format_of(self.path), self.cache_dir,
+                                       self.backends, str(self.path))
+        except (OSError, RuleFileError) as exc:
+            self.last_error = f"{type(exc).__name__}: {exc}"
+            return False
+        self.rule_set = rule_set
+        self.version += 1
+        self.last_error = None
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Файлы баз TSK-правил')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--export', metavar='PATH',
+                       help='Записать встроенные правила и термы в файл')
+    group.add_argument('--check', metavar='PATH', help='Проверить файл правил')
+    args = parser.parse_args()
+
+    if args.export:
+        dump_rule_file(args.export)
+        print(f"Записано: {args.export}")
+        return
+    try:
+        rule_set = load_rule_file(args.check)
+    except (OSError, RuleFileError) as exc:
+        print(f"Ошибка: {exc}")
+        sys.exit(1)
+    for base in (rule_set.emotion, rule_set.ethic):
+        if base is not None:
+            print(f"{base.kind}: {len(base.rules)} правил, {len(base.terms)} термов")
+    print(f"sha256: {rule_set.digest}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Генератор больших баз TSK-правил и бенчмарк движков вывода.
+
+Базы правил, построенные из экспертных таблиц, содержат тысячи правил
+того же формата, что EMOTION_TSK_RULES / ETHIC_TSK_RULES. Генератор
+строит синтетическую базу заданного размера:
+
+  • 1…max_conditions условий на правило — случайные переменные с
+    термами low / medium / high;
+  • 1…max_consequents заключений y = p0 + 1.0·x с малым p0;
+  • при priorities=True — приоритеты 1…3 (как в этической модели).
+
+`benchmark_rule_backends` измеряет пропускную способность TSK-прохода
+модели для разных `rule_backend` на базах 10², 10³ и 10⁴ правил.
+
+Запуск:
+    python rule_generator.py                          # 10², 10³, 10⁴ правил
+    python rule_generator.py --sizes 1000 --backends numpy sparse
+"""
+
+import argparse
+import random
+import time
+from typing import Dict, List, Optional, Sequence
+
+from emotional_model import ALL_EMOTIONS, EMOTION_TERMS, EmotionalModel, Tri
+
+BENCH_SIZES = (100, 1000, 10000)
+BENCH_BACKENDS = ('python', 'numpy', 'codegen', 'sparse')
+
+
+def generate_rule_base(n_rules: int, var_names: Sequence[str] = ALL_EMOTIONS,
+                       terms: Sequence[str] = ('low', 'medium', 'high'),
+                       max_conditions: int = 3, max_consequents: int = 2,
+                       priorities: bool = False,
+                       seed: Optional[int] = None) -> List[dict]:
+    """Синтетическая база из `n_rules` правил в формате моделей."""
+    rng = random.Random(seed)
+    width = len(str(n_rules))
+    rules = []
+    for i in range(1, n_rules + 1):
+        cond_vars = rng.sample(list(var_names), rng.randint(1, max_conditions))
+        cons_vars = rng.sample(list(var_names), rng.randint(1, max_consequents))
+        rule = {
+            'id': f'GR{i:0{width}d}',
+            'conditions': {v: rng.choice(terms) for v in cond_vars},
+            'consequents': {v: (round(rng.uniform(-0.05, 0.05), 3), 1.0)
+                            for v in cons_vars},
+            'description': f'Сгенерированное правило {i}',
+        }
+        if priorities:
+            rule['priority'] = rng.randint(1, 3)
+        rules.append(rule)
+    return rules
+
+
+def benchmark_rule_backends(sizes: Sequence[int] = BENCH_SIZES,
+                            backends: Sequence[str] = BENCH_BACKENDS,
+                            n_states: int = 200,
+                            seed: Optional[int] = 0) -> List[Dict[str, float]]:
+    """
+    Пропускная способность `apply_tsk_rules()` EmotionalModel для каждой
+    пары (размер базы, rule_backend) на одних и тех же случайных состояниях.
+
+    Возвращает строки {'rules', 'backend', 'build_seconds',
+    'passes_per_second', 'mean_fired'}; build_seconds — первая компиляция
+    базы движком (для 'python' — 0).
+    """
+    from tsk_engine import get_engine
+
+    rng = random.Random(seed)
+    states = [[rng.random() for _ in ALL_EMOTIONS] for _ in range(n_states)]
+    rows = []
+    for size in sizes:
+        rules = generate_rule_base(size, seed=seed)
+        for backend in backends:
+            t0 = time.perf_counter()
+            if backend != 'python':
+                get_engine(backend, rules, ALL_EMOTIONS, EMOTION_TERMS)
+            build = time.perf_counter() - t0
+
+            model = EmotionalModel(backend)
+            model.rules = rules
+            fired = 0
+            t0 = time.perf_counter()
+            for peaks in states:
+                for name, b in zip(ALL_EMOTIONS, peaks):
+                    model.state[name] = Tri(b, b, b)
+                model.apply_tsk_rules()
+                fired += len(model.last_activations)
+            elapsed = time.perf_counter() - t0
+            rows.append({
+                'rules': size, 'backend': backend,
+                'build_seconds': round(build, 3),
+                'passes_per_second': round(n_states / elapsed, 1) if elapsed else 0.0,
+                'mean_fired': round(fired / n_states, 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Бенчмарк движков TSK-вывода на сгенерированных базах правил')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(BENCH_SIZES))
+    parser.add_argument('--backends', nargs='+', default=list(BENCH_BACKENDS))
+    parser.add_argument('--states', type=int, default=200,
+                        help='Число случайных состояний на замер')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'правил':>8} {'движок':<12} {'сборка, с':>10} "
+          f"{'проходов/с':>12} {'сработало':>10}")
+    for row in benchmark_rule_backends(args.sizes, args.backends,
+                                       args.states, args.seed):
+        print(f"{row['rules']:>8} {row['backend']:<12} {row['build_seconds']:>10} "
+              f"{row['passes_per_second']:>12} {row['mean_fired']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""
+Статический анализ достижимости сценарной сети в пространстве профилей.
+
+Вместо прогона конкретного агента анализ распространяет по сети
+ИНТЕРВАЛЬНЫЕ оценки пиков всех характеристик: для каждого узла строится
+«коробка» [lo, hi] по каждой переменной, надмножество всех состояний
+агентов, которые могут в этот узел прийти из заданной стартовой коробки.
+
+Переход по ребру u → v моделируется так же, как в `AgentNavigator`:
+  1. условия ребра сужают коробку узла u (`_le` ограничивает hi,
+     `_ge` — lo); если коробка становится пустой, ребро мёртвое;
+  2. барьер проверяется по максимально достижимому Sem + Seth;
+  3. сдвиги update_* ребра и узла v смещают интервалы (с клиппингом);
+  4. TSK-правила обеих моделей расширяют интервалы на максимальный
+     эффект правил, которые могут сработать в текущей коробке, — столько
+     проходов, сколько допускает навигатор (`tsk_max_iterations`).
+
+Оценка консервативна: ребро, помеченное мёртвым, не пройдёт ни один
+агент из стартовой коробки, и его можно исключить из навигации.
+
+Запуск (отчёт для сети «Кредитный скоринг»):
+    python scenario_analysis.py                # любые агенты, [0, 1]
+    python scenario_analysis.py --profile      # окрестность BASE_AGENT
+"""
+
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from condition_pack import unpack_conditions
+from emotional_model import (ALL_EMOTIONS, EMOTION_TERMS, EMOTION_TSK_RULES,
+                             NEGATIVE_EMOTIONS, POSITIVE_EMOTIONS, get_peak)
+from ethical_model import ALL_ETHICS, ETHIC_TERMS, ETHIC_TSK_RULES
+from membership_shapes import TermSpec, resolve_term
+
+# Интервал пика характеристики: (lo, hi), 0 ≤ lo ≤ hi ≤ 1
+Interval = Tuple[float, float]
+# Коробка состояний: {'emotion_<n>' | 'ethic_<n>': Interval}
+Box = Dict[str, Interval]
+
+_EPS = 1e-9
+
+# Число обновлений коробки узла, после которого изменяющиеся границы
+# расширяются до [0, 1] (гарантирует завершение анализа на циклах).
+WIDEN_AFTER: int = 8
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Операции над коробками
+# ──────────────────────────────────────────────────────────────────────
+
+def full_box() -> Box:
+    """Коробка «любой агент»: все пики в [0, 1]."""
+    box = {f'emotion_{e}': (0.0, 1.0) for e in ALL_EMOTIONS}
+    box.update({f'ethic_{e}': (0.0, 1.0) for e in ALL_ETHICS})
+    return box
+
+
+def profile_box(profiles: Iterable[dict], spread: float = 0.0) -> Box:
+    """
+    Оболочка набора профилей агента (формат `init_agent`), расширенная
+    на ±spread. Характеристики, не заданные в профиле, равны 0 —
+    так же, как при `init_agent`.
+    """
+    box: Box = {f'emotion_{e}': (1.0, 0.0) for e in ALL_EMOTIONS}
+    box.update({f'ethic_{e}': (1.0, 0.0) for e in ALL_ETHICS})
+    count = 0
+    for profile in profiles:
+        count += 1
+        for key in box:
+            peak = get_peak(profile[key]) if key in profile else 0.0
+            lo, hi = box[key]
+            box[key] = (min(lo, peak), max(hi, peak))
+    if not count:
+        raise ValueError('profile_box: требуется хотя бы один профиль')
+    return {k: (max(0.0, lo - spread), min(1.0, hi + spread))
+            for k, (lo, hi) in box.items()}
+
+
+def _hull(a: Box, b: Box) -> Box:
+    return {k: (min(a[k][0], b[k][0]), max(a[k][1], b[k][1])) for k in a}
+
+
+def _clip(x: float) -> float:
+    return max(0.0, min(1.0, x))
+
+
+def _cond_key(key: str) -> Optional[Tuple[str, str]]:
+    """'cond_em_fear_le' → ('emotion_fear', 'le'); прочие ключи → None."""
+    if not (key.endswith('_le') or key.endswith('_ge')):
+        return None
+    if key.startswith('cond_em_'):
+        return f'emotion_{key[8:-3]}', key[-2:]
+    if key.startswith('cond_eth_'):
+        return f'ethic_{key[9:-3]}', key[-2:]
+    return None
+
+
+def _update_key(key: str) -> Optional[str]:
+    """'update_em_fear' → 'emotion_fear'; прочие ключи → None."""
+    if key.startswith('update_em_'):
+        return f"emotion_{key[len('update_em_'):]}"
+    if key.startswith('update_eth_'):
+        return f"ethic_{key[len('update_eth_'):]}"
+    return None
+
+
+def restrict_by_conditions(box: Box, edge_props: dict
+                           ) -> Tuple[Optional[Box], List[str]]:
+    """
+    Сузить коробку условиями ребра.
+
+    Возвращает (суженная_коробка, []) или (None, причины), если хотя бы
+    одно неравенство невыполнимо ни для одного состояния коробки.
+    """
+    out = dict(box)
+    reasons: List[str] = []
+    for key, value in edge_props.items():
+        parsed = _cond_key(key)
+        if parsed is None:
+            continue
+        var, op = parsed
+        req = get_peak(value)
+        lo, hi = out.get(var, (0.0, 0.0))
+        if op == 'le':
+            hi = min(hi, req)
+        else:
+            lo = max(lo, req)
+        if lo > hi + _EPS:
+            sign = '≤' if op == 'le' else '≥'
+            reasons.append(f"{var}: требуется {sign} {req:.3f}, "
+                           f"достижимо [{box.get(var, (0.0, 0.0))[0]:.3f}, "
+                           f"{box.get(var, (0.0, 0.0))[1]:.3f}]")
+        out[var] = (lo, max(lo, hi))
+    return (None, reasons) if reasons else (out, [])
+
+
+def max_sem_seth(box: Box) -> float:
+    """Верхняя граница Sem + Seth по коробке (см. compute_sem/compute_seth)."""
+    pos = sum(box[f'emotion_{e}'][1] for e in POSITIVE_EMOTIONS) / len(POSITIVE_EMOTIONS)
+    neg = sum(box[f'emotion_{e}'][0] for e in NEGATIVE_EMOTIONS) / len(NEGATIVE_EMOTIONS)
+    virtues = [e for e in ALL_ETHICS if e != 'evil']
+    vir = sum(box[f'ethic_{e}'][1] for e in virtues) / len(virtues)
+    sem = 0.5 + (pos - neg) / 2.0
+    seth = 0.5 + (vir - box['ethic_evil'][0]) / 2.0
+    return sem + seth
+
+
+def apply_updates(box: Box, props: dict) -> Box:
+    """Сдвинуть интервалы на дельты update_em_*/update_eth_* (с клиппингом)."""
+    out = dict(box)
+    for key, delta in props.items():
+        var = _update_key(key)
+        if var is None or var not in out:
+            continue
+        lo, hi = out[var]
+        out[var] = (_clip(lo + float(delta)), _clip(hi + float(delta)))
+    return out
+
+
+def _term_may_fire(interval: Interval, spec: TermSpec) -> bool:
+    """
+    Может ли μ_term(x) > 0 хотя бы для одного x из интервала. Формы с
+    неограниченным носителем (gauss, sigmoid) считаются срабатывающими.
+    """
+    shape, params = spec
+    if shape not in ('tri', 'trap'):
+        return True
+    lo, hi = interval
+    a, b = params[0], params[1]
+    c, d = params[-2], params[-1]
+    left_ok = hi >= a - _EPS if abs(b - a) < _EPS else hi > a + _EPS
+    right_ok = lo <= d + _EPS if abs(d - c) < _EPS else lo < d - _EPS
+    return left_ok and right_ok
+
+
+def rule_may_fire(box: Box, rule: dict, terms: dict, prefix: str) -> bool:
+    """Может ли правило иметь w > 0 хотя бы для одного состояния коробки."""
+    return all(_term_may_fire(box.get(f'{prefix}{var}', (0.0, 0.0)),
+                              resolve_term(term, terms))
+               for var, term in rule['conditions'].items())
+
+
+def apply_tsk_bounds(box: Box, rules: List[dict], terms: dict,
+                     prefix: str) -> Box:
+    """
+    Расширить интервалы на максимальный эффект TSK-правил.
+
+    Новый пик переменной — взвешенное среднее выходов y = p0 + p1·x
+    сработавших правил (в этической модели — с весами приоритетов),
+    поэтому он лежит между минимальным и максимальным выходом среди
+    правил, которые могут сработать. Если не сработает ни одно, пик
+    не меняется — интервал объединяется с исходным.
+    """
+    out = dict(box)
+    firing = [r for r in rules if rule_may_fire(box, r, terms, prefix)]
+    for rule in firing:
+        for var, (p0, p1) in rule['consequents'].items():
+            key = f'{prefix}{var}'
+            if key not in box:
+                continue
+            lo, hi = box[key]
+            y_lo, y_hi = sorted((p0 + p1 * lo, p0 + p1 * hi))
+            cur_lo, cur_hi = out[key]
+            out[key] = (min(cur_lo, _clip(y_lo)), max(cur_hi, _clip(y_hi)))
+    return out
+
+
+def apply_tsk_passes(box: Box, emotion_rules: List[dict], ethic_rules: List[dict],
+                     passes: int = 1, emotion_terms: Optional[dict] = None,
+                     ethic_terms: Optional[dict] = None) -> Box:
+    """
+    До `passes` проходов TSK-правил обеих моделей, как в
+    `AgentNavigator.iterate_tsk`. Каждый проход объединяется со входом,
+    поэтому результат покрывает и состояния после меньшего числа
+    проходов (навигатор останавливается раньше при сходимости).
+    Останавливается на неподвижной точке; после WIDEN_AFTER проходов
+    изменяющиеся границы расширяются до [0, 1]. Термы по умолчанию —
+    EMOTION_TERMS / ETHIC_TERMS.
+    """
+    emotion_terms = EMOTION_TERMS if emotion_terms is None else emotion_terms
+    ethic_terms = ETHIC_TERMS if ethic_terms is None else ethic_terms
+    for n in range(passes):
+        new = apply_tsk_bounds(box, emotion_rules, emotion_terms, 'emotion_')
+        new = apply_tsk_bounds(new, ethic_rules, ethic_terms, 'ethic_')
+        if all(abs(new[k][0] - box[k][0]) < _EPS and abs(new[k][1] - box[k][1]) < _EPS
+               for k in new):
+            break
+        if n >= WIDEN_AFTER:
+            new = {k: (0.0 if new[k][0] < box[k][0] - _EPS else new[k][0],
+                       1.0 if new[k][1] > box[k][1] + _EPS else new[k][1])
+                   for k in new}
+        box = new
+    return box
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Анализ сети
+# ──────────────────────────────────────────────────────────────────────
+
+@dataclass
+class ReachabilityReport:
+    """
+    Результат статического анализа сценарной сети.
+
+    node_boxes — надмножество состояний агентов, приходящих в узел
+    (None — узел недостижим); dead_edges — рёбра, которые не пройдёт
+    ни один агент, с причинами. Отчёт корректен для навигатора, который
+    делает не больше `tsk_passes` проходов TSK за шаг.
+    """
+    start_id: str
+    node_boxes: Dict[str, Optional[Box]]
+    dead_edges: Dict[str, List[str]] = field(default_factory=dict)
+    unreachable_nodes: List[str] = field(default_factory=list)
+    unreachable_verdicts: List[str] = field(default_factory=list)
+    iterations: int = 0
+    complete: bool = True                   # False — прерван по max_iterations
+    tsk_passes: int = 1                     # учтённые проходы TSK за шаг
+
+    def live_edge_filter(self, edges: List[dict]) -> List[dict]:
+        """Вернуть рёбра (формат `EDGES`) без мёртвых."""
+        return [e for e in edges if e.get('id') not in self.dead_edges]
+
+    def format(self) -> str:
+        """Текстовый отчёт для консоли/логов."""
+        lines = [f"Анализ достижимости (старт: {self.start_id}, "
+                 f"итераций: {self.iterations})"]
+        if not self.complete:
+            lines.append("  Анализ прерван по пределу итераций — "
+                         "мёртвые рёбра не определены")
+            return "\n".join(lines)
+        if not self.dead_edges and not self.unreachable_nodes:
+            lines.append("  Мёртвых рёбер и недостижимых узлов не найдено")
+        for edge_id, reasons in sorted(self.dead_edges.items()):
+            lines.append(f"  ✗ ребро {edge_id} никогда не проходится:")
+            lines.extend(f"      {r}" for r in reasons)
+        for node_id in self.unreachable_nodes:
+            mark = ' (вердикт недостижим)' if node_id in self.unreachable_verdicts else ''
+            lines.append(f"  ✗ узел {node_id} недостижим{mark}")
+        return "\n".join(lines)
+
+
+def analyze_reachability(nodes: List[dict], edges: List[dict],
+                         start_id: str = 'V0',
+                         start_box: Optional[Box] = None,
+                         emotion_rules: Optional[List[dict]] = None,
+                         ethic_rules: Optional[List[dict]] = None,
+                         max_iterations: Optional[int] = None,
+                         tsk_passes: int = 1,
+                         emotion_terms: Optional[dict] = None,
+                         ethic_terms: Optional[dict] = None) -> ReachabilityReport:
+    """
+    Распространить интервальные оценки от `start_id` по сети.
+
+    Args:
+        nodes, edges: сеть в формате `seed_scenario.NODES/EDGES` либо
+                      `AgentNavigator.fetch_graph_topology_full()`
+        start_box: стартовая коробка (по умолчанию — `full_box()`)
+        emotion_rules, ethic_rules: базы правил (по умолчанию — правила
+                      модулей emotional_model / ethical_model)
+        max_iterations: предел числа итераций; если он достигнут, отчёт
+                      неполон (complete=False) и мёртвые рёбра не
+                      сообщаются — иначе вывод был бы некорректным
+        tsk_passes: число проходов TSK за шаг (`tsk_max_iterations`
+                      навигатора); при меньшем значении коробки не
+                      покрывают состояния после повторных проходов
+        emotion_terms, ethic_terms: термы, на которые ссылаются правила
+                      (по умолчанию — EMOTION_TERMS / ETHIC_TERMS)
+    """
+    if tsk_passes < 1:
+        raise ValueError(f"tsk_passes должно быть ≥ 1: {tsk_passes}")
+    emotion_rules = EMOTION_TSK_RULES if emotion_rules is None else emotion_rules
+    ethic_rules = ETHIC_TSK_RULES if ethic_rules is None else ethic_rules
+    node_props = {n['id']: n for n in nodes}
+    out_edges: Dict[str, List[dict]] = {}
+    for e in edges:
+        out_edges.setdefault(e['from'], []).append(e)
+
+    boxes: Dict[str, Optional[Box]] = {n['id']: None for n in nodes}
+    boxes[start_id] = dict(start_box or full_box())
+    updates_count: Dict[str, int] = {}
+    ever_live: Set[str] = set()
+    last_reasons: Dict[str, List[str]] = {}
+
+    worklist = [start_id]
+    iterations = 0
+    while worklist and (max_iterations is None or iterations < max_iterations):
+        iterations += 1
+        u = worklist.pop()
+        box_u = boxes[u]
+        for e in out_edges.get(u, []):
+            restricted, reasons = restrict_by_conditions(box_u, unpack_conditions(e))
+            if restricted is None:
+                last_reasons[e['id']] = reasons
+                continue
+            barrier = float(e.get('barrier', 1.0))
+            if max_sem_seth(restricted) <= barrier + _EPS:
+                last_reasons[e['id']] = [
+                    f"барьер β = {barrier:.3f} ≥ max(Sem + Seth) = "
+                    f"{max_sem_seth(restricted):.3f}"]
+                continue
+            ever_live.add(e['id'])
+            arrived = apply_updates(restricted, e)
+            arrived = apply_updates(arrived, node_props.get(e['to'], {}))
+            arrived = apply_tsk_passes(arrived, emotion_rules, ethic_rules, tsk_passes,
+                                       emotion_terms, ethic_terms)
+
+            v = e['to']
+            old = boxes.get(v)
+            new = arrived if old is None else _hull(old, arrived)
+            if old is not None and all(
+                    abs(new[k][0] - old[k][0]) < _EPS and abs(new[k][1] - old[k][1]) < _EPS
+                    for k in new):
+                continue
+            updates_count[v] = updates_count.get(v, 0) + 1
+            if old is not None and updates_count[v] > WIDEN_AFTER:
+                new = {k: (0.0 if new[k][0] < old[k][0] - _EPS else new[k][0],
+                           1.0 if new[k][1] > old[k][1] + _EPS else new[k][1])
+                       for k in new}
+            boxes[v] = new
+            if v not in worklist:
+                worklist.append(v)
+
+    report = ReachabilityReport(start_id=start_id, node_boxes=boxes,
+                                iterations=iterations,
+                                complete=not worklist, tsk_passes=tsk_passes)
+    if worklist:
+        return report
+    for e in edges:
+        if e['id'] in ever_live:
+            continue
+        if boxes.get(e['from']) is None:
+            report.dead_edges[e['id']] = [f"исходный узел {e['from']} недостижим"]
+        else:
+            report.dead_edges[e['id']] = last_reasons.get(e['id'], [])
+    report.unreachable_nodes = [n['id'] for n in nodes if boxes[n['id']] is None]
+    report.unreachable_verdicts = [n['id'] for n in nodes
+                                   if boxes[n['id']] is None and n.get('verdict')]
+    return report
+
+
+def analyze_live_graph(navigator, start_id: str = 'V0',
+                       start_box: Optional[Box] = None) -> ReachabilityReport:
+    """Анализ графа, загруженного в Neo4j (через навигатор)."""
+    nodes, edges = navigator.fetch_graph_topology_full()
+    return analyze_reachability(
+        nodes, edges, start_id=start_id, start_box=start_box,
+        emotion_rules=navigator.emotional_model.rules,
+        ethic_rules=navigator.ethical_model.rules,
+        tsk_passes=navigator.tsk_max_iterations,
+        emotion_terms=navigator.emotional_model.terms,
+        ethic_terms=navigator.ethical_model.terms)
+
+
+def main():
+    from seed_scenario import BASE_AGENT, EDGES, NODES
+
+    parser = argparse.ArgumentParser(
+        description='Статический анализ достижимости сценарной сети')
+    parser.add_argument('--start', default='V0', help='Начальный узел')
+    parser.add_argument('--profile', action='store_true',
+                        help='Стартовая коробка — окрестность BASE_AGENT '
+                             'вместо [0, 1]')
+    parser.add_argument('--spread', type=float, default=0.1,
+                        help='Расширение окрестности профиля (±)')
+    parser.add_argument('--tsk-passes', type=int, default=1,
+                        help='Проходов TSK за шаг (tsk_max_iterations навигатора)')
+    args = parser.parse_args()
+
+    box = profile_box([BASE_AGENT], args.spread) if args.profile else None
+    print(analyze_reachability(NODES, EDGES, args.start, box,
+                               tsk_passes=args.tsk_passes).format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,373 @@
+"""
+Генератор синтетических сценарных сетей большого размера.
+
+Сеть «Кредитный скоринг» (seed_scenario.py) содержит 9 узлов и 8 рёбер —
+для измерения производительности этого мало. Генератор строит сети
+той же схемы свойств (cond_em_*_le/_ge, cond_eth_*_le/_ge, update_*,
+barrier, verdict, description) на 10^3–10^6 узлов.
+
+Топология — слоистый граф глубины `depth`: узлы распределены по слоям,
+каждый узел получает исходящие рёбра в следующий слой (число рёбер —
+из распределения `fanout`), каждый узел слоя l+1 имеет хотя бы одного
+родителя. С вероятностью `cycle_prob` узел получает обратное ребро
+в один из предыдущих слоёв. Узлы без исходящих рёбер — терминальные
+и несут вердикт.
+
+Вывод:
+  - списки NODES/EDGES (в памяти) и ScenarioGraph (локальное хранилище);
+  - файл JSON Lines (ScenarioGraph.save_jsonl);
+  - Neo4j (пакетная загрузка через UNWIND).
+
+Запуск:
+    python scenario_generator.py --nodes 100000 --out big.jsonl
+    python scenario_generator.py --nodes 10000 --neo4j --uri ... \\
+                                 --user neo4j --password <пароль>
+    python scenario_generator.py --nodes 100000 --bench 200
+"""
+
+import argparse
+import math
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from neo4j import GraphDatabase
+
+from condition_pack import pack_conditions
+from emotional_model import ALL_EMOTIONS
+from ethical_model import ALL_ETHICS
+from scenario_graph import ScenarioGraph
+
+# Распределения числа исходящих рёбер узла
+FANOUT_DISTRIBUTIONS = ('fixed', 'uniform', 'poisson', 'geometric')
+
+# Все переменные, которые могут входить в условия и обновления:
+# (префикс условия, префикс обновления, имя)
+_VARIABLES: List[Tuple[str, str, str]] = (
+    [('cond_em_', 'update_em_', e) for e in ALL_EMOTIONS]
+    + [('cond_eth_', 'update_eth_', e) for e in ALL_ETHICS]
+)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Генерация
+# ──────────────────────────────────────────────────────────────────────
+
+def _sample_fanout(rng: random.Random, distribution: str,
+                   mean: float, max_fanout: int) -> int:
+    """Число исходящих рёбер узла (≥ 1, ≤ max_fanout)."""
+    if distribution == 'fixed':
+        k = int(round(mean))
+    elif distribution == 'uniform':
+        k = rng.randint(1, max(1, int(round(2 * mean - 1))))
+    elif distribution == 'poisson':
+        # Алгоритм Кнута — достаточно для малых средних
+        limit, k, p = math.exp(-mean), 0, 1.0
+        while True:
+            p *= rng.random()
+            if p <= limit:
+                break
+            k += 1
+    elif distribution == 'geometric':
+        # Успех с вероятностью 1/mean; при mean ≤ 1 — всегда одно ребро
+        p = 1.0 / max(mean, 1.0)
+        k = 1
+        while rng.random() > p:
+            k += 1
+    else:
+        raise ValueError(f"неизвестное распределение fanout: {distribution!r} "
+                         f"(допустимо: {', '.join(FANOUT_DISTRIBUTIONS)})")
+    return max(1, min(max_fanout, k))
+
+
+def _tri_around(rng: random.Random, lo: float, hi: float) -> List[float]:
+    b = round(rng.uniform(lo, hi), 2)
+    return [round(max(0.0, b - 0.1), 2), b, round(min(1.0, b + 0.1), 2)]
+
+
+def _edge_props(rng: random.Random, edge_id: str, cond_density: float,
+                update_density: float,
+                barrier_range: Tuple[float, float]) -> dict:
+    props = {'id': edge_id,
+             'description': f'Синтетическое действие {edge_id}',
+             'barrier': round(rng.uniform(*barrier_range), 2)}
+    conds = [v for v in _VARIABLES if rng.random() < cond_density]
+    if not conds:
+        conds = [rng.choice(_VARIABLES)]
+    for cond_prefix, _, name in conds:
+        # '_le' требует умеренно высокого порога, '_ge' — умеренно низкого:
+        # иначе случайная сеть почти вся становится непроходимой
+        if rng.random() < 0.5:
+            props[f'{cond_prefix}{name}_le'] = _tri_around(rng, 0.4, 0.9)
+        else:
+            props[f'{cond_prefix}{name}_ge'] = _tri_around(rng, 0.1, 0.6)
+    for _, update_prefix, name in _VARIABLES:
+        if rng.random() < update_density / 4:
+            props[f'{update_prefix}{name}'] = round(rng.uniform(-0.1, 0.1), 2)
+    return props
+
+
+def _node_props(rng: random.Random, node_id: str,
+                update_density: float) -> dict:
+    props = {'id': node_id, 'description': f'Синтетическая ситуация {node_id}'}
+    for _, update_prefix, name in _VARIABLES:
+        if rng.random() < update_density:
+            props[f'{update_prefix}{name}'] = round(rng.uniform(-0.15, 0.15), 2)
+    return props
+
+
+def generate_scenario(n_nodes: int = 1000,
+                      fanout: str = 'poisson',
+                      mean_fanout: float = 2.5,
+                      max_fanout: int = 8,
+                      depth: Optional[int] = None,
+                      cycle_prob: float = 0.0,
+                      cond_density: float = 0.15,
+                      update_density: float = 0.1,
+                      barrier_range: Tuple[float, float] = (0.6, 1.2),
+                      seed: Optional[int] = None,
+                      prefix: str = 'G') -> Tuple[List[dict], List[dict]]:
+    """
+    Сгенерировать сеть в формате `seed_scenario.NODES/EDGES`.
+
+    Args:
+        n_nodes: число узлов (корень — `<prefix>0`)
+        fanout: распределение числа исходящих рёбер
+                ('fixed' | 'uniform' | 'poisson' | 'geometric')
+        mean_fanout, max_fanout: среднее и верхняя граница fanout
+        depth: число слоёв; по умолчанию ⌈log_fanout(n)⌉ + 1
+        cycle_prob: вероятность обратного ребра у нетерминального узла
+        cond_density: вероятность того, что переменная входит в условия
+                      ребра (у ребра всегда есть хотя бы одно условие)
+        update_density: вероятность сдвига update_* переменной на узле
+        barrier_range: диапазон барьеров активации β
+        seed: зерно генератора (воспроизводимость)
+
+    Returns:
+        (nodes, edges)
+    """
+    if n_nodes < 1:
+        raise ValueError('n_nodes должно быть ≥ 1')
+    if not mean_fanout > 0:
+        raise ValueError(f'mean_fanout должно быть > 0: {mean_fanout!r}')
+    rng = random.Random(seed)
+    if depth is None:
+        depth = (int(math.ceil(math.log(max(n_nodes, 2), max(mean_fanout, 1.5)))) + 1
+                 if n_nodes > 1 else 1)
+    depth = max(1, min(depth, n_nodes))
+
+    # Распределение узлов по слоям: корень отдельно, остальные — поровну
+    layers: List[List[str]] = [[f'{prefix}0']]
+    rest = n_nodes - 1
+    for layer in range(1, depth):
+        size = rest // (depth - layer)
+        start = n_nodes - rest
+        layers.append([f'{prefix}{i}' for i in range(start, start + size)])
+        rest -= size
+
+    nodes = [_node_props(rng, node_id, update_density)
+             for layer in layers for node_id in layer]
+
+    edges: List[dict] = []
+    counter = 0
+
+    def add_edge(src: str, dst: str):
+        nonlocal counter
+        counter += 1
+        edge_id = f'{prefix}E{counter}'
+        props = _edge_props(rng, edge_id, cond_density, update_density,
+                            barrier_range)
+        edges.append({'from': src, 'to': dst, **props})
+
+    for depth_index in range(len(layers) - 1):
+        parents, children = layers[depth_index], layers[depth_index + 1]
+        if not children:
+            break
+        has_parent = set()
+        for src in parents:
+            k = min(len(children),
+                    _sample_fanout(rng, fanout, mean_fanout, max_fanout))
+            for dst in rng.sample(children, k):
+                add_edge(src, dst)
+                has_parent.add(dst)
+        for dst in children:
+            if dst not in has_parent:
+                add_edge(rng.choice(parents), dst)
+        if cycle_prob > 0 and depth_index > 0:
+            for src in parents:
+                if rng.random() < cycle_prob:
+                    back_layer = layers[rng.randrange(depth_index)]
+                    add_edge(src, rng.choice(back_layer))
+
+    has_out = {e['from'] for e in edges}
+    for node in nodes:
+        if node['id'] not in has_out:
+            node['verdict'] = f"Синтетический вердикт узла {node['id']}"
+    return nodes, edges
+
+
+def generate_graph(**kwargs) -> ScenarioGraph:
+    """`generate_scenario` сразу в локальное хранилище."""
+    return ScenarioGraph.from_lists(*generate_scenario(**kwargs))
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Загрузка в Neo4j (пакетами)
+# ──────────────────────────────────────────────────────────────────────
+
+def load_to_neo4j(uri: str, user: str, password: str,
+                  nodes: List[dict], edges: List[dict],
+                  batch_size: int = 5000, clear: bool = True,
+                  verbose: bool = True, scenario: Optional[str] = None):
+    """
+    Загрузить сеть в Neo4j пакетами UNWIND (по `batch_size` записей).
+
+    В отличие от `seed_scenario.load_scenario`, рассчитан на 10^5–10^6
+    узлов: создаёт индекс по :State(id) до загрузки рёбер.
+    scenario — загрузить сеть как сценарий цепочки с этим именем (None —
+    базовый граф). ВНИМАНИЕ: при clear=True удаляет все узлы :State
+    этого сценария.
+    """
+    from seed_scenario import scenario_filter
+
+    in_scenario = scenario_filter('n', scenario)
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    try:
+        with driver.session() as session:
+            if clear:
+                while True:
+                    deleted = session.run(f"""
+                        MATCH (n:State) WHERE {in_scenario} WITH n LIMIT $limit
+                        DETACH DELETE n RETURN count(*) AS c
+                    """, limit=batch_size, scenario=scenario).single()['c']
+                    if not deleted:
+                        break
+            session.run("CREATE INDEX state_id IF NOT EXISTS "
+                        "FOR (n:State) ON (n.id)")
+            if scenario is not None:
+                nodes = [{**n, 'scenario': scenario} for n in nodes]
+            for i in range(0, len(nodes), batch_size):
+                session.run("UNWIND $rows AS row CREATE (n:State) SET n = row",
+                            rows=nodes[i:i + batch_size])
+            for i in range(0, len(edges), batch_size):
+                rows = [{'from': e['from'], 'to': e['to'],
+                         'props': {k: v for k, v in e.items()
+                                   if k not in ('from', 'to')}}
+                        for e in edges[i:i + batch_size]]
+                session.run(f"""
+                    UNWIND $rows AS row
+                    MATCH (a:State {{id: row.from}}), (b:State {{id: row.to}})
+                    WHERE {scenario_filter('a', scenario)}
+                      AND {scenario_filter('b', scenario)}
+                    CREATE (a)-[r:TRANSITION]->(b)
+                    SET r = row.props
+                """, rows=rows, scenario=scenario)
+            session.run("MERGE (m:ScenarioMeta) SET m.version = timestamp()")
+            if verbose:
+                print(f"Загружено в Neo4j: {len(nodes)} узлов, {len(edges)} рёбер")
+    finally:
+        driver.close()
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Бенчмарк офлайн-навигации
+# ──────────────────────────────────────────────────────────────────────
+
+def random_profile(rng: random.Random) -> Dict[str, List[float]]:
+    """Случайный профиль агента в формате `init_agent`."""
+    profile = {}
+    for name in ALL_EMOTIONS:
+        profile[f'emotion_{name}'] = _tri_around(rng, 0.0, 0.7)
+    for name in ALL_ETHICS:
+        profile[f'ethic_{name}'] = _tri_around(rng, 0.2, 0.9)
+    return profile
+
+
+def benchmark_navigation(graph: ScenarioGraph, n_agents: int = 100,
+                         start_id: str = 'G0', max_steps: int = 1000,
+                         seed: Optional[int] = None) -> Dict[str, float]:
+    """Прогнать `n_agents` случайных агентов по сети без Neo4j."""
+    import contextlib
+    import io
+
+    from agent_navigator import AgentNavigator
+
+    rng = random.Random(seed)
+    nav = AgentNavigator(graph=graph)
+    steps = 0
+    t0 = time.perf_counter()
+    for _ in range(n_agents):
+        with contextlib.redirect_stdout(io.StringIO()):
+            nav.init_agent(random_profile(rng))
+        current = start_id
+        for _ in range(max_steps):
+            result = nav.step(current)
+            if result is None:
+                break
+            steps += 1
+            current = result.to_node
+    elapsed = time.perf_counter() - t0
+    return {'agents': n_agents, 'steps': steps, 'seconds': round(elapsed, 3),
+            'steps_per_second': round(steps / elapsed, 1) if elapsed else 0.0}
+
+
+def main():
+    from seed_scenario import _load_secrets_toml
+
+    parser = argparse.ArgumentParser(
+        description='Генерация синтетической сценарной сети')
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--fanout', choices=FANOUT_DISTRIBUTIONS, default='poisson')
+    parser.add_argument('--mean-fanout', type=float, default=2.5)
+    parser.add_argument('--max-fanout', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=None)
+    parser.add_argument('--cycles', type=float, default=0.0,
+                        help='Вероятность обратного ребра')
+    parser.add_argument('--cond-density', type=float, default=0.15)
+    parser.add_argument('--update-density', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--packed', action='store_true',
+                        help='Упаковать условия рёбер в массивы (condition_pack)')
+    parser.add_argument('--out', help='Файл JSON Lines для сохранения сети')
+    parser.add_argument('--neo4j', action='store_true', help='Загрузить в Neo4j')
+    parser.add_argument('--scenario',
+                        help='С --neo4j: загрузить как сценарий цепочки с этим именем')
+    parser.add_argument('--uri')
+    parser.add_argument('--user')
+    parser.add_argument('--password')
+    parser.add_argument('--bench', type=int, default=0,
+                        help='Прогнать N случайных агентов офлайн')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    nodes, edges = generate_scenario(
+        n_nodes=args.nodes, fanout=args.fanout, mean_fanout=args.mean_fanout,
+        max_fanout=args.max_fanout, depth=args.depth, cycle_prob=args.cycles,
+        cond_density=args.cond_density, update_density=args.update_density,
+        seed=args.seed)
+    if args.packed:
+        edges = [pack_conditions(e) for e in edges]
+    print(f"Сгенерировано: {len(nodes)} узлов, {len(edges)} рёбер "
+          f"за {time.perf_counter() - t0:.2f} с")
+
+    graph = ScenarioGraph.from_lists(nodes, edges)
+    if args.out:
+        graph.save_jsonl(args.out)
+        print(f"Сохранено в {args.out}")
+    if args.neo4j:
+        secrets = _load_secrets_toml()
+        uri = args.uri or secrets.get('uri')
+        user = args.user or secrets.get('user')
+        password = args.password or secrets.get('password')
+        if not (uri and user and password):
+            print('Ошибка: укажите --uri/--user/--password или заполните '
+                  '.streamlit/secrets.toml (секция [neo4j])')
+            sys.exit(1)
+        load_to_neo4j(uri, user, password, nodes, edges, scenario=args.scenario)
+    if args.bench:
+        print(benchmark_navigation(graph, args.bench, seed=args.seed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Локальное (in-memory) хранилище сценарной сети.
+
+`ScenarioGraph` хранит узлы и рёбра в формате `seed_scenario.NODES/EDGES`
+и отдаёт исходящие рёбра узла в том же виде, что и Cypher-запрос
+`AgentNavigator.step()`: (edge_id, next_id, edge_props, next_props).
+Используется для офлайн-прогонов и бенчмарков без Neo4j:
+
+    graph = ScenarioGraph.from_lists(NODES, EDGES)
+    nav = AgentNavigator(graph=graph)
+    nav.navigate('V0', BASE_AGENT)
+
+Сеть можно сохранить в файл JSON Lines (по одной записи на строку —
+формат читается потоково и подходит для сетей из 10^6 узлов).
+"""
+
+import json
+from typing import Dict, Iterable, List, Tuple
+
+
+class ScenarioGraph:
+    """Сценарная сеть в памяти: свойства узлов и списки смежности."""
+
+    def __init__(self):
+        self.nodes: Dict[str, dict] = {}
+        self.adjacency: Dict[str, List[Tuple[str, str, dict]]] = {}
+        self.edge_count = 0
+        # Увеличивается при каждом изменении сети — по версии навигатор
+        # сбрасывает кеш окрестностей (AgentNavigator.refresh_graph_version)
+        self.version = 0
+
+    @classmethod
+    def from_lists(cls, nodes: Iterable[dict],
+                   edges: Iterable[dict]) -> 'ScenarioGraph':
+        graph = cls()
+        for node in nodes:
+            graph.add_node(node)
+        for edge in edges:
+            graph.add_edge(edge)
+        return graph
+
+    def add_node(self, node: dict):
+        self.nodes[node['id']] = node
+        self.version += 1
+
+    def add_edge(self, edge: dict):
+        """Добавить ребро в формате `EDGES` (ключи 'from'/'to' + свойства)."""
+        props = {k: v for k, v in edge.items() if k not in ('from', 'to')}
+        self.adjacency.setdefault(edge['from'], []).append(
+            (props.get('id'), edge['to'], props))
+        self.edge_count += 1
+        self.version += 1
+
+    def edges_from(self, node_id: str) -> List[Tuple[str, str, dict, dict]]:
+        """Исходящие рёбра: (edge_id, next_id, edge_props, next_props)."""
+        return [(edge_id, next_id, props, self.nodes.get(next_id, {}))
+                for edge_id, next_id, props in self.adjacency.get(node_id, [])]
+
+    def to_lists(self) -> Tuple[List[dict], List[dict]]:
+        """Обратное преобразование в списки формата NODES/EDGES."""
+        edges = []
+        for from_id, out in self.adjacency.items():
+            for _, to_id, props in out:
+                edges.append({'from': from_id, 'to': to_id, **props})
+        return list(self.nodes.values()), edges
+
+    # ── Файлы JSON Lines ───────────────────────────────────────────
+
+    def save_jsonl(self, path: str):
+        """Сохранить сеть: строки {"node": {...}} и {"edge": {...}}."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for node in self.nodes.values():
+                f.write(json.dumps({'node': node}, ensure_ascii=False) + '\n')
+            for from_id, out in self.adjacency.items():
+                for _, to_id, props in out:
+                    edge = {'from': from_id, 'to': to_id, **props}
+                    f.write(json.dumps({'edge': edge}, ensure_ascii=False) + '\n')
+
+    @classmethod
+    def load_jsonl(cls, path: str) -> 'ScenarioGraph':
+        graph = cls()
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'node' in record:
+                    graph.add_node(record['node'])
+                else:
+                    graph.add_edge(record['edge'])
+        return graph
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return f"ScenarioGraph({len(self.nodes)} узлов, {self.edge_count} рёбер)"
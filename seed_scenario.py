@@ -37,10 +37,12 @@
 
 import argparse
 import sys
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from neo4j import GraphDatabase
 
+from condition_pack import pack_conditions
+
 
 # ──────────────────────────────────────────────────────────────────────
 #  Профиль агента из примера: ответственный, сострадательный аналитик
@@ -78,6 +80,10 @@ BASE_AGENT: Dict[str, List[float]] = {
 #    update_em_*/update_eth_*  — реакция агента на ситуацию: сдвиг
 #                                тройки Tri характеристики на дельту,
 #                                применяется при ВХОДЕ в узел
+#    next_scenario, next_entry — (необязательно, у терминальных узлов)
+#                                следующий сценарий цепочки и его входной
+#                                узел: навигатор продолжает в нём с тем же
+#                                состоянием агента (AgentNavigator.navigate)
 # ──────────────────────────────────────────────────────────────────────
 
 NODES: List[dict] = [
@@ -267,8 +273,27 @@ EDGES: List[dict] = [
 #  Загрузка в Neo4j
 # ──────────────────────────────────────────────────────────────────────
 
-def load_scenario(uri: str, user: str, password: str, verbose: bool = True):
-    """Удалить старый граф :State и создать сеть «Кредитный скоринг»."""
+def scenario_filter(var: str, scenario: Optional[str]) -> str:
+    """
+    Условие Cypher «узел `var` принадлежит сценарию» (параметр $scenario;
+    None — базовый граф, узлы без свойства scenario).
+    """
+    if scenario is None:
+        return f"{var}.scenario IS NULL"
+    return f"{var}.scenario = $scenario"
+
+
+def load_scenario(uri: str, user: str, password: str, verbose: bool = True,
+                  packed: bool = False, scenario: Optional[str] = None):
+    """
+    Удалить старый граф :State и создать сеть «Кредитный скоринг».
+
+    packed=True — условия рёбер записываются упакованными массивами
+    (condition_pack: cond_pack_slots/ops/tri) вместо именованных свойств.
+    scenario — загрузить сеть как сценарий цепочки с этим именем (узлы
+    получают свойство scenario, см. `AgentNavigator.load_scenario`);
+    удаляются и заменяются только узлы этого сценария. None — базовый граф.
+    """
     driver = GraphDatabase.driver(uri, auth=(user, password))
     try:
         with driver.session() as session:
@@ -277,14 +302,16 @@ def load_scenario(uri: str, user: str, password: str, verbose: bool = True):
                 print('Загрузка сценарной сети «Кредитный скоринг» в Neo4j')
                 print('═' * 60)
 
-            # 1. Очистка старого графа
-            session.run("MATCH (n:State) DETACH DELETE n")
+            # 1. Очистка старого графа этого сценария
+            session.run(f"MATCH (n:State) WHERE {scenario_filter('n', scenario)} "
+                        f"DETACH DELETE n", scenario=scenario)
             if verbose:
                 print('  Старые узлы :State удалены')
 
             # 2. Узлы
             for node in NODES:
-                session.run("CREATE (n:State) SET n = $props", props=node)
+                props = node if scenario is None else {**node, 'scenario': scenario}
+                session.run("CREATE (n:State) SET n = $props", props=props)
                 if verbose:
                     print(f"  Узел {node['id']}: {node['description'][:60]}…")
 
@@ -292,15 +319,23 @@ def load_scenario(uri: str, user: str, password: str, verbose: bool = True):
             for edge in EDGES:
                 props = {k: v for k, v in edge.items()
                          if k not in ('from', 'to')}
-                session.run("""
-                    MATCH (a:State {id: $from_id}), (b:State {id: $to_id})
+                if packed:
+                    props = pack_conditions(props)
+                session.run(f"""
+                    MATCH (a:State {{id: $from_id}}), (b:State {{id: $to_id}})
+                    WHERE {scenario_filter('a', scenario)}
+                      AND {scenario_filter('b', scenario)}
                     CREATE (a)-[r:TRANSITION]->(b)
                     SET r = $props
-                """, from_id=edge['from'], to_id=edge['to'], props=props)
+                """, from_id=edge['from'], to_id=edge['to'], props=props,
+                    scenario=scenario)
                 if verbose:
                     print(f"  Ребро {edge['id']}: {edge['from']} → {edge['to']} "
                           f"— {edge['description'][:50]}…")
 
+            # 4. Версия графа — по ней навигаторы сбрасывают кеш окрестностей
+            session.run("MERGE (m:ScenarioMeta) SET m.version = timestamp()")
+
             if verbose:
                 print('─' * 60)
                 print(f"Готово: {len(NODES)} узлов, {len(EDGES)} рёбер")
@@ -327,6 +362,11 @@ def main():
     parser.add_argument('--uri', help='URI Neo4j (neo4j+s://…)')
     parser.add_argument('--user', help='Пользователь Neo4j')
     parser.add_argument('--password', help='Пароль Neo4j')
+    parser.add_argument('--packed', action='store_true',
+                        help='Хранить условия рёбер упакованными массивами')
+    parser.add_argument('--scenario',
+                        help='Загрузить как сценарий цепочки с этим именем '
+                             '(по умолчанию — базовый граф)')
     args = parser.parse_args()
 
     secrets = _load_secrets_toml()
@@ -339,7 +379,7 @@ def main():
               '.streamlit/secrets.toml (секция [neo4j])')
         sys.exit(1)
 
-    load_scenario(uri, user, password)
+    load_scenario(uri, user, password, packed=args.packed, scenario=args.scenario)
 
 
 if __name__ == '__main__':
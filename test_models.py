@@ -0,0 +1,244 @@
+"""
+Офлайн-тесты альтернативных реализаций состояния агента.
+
+Проверяются:
+  1. Модели с состоянием в массивах NumPy (array_models) эквивалентны
+     эталонным EmotionalModel / EthicalModel.
+  2. Суммы пиков TriState (Sem / Seth за O(1)) совпадают с полным
+     пересчётом при любых способах записи состояния.
+  3. Компактное хранение состояния (float32 / fixed16, TriPopulation):
+     ошибка в пределах границ, пути совпадают с эталоном.
+  4. Дифференциальный прогон (differential): точные реализации не
+     расходятся с эталоном; внесённая ошибка находится и сужается.
+
+Запуск:
+    python test_models.py
+"""
+
+import copy
+import json
+import pickle
+import random
+
+import numpy as np
+
+import differential
+import tsk_engine
+from agent_navigator import AgentNavigator
+from array_models import (FIXED16_SCALE, PRECISION_ERROR, ArrayEmotionalModel,
+                          ArrayEthicalModel, TriPopulation, decode_tri,
+                          encode_tri, precision_bounds)
+from emotional_model import EmotionalModel
+from ethical_model import EthicalModel
+from scenario_graph import ScenarioGraph
+from seed_scenario import BASE_AGENT, EDGES, NODES
+from test_scenario import (_profile_formalist, _profile_low_ethics,
+                           _profile_merciful)
+
+_PROFILES = [BASE_AGENT, _profile_low_ethics(), _profile_formalist(),
+             _profile_merciful()]
+
+
+def _tables_close(a, b, tol=1e-9) -> bool:
+    return all(ra[0] == rb[0] and all(abs(x - y) <= tol for x, y in zip(ra[1:], rb[1:]))
+               for ra, rb in zip(a, b)) and len(a) == len(b)
+
+
+def _run(state_backend: str, profile: dict, seed: int = 0,
+         state_precision: str = 'float64'):
+    """Прогнать агента и собрать снимки состояния после каждого шага."""
+    random.seed(seed)
+    nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                         state_backend=state_backend,
+                         state_precision=state_precision)
+    nav.init_agent(copy.deepcopy(profile))
+    snapshots = []
+    current = 'V0'
+    while True:
+        result = nav.step(current)
+        if result is None:
+            break
+        snapshots.append((result.edge_id, result.sem, result.seth,
+                          nav.emotional_model.as_table(),
+                          nav.ethical_model.as_table(),
+                          nav.get_nonzero_state()))
+        current = result.to_node
+    return snapshots
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Тесты
+# ──────────────────────────────────────────────────────────────────────
+
+def test_array_models_match_reference():
+    """Навигация с массивным состоянием совпадает с эталоном на всех шагах."""
+    for profile in _PROFILES:
+        ref = _run('python', profile)
+        fast = _run('numpy', profile)
+        assert [s[0] for s in ref] == [s[0] for s in fast], "пути различаются"
+        for r, f in zip(ref, fast):
+            assert abs(r[1] - f[1]) < 1e-4 and abs(r[2] - f[2]) < 1e-4
+            assert _tables_close(r[3], f[3]) and _tables_close(r[4], f[4])
+            assert r[5] == f[5], "get_nonzero() должен совпадать"
+    print("✓ array_models: пути и состояния совпадают с эталоном")
+
+
+def test_array_state_mapping_interface():
+    """state ведёт себя как словарь; неизвестные имена не теряются."""
+    em, ref = ArrayEmotionalModel(), EmotionalModel()
+    for model in (em, ref):
+        model.set_values({'emotion_joy': [0.4, 0.5, 0.6], 'emotion_fear': 0.3})
+        model.state['custom'] = [0.1, 0.2, 0.3]
+        model.apply_edge_updates({'update_em_joy': 0.7, 'update_em_custom': 0.1,
+                                  'update_em_fear': -0.5})
+        # Несдвигаемые переменные вне [0, 1] не клиппируются (как shift_tri)
+        model.state['anger'] = (-0.2, 1.1, 1.3)
+        model.shift_peaks({'joy': -0.1})
+    assert em.state['anger'] == (-0.2, 1.1, 1.3)
+    assert dict(em.state) == ref.state
+    assert em.get_peak('custom') == ref.get_peak('custom')
+    assert em.get_peak('missing') == 0.0
+    assert em.compute_sem() == ref.compute_sem()
+    eth = ArrayEthicalModel()
+    eth.set_values({'ethic_evil': [0.5, 0.6, 0.7], 'ethic_honesty': 0.8})
+    ref_eth = EthicalModel()
+    ref_eth.set_values({'ethic_evil': [0.5, 0.6, 0.7], 'ethic_honesty': 0.8})
+    assert eth.compute_seth() == ref_eth.compute_seth()
+    assert eth.as_table() == ref_eth.as_table()
+    print("✓ array_models: словарный интерфейс state сохранён")
+
+
+def test_incremental_sem_seth():
+    """Текущие суммы групп ≡ полному пересчёту; проверка в режиме отладки."""
+    EmotionalModel.check_aggregates = EthicalModel.check_aggregates = True
+    try:
+        for profile in _PROFILES:
+            for backend in ('python', 'numpy'):
+                _run(backend, profile)            # сверка на каждом compute_*
+
+        em, eth = EmotionalModel(), EthicalModel()
+        rng = random.Random(4)
+        for _ in range(500):
+            name = rng.choice(list(em.state))
+            em.state[name] = [rng.random()] * 3
+            eth.apply_edge_updates({f'update_eth_{rng.choice(list(eth.state))}':
+                                    rng.uniform(-0.3, 0.3)})
+            em.compute_sem(), eth.compute_seth()
+        em.apply_tsk_rules(), eth.apply_tsk_rules()
+        em.state.update({'joy': (0.2, 0.3, 0.4)}, fear=(0.5, 0.6, 0.7))
+        em.state.setdefault('custom', (0.1, 0.1, 0.1))
+        assert em.state.pop('custom') == (0.1, 0.1, 0.1)
+        em.compute_sem(), eth.compute_seth()
+
+        for clone in (copy.deepcopy(em), pickle.loads(pickle.dumps(em))):
+            assert clone.state.sums == em.state.sums
+            assert clone.compute_sem() == em.compute_sem()
+
+        em.state.sums[0] += 0.5                   # порча суммы обнаруживается
+        try:
+            em.compute_sem()
+        except AssertionError:
+            pass
+        else:
+            raise AssertionError('расхождение сумм не обнаружено')
+        em.state.resync()
+        em.compute_sem()
+    finally:
+        EmotionalModel.check_aggregates = EthicalModel.check_aggregates = False
+    print("✓ TriState: Sem / Seth за O(1) совпадают с пересчётом")
+
+
+def test_compact_state_precision():
+    """float32 / fixed16: ошибка ≤ PRECISION_ERROR, те же пути, что у эталона."""
+    rng = np.random.default_rng(0)
+    tri = np.sort(rng.random((1000, 3)), axis=1)
+    tri[0] = (0.0, 0.5, 1.0)
+    for precision in ('float32', 'fixed16'):
+        back = decode_tri(encode_tri(tri, precision), precision)
+        assert back.dtype == np.float64
+        assert np.abs(back - tri).max() <= PRECISION_ERROR[precision]
+        assert precision_bounds(precision, 4)['deviation'] == \
+            4 * PRECISION_ERROR[precision]
+    assert encode_tri(tri, 'fixed16').dtype == np.uint16
+    assert tuple(encode_tri(tri[:1], 'fixed16')[0]) == (0, 32768, FIXED16_SCALE)
+
+    for profile in _PROFILES:
+        ref = _run('python', profile)
+        for precision in ('float32', 'fixed16'):
+            compact = _run('numpy', profile, state_precision=precision)
+            assert [s[0] for s in ref] == [s[0] for s in compact], precision
+            for r, c in zip(ref, compact):
+                assert abs(r[1] - c[1]) < 1e-3 and abs(r[2] - c[2]) < 1e-3
+
+    # Упакованная популяция: состояние модели fixed16 сохраняется без потерь
+    em = ArrayEmotionalModel(precision='fixed16')
+    eth = ArrayEthicalModel(precision='fixed16')
+    em.set_values({k: v for k, v in BASE_AGENT.items() if k.startswith('emotion_')})
+    eth.set_values({k: v for k, v in BASE_AGENT.items() if k.startswith('ethic_')})
+    em.apply_tsk_rules()
+    eth.apply_edge_updates({'update_eth_evil': 0.123456})
+    assert np.array_equal(em._tri, np.rint(em._tri * FIXED16_SCALE) / FIXED16_SCALE)
+    population = TriPopulation(10, 'fixed16')
+    assert population.nbytes == 10 * 27 * 3 * 2
+    population.store(7, em, eth)
+    em2 = ArrayEmotionalModel(precision='fixed16')
+    eth2 = ArrayEthicalModel(precision='fixed16')
+    population.load(7, em2, eth2)
+    assert dict(em2.state) == dict(em.state) and dict(eth2.state) == dict(eth.state)
+    assert population.peaks()[7, 0] == em.get_peak(em._names[0])
+
+    for bad in (lambda: ArrayEmotionalModel(precision='float16'),
+                lambda: AgentNavigator(state_precision='fixed16')):
+        try:
+            bad()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ожидалась ValueError")
+    print("✓ компактное состояние: float32 / fixed16 в пределах границ ошибки")
+
+
+def test_differential_backends():
+    """Точные реализации ≡ эталону; сломанный движок даёт малый репродьюсер."""
+    report = differential.run_differential(n_cases=8, stop_on_first=False)
+    assert report.ok, report.format()
+    # Приближённая реализация сравнивается в пределах своего допуска
+    memo = differential.APPROXIMATE_BACKENDS['tsk-memo']()
+    report = differential.run_differential(n_cases=5, backends=[memo])
+    assert report.ok, report.format()
+
+    class _DropLastRule(tsk_engine.CompiledRuleBase):
+        def __init__(self, rules, *args, **kwargs):
+            super().__init__(list(rules)[:-1], *args, **kwargs)
+
+    tsk_engine.RULE_BACKENDS['broken'] = _DropLastRule
+    try:
+        spec = differential._rules_backend('broken')
+        report = differential.run_differential(n_cases=10, backends=[spec])
+        assert not report.ok and report.reproducer is not None
+        repro = report.reproducer
+        original = differential.make_case(report.divergences[0].seed).size()
+        small = repro.case.size()
+        assert small['edges'] <= original['edges']
+        assert small['em_rules'] + small['eth_rules'] < \
+            original['em_rules'] + original['eth_rules']
+        # Воспроизведение сохраняется в JSON и расходится после чтения
+        restored = differential.Case.from_json(json.loads(json.dumps(repro.case.to_json())))
+        assert differential.check_case(restored, spec) is not None
+    finally:
+        del tsk_engine.RULE_BACKENDS['broken']
+    print(f"✓ differential: расхождений нет; ошибка найдена ({repro.divergence.kind}), "
+          f"правил в воспроизведении {small['em_rules'] + small['eth_rules']}")
+
+
+if __name__ == '__main__':
+    print('═' * 60)
+    print('Офлайн-тесты реализаций состояния агента')
+    print('═' * 60)
+    test_array_models_match_reference()
+    test_array_state_mapping_interface()
+    test_incremental_sem_seth()
+    test_compact_state_precision()
+    test_differential_backends()
+    print('─' * 60)
+    print('Все тесты пройдены ✓')
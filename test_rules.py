@@ -0,0 +1,582 @@
+"""
+Офлайн-тесты альтернативных движков TSK-вывода (tsk_engine).
+
+Проверяются:
+  1. Скомпилированный движок даёт те же дельты, состояние и
+     last_activations, что и эталонные apply_tsk_rules обеих моделей.
+  2. Пакетное вычисление (N, V) совпадает с поэлементным.
+  3. Сгенерированный код (rule_backend='codegen') эквивалентен эталону
+     и кешируется по содержимому базы правил.
+  4. Инкрементальный вывод (rule_backend='incremental') эквивалентен
+     эталону и пересчитывает только правила изменившихся переменных.
+  5. Мемоизация TSKMemo: попадания для близких состояний, LRU,
+     статистика и строгий режим.
+  6. Таблицы принадлежности (MembershipTable, rule_backend='lut')
+     укладываются в заявленную оценку погрешности.
+  7. Термы других форм (membership_shapes): векторные функции совпадают
+     со скалярными, все движки согласованы с эталоном.
+  8. Разреженный движок (rule_backend='sparse') эквивалентен эталону и
+     на больших сгенерированных базах затрагивает только активные правила.
+  9. Файлы правил (rule_files): проверка, дисковый кеш по хешу,
+     горячая замена в навигаторе, собственные термы в анализе
+     достижимости.
+ 10. Статический анализ (rule_analysis): недостижимые, поглощённые и
+     конфликтующие правила; отсечение не меняет вывод в диапазонах.
+ 11. Строгая иерархия норм (EthicalModel.strict_hierarchy): высший
+     уровень вытесняет заключения низших по сработавшим переменным.
+ 12. JIT-ядра (jit_kernels, rule_backend='jit' / 'auto') совпадают с
+     эталоном бит в бит — и скомпилированные Numba, и интерпретируемые.
+
+Запуск:
+    python test_rules.py
+"""
+
+import hashlib
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import tsk_engine
+from emotional_model import (ALL_EMOTIONS, EMOTION_TERMS, EMOTION_TSK_RULES,
+                             EmotionalModel, tri_membership)
+from ethical_model import (ALL_ETHICS, ETHIC_TERMS, ETHIC_TSK_RULES,
+                           PRIORITY_WEIGHTS, EthicalModel)
+from membership_shapes import SHAPES, membership
+from rule_analysis import analyze_rule_base, reachable_ranges
+from rule_files import RuleFileError, dump_rule_file, load_rule_file, yaml
+from rule_generator import benchmark_rule_backends, generate_rule_base
+from tsk_engine import (CodegenRuleBase, CompiledRuleBase, IncrementalRuleBase,
+                        JitRuleBase, MembershipTable, TSKMemo, get_engine,
+                        resolve_rule_backend)
+
+
+def _random_models(rng: random.Random, rule_backend: str):
+    """Пара моделей со случайным состоянием (пики в рабочем диапазоне)."""
+    em, eth = EmotionalModel(rule_backend), EthicalModel(rule_backend)
+    for model, names in ((em, ALL_EMOTIONS), (eth, ALL_ETHICS)):
+        for name in names:
+            b = rng.choice([0.0, 0.2, 0.5, 0.6, 1.0, rng.random()])
+            model.state[name] = [max(0.0, b - 0.1), b, min(1.0, b + 0.1)]
+    return em, eth
+
+
+def _assert_backend_matches(rule_backend: str, n_states: int = 300, steps: int = 5):
+    """Прогнать эталон и `rule_backend` из одних и тех же состояний."""
+    for seed in range(n_states):
+        ref_em, ref_eth = _random_models(random.Random(seed), 'python')
+        em, eth = _random_models(random.Random(seed), rule_backend)
+        for _ in range(steps):
+            for ref, fast in ((ref_em, em), (ref_eth, eth)):
+                assert ref.apply_tsk_rules() == fast.apply_tsk_rules(), \
+                    f"seed={seed}: дельты различаются"
+                assert ref.last_activations == fast.last_activations
+                for name in ref.state:
+                    assert all(abs(x - y) < 1e-12
+                               for x, y in zip(ref.state[name], fast.state[name]))
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Тесты
+# ──────────────────────────────────────────────────────────────────────
+
+def test_numpy_engine_matches_reference():
+    """rule_backend='numpy' эквивалентен эталонному интерпретатору."""
+    _assert_backend_matches('numpy')
+    print("✓ tsk_engine[numpy]: дельты, состояние и активации совпадают с эталоном")
+
+
+def test_numpy_engine_batch():
+    """Пакет из N агентов вычисляется одним вызовом так же, как по одному."""
+    engine = get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS,
+                        PRIORITY_WEIGHTS)
+    batch = np.random.default_rng(0).random((64, len(ALL_ETHICS)))
+    deltas, touched, w = engine.evaluate_arrays(batch)
+    for i, peaks in enumerate(batch):
+        d1, t1, w1 = engine.evaluate_arrays(peaks)
+        assert np.allclose(deltas[i], d1) and (touched[i] == t1).all()
+        assert np.allclose(w[i], w1)
+    assert get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS,
+                      PRIORITY_WEIGHTS) is engine, "движок должен кешироваться"
+    em_engine = get_engine('numpy', EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS)
+    assert em_engine.evaluate_arrays(np.zeros((3, len(ALL_EMOTIONS))))[0].shape == (3, 20)
+
+    # Ключ кеша учитывает порядок переменных и веса; кеш ограничен (LRU)
+    assert get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS[::-1], ETHIC_TERMS,
+                      PRIORITY_WEIGHTS).var_names == ALL_ETHICS[::-1]
+    assert get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS) is not engine
+    for i in range(tsk_engine.ENGINE_CACHE_SIZE + 20):
+        get_engine('numpy', generate_rule_base(3, ALL_EMOTIONS, seed=i),
+                   ALL_EMOTIONS, EMOTION_TERMS)
+    assert len(tsk_engine._ENGINE_CACHE) == tsk_engine.ENGINE_CACHE_SIZE
+    print("✓ tsk_engine[numpy]: пакетное вычисление (N, V) совпадает с поэлементным")
+
+
+def test_codegen_engine_matches_reference():
+    """rule_backend='codegen' эквивалентен эталону; функция кешируется по хешу."""
+    _assert_backend_matches('codegen')
+    a = CodegenRuleBase(EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS)
+    b = CodegenRuleBase([dict(r) for r in EMOTION_TSK_RULES], ALL_EMOTIONS,
+                        EMOTION_TERMS)
+    assert a.digest == b.digest and a._fn is b._fn, "одна база — одна функция"
+    changed = [dict(r) for r in EMOTION_TSK_RULES]
+    changed[0] = dict(changed[0], consequents={'joy': (0.06, 1.0)})
+    assert CodegenRuleBase(changed, ALL_EMOTIONS, EMOTION_TERMS).digest != a.digest
+
+    # id не попадает в код как есть; константы — любые конечные float
+    hostile = [{'id': "X\n    raise SystemExit('id исполнен')",
+                'conditions': {'joy': 'high'},
+                'consequents': {'fear': (np.float64(0.1), 1)}}]
+    peaks = [0.0] * len(ALL_EMOTIONS)
+    peaks[ALL_EMOTIONS.index('joy')] = 0.9
+    deltas, _ = CodegenRuleBase(hostile, ALL_EMOTIONS, EMOTION_TERMS).evaluate(peaks)
+    assert deltas == CompiledRuleBase(hostile, ALL_EMOTIONS, EMOTION_TERMS).evaluate(peaks)[0]
+    for bad in (float('nan'), float('inf')):
+        try:
+            CodegenRuleBase([dict(hostile[0], consequents={'fear': (bad, 1.0)})],
+                            ALL_EMOTIONS, EMOTION_TERMS)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ожидалась ValueError для нечисловой константы")
+    print("✓ tsk_engine[codegen]: совпадает с эталоном, кеш по хешу базы правил")
+
+
+def test_incremental_engine_recomputes_only_dependents():
+    """rule_backend='incremental': эталонный результат при меньшем числе пересчётов."""
+    _assert_backend_matches('incremental', n_states=100, steps=8)
+
+    em = EmotionalModel('incremental')
+    for name in ALL_EMOTIONS:
+        em.state[name] = [0.0, 0.0, 0.1]
+    em.apply_tsk_rules()
+    session = em._rule_session
+    assert session.recomputed == len(EMOTION_TSK_RULES)
+    for _ in range(3):
+        em.apply_tsk_rules()                # состояние стабильно → без пересчётов
+    assert session.recomputed == 0
+    em.apply_edge_updates({'update_em_anger': 0.5})
+    em.apply_tsk_rules()
+    engine = get_engine('incremental', EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS)
+    anger = ALL_EMOTIONS.index('anger')
+    assert session.recomputed == len(engine.dependents[anger]) < len(EMOTION_TSK_RULES)
+
+    ref = EmotionalModel()
+    ref.state = {k: list(v) for k, v in em.state.items()}
+    coarse = IncrementalRuleBase(EMOTION_TSK_RULES, ALL_EMOTIONS,
+                                 EMOTION_TERMS).session(epsilon=0.05)
+    coarse.evaluate([ref.get_peak(e) for e in ALL_EMOTIONS])
+    ref.apply_edge_updates({'update_em_joy': 0.01})
+    coarse.evaluate([ref.get_peak(e) for e in ALL_EMOTIONS])
+    assert coarse.recomputed == 0, "изменение меньше ε не вызывает пересчёта"
+    print("✓ tsk_engine[incremental]: совпадает с эталоном, пересчёт по индексу зависимостей")
+
+
+def test_tsk_memo_quantized_cache():
+    """Близкие состояния — одна запись кеша; strict даёт эталонный вывод."""
+    memo = TSKMemo(grid=0.01, max_entries=3)
+    for seed in range(20):
+        ref_em, ref_eth = _random_models(random.Random(seed), 'python')
+        em, eth = _random_models(random.Random(seed), 'python')
+        for ref, model in ((ref_em, em), (ref_eth, eth)):
+            model.tsk_memo = memo
+            model.apply_tsk_rules()
+            ref.apply_tsk_rules()
+            assert [r[0] for r in model.last_activations] == \
+                   [r[0] for r in ref.last_activations]
+            for name in ref.state:
+                assert abs(ref.get_peak(name) - model.get_peak(name)) < 0.02
+    stats = memo.stats()
+    assert stats['entries'] <= 3 and stats['evictions'] > 0
+
+    memo = TSKMemo(grid=0.01)
+    first = EmotionalModel()
+    first.tsk_memo = memo
+    first.state['joy'] = [0.3, 0.4, 0.5]
+    second = EmotionalModel()
+    second.tsk_memo = memo
+    second.state['joy'] = [0.301, 0.401, 0.501]
+    d1, d2 = first.apply_tsk_rules(), second.apply_tsk_rules()
+    assert memo.stats()['hits'] == 1 and memo.stats()['misses'] == 1
+    assert first.last_activations == second.last_activations
+    assert d1.keys() == d2.keys()
+
+    memo.strict = True
+    strict, ref = EmotionalModel(), EmotionalModel()
+    strict.tsk_memo = memo
+    for model in (strict, ref):
+        model.state['joy'] = [0.3, 0.41, 0.5]
+    assert strict.apply_tsk_rules() == ref.apply_tsk_rules()
+    assert strict.state == ref.state and memo.stats()['misses'] == 1
+    print("✓ tsk_engine.TSKMemo: квантованный ключ, LRU, статистика, строгий режим")
+
+
+def test_membership_tables_error_bound():
+    """Ошибка таблиц не превышает error_bound; движок 'lut' близок к эталону."""
+    xs = np.random.default_rng(1).random(5000)
+    cases = [(EMOTION_TERMS, True), (EMOTION_TERMS, False),
+             ({'odd': (0.1234, 0.3, 0.777), 'low': (0.0, 0.0, 0.4)}, True)]
+    for terms, interpolate in cases:
+        table = MembershipTable(terms, resolution=500, interpolate=interpolate)
+        approx = table.evaluate(xs)
+        assert approx.shape == (len(terms), len(xs))
+        for t, name in enumerate(table.term_names):
+            exact = np.array([tri_membership(x, *terms[name]) for x in xs])
+            assert np.abs(approx[t] - exact).max() <= table.error_bound
+    assert MembershipTable(EMOTION_TERMS).error_bound < 1e-9, \
+        "изломы термов в узлах сетки — интерполяция точна"
+
+    engine = get_engine('lut', EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS)
+    exact = get_engine('numpy', EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS)
+    batch = np.random.default_rng(2).random((200, len(ALL_EMOTIONS)))
+    assert np.abs(engine.activations(batch) - exact.activations(batch)).max() \
+        <= engine.table.error_bound
+    print("✓ tsk_engine.MembershipTable: ошибка в пределах error_bound")
+
+
+def test_membership_shapes_all_backends():
+    """trap / gauss / sigmoid: векторные = скалярные; движки = эталон."""
+    rng = np.random.default_rng(3)
+    x = rng.random((50, 4))
+    params = {'tri': (0.2, 0.5, 0.8), 'trap': (0.1, 0.3, 0.6, 0.9),
+              'gauss': (0.5, 0.15), 'sigmoid': (-12.0, 0.4)}
+    for shape, p in params.items():
+        arrays = [np.full(x.shape, v) + rng.normal(0, 0.01, x.shape) * (i == 0)
+                  for i, v in enumerate(p)]
+        vec = SHAPES[shape].vector(x, *arrays)
+        ref = np.vectorize(SHAPES[shape].scalar)(x, *arrays)
+        assert np.allclose(vec, ref, atol=1e-12), shape
+    assert membership(0.95, ('trap', 0.6, 0.8, 1.0, 1.0)) == 1.0
+
+    rules = [dict(r) for r in EMOTION_TSK_RULES]
+    rules[0] = dict(rules[0], conditions={'joy': ('sigmoid', 10.0, 0.4),
+                                          'guilt': ('trap', 0.0, 0.0, 0.2, 0.5)})
+    rules[1] = dict(rules[1], conditions={'joy': ('gauss', 0.4, 0.2),
+                                          'fear': ('trap', 0.1, 0.2, 0.5, 0.7)})
+    for seed in range(100):
+        models = {}
+        for backend in ('python', 'numpy', 'codegen', 'incremental', 'lut'):
+            em, _ = _random_models(random.Random(seed), backend)
+            em.rules = rules
+            models[backend] = em
+        ref_deltas = models.pop('python').apply_tsk_rules()
+        for backend, em in models.items():
+            deltas = em.apply_tsk_rules()
+            tol = 1e-3 if backend == 'lut' else 1e-12
+            assert deltas.keys() == ref_deltas.keys(), backend
+            assert all(abs(deltas[k] - ref_deltas[k]) <= tol for k in deltas)
+    print("✓ membership_shapes: trap/gauss/sigmoid во всех движках")
+
+
+def test_sparse_engine_large_rule_bases():
+    """CSR-движок: эталонный результат, работа пропорциональна активным правилам."""
+    _assert_backend_matches('sparse')
+
+    rules = generate_rule_base(2000, priorities=True, seed=5)
+    sparse = get_engine('sparse', rules, ALL_EMOTIONS, EMOTION_TERMS, PRIORITY_WEIGHTS)
+    dense = get_engine('numpy', rules, ALL_EMOTIONS, EMOTION_TERMS, PRIORITY_WEIGHTS)
+    rng = np.random.default_rng(5)
+    for peaks in rng.random((30, len(ALL_EMOTIONS))):
+        d_sparse, f_sparse = sparse.evaluate(peaks)
+        d_dense, f_dense = dense.evaluate(peaks)
+        assert d_sparse == d_dense
+        assert [(r['id'], w) for r, w in f_sparse] == [(r['id'], w) for r, w in f_dense]
+
+    peaks = np.full(len(ALL_EMOTIONS), 0.95)       # активны только термы 'high'
+    _, fired = sparse.evaluate(peaks)
+    assert sparse.last_candidates == sum(
+        any(t == 'high' for t in r['conditions'].values()) for r in rules)
+    assert len(fired) == sum(all(t == 'high' for t in r['conditions'].values())
+                             for r in rules)
+
+    rows = benchmark_rule_backends(sizes=(100,), backends=('python', 'sparse'),
+                                   n_states=5)
+    assert [r['backend'] for r in rows] == ['python', 'sparse']
+    assert rows[0]['mean_fired'] == rows[1]['mean_fired']
+    print("✓ tsk_engine[sparse]: совпадает с эталоном, затрагивает только активные правила")
+
+
+def test_rule_files_validation_and_cache():
+    """Файл = встроенные правила; ошибки описания; повторная загрузка из кеша."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        formats = ['rules.json'] + (['rules.yaml'] if yaml is not None else [])
+        for name in formats:
+            dump_rule_file(tmp / name)
+            rule_set = load_rule_file(tmp / name)
+            assert rule_set.emotion.rules == EMOTION_TSK_RULES
+            assert rule_set.ethic.rules == ETHIC_TSK_RULES
+            assert rule_set.emotion.terms == EMOTION_TERMS
+
+        broken = [
+            '{"emotion": {"rules": [{"id": "X", "conditions": {"joyy": "low"}, '
+            '"consequents": {"joy": [0.1, 1.0]}}]}}',
+            '{"ethic": {"rules": [{"id": "X", "priority": 7, "conditions": '
+            '{"evil": "low"}, "consequents": {"evil": [0.1, 1.0]}}]}}',
+            '{"emotion": {"rules": [{"id": "X", "conditions": {"joy": "huge"}, '
+            '"consequents": {"joy": [0.1, 1.0]}}]}}',
+            '{"emotion": {"rules": [{"id": "X", "conditions": {"joy": "low"}, '
+            '"consequents": {"joy": [0.1]}}]}}',
+            '{"moral": {"rules": []}}',
+            '{"emotion": {"rules": [',
+            '{"emotion": {"rules": [{"id": "X\\n    import os", "conditions": '
+            '{"joy": "low"}, "consequents": {"joy": [0.1, 1.0]}}]}}',
+            '{"ethic": {"rules": [{"id": "X", "priority": true, "conditions": '
+            '{"evil": "low"}, "consequents": {"evil": [0.1, 1.0]}}]}}',
+            '{"emotion": {"rules": [{"id": "X", "conditions": {"joy": "low"}, '
+            '"consequents": {"joy": [NaN, 1.0]}}]}}',
+        ]
+        for i, text in enumerate(broken):
+            (tmp / f'bad{i}.json').write_text(text, encoding='utf-8')
+            try:
+                load_rule_file(tmp / f'bad{i}.json')
+            except RuleFileError:
+                continue
+            raise AssertionError(f"файл bad{i} должен быть отвергнут")
+
+        cache = tmp / 'cache'
+        first = load_rule_file(tmp / 'rules.json', cache, ('numpy', 'codegen'))
+        again = load_rule_file(tmp / 'rules.json', cache, ('numpy', 'codegen'))
+        assert not first.from_cache and again.from_cache
+        assert len(list(cache.glob('*.pkl'))) == 1
+        # Чужая запись под именем другого содержимого не принимается
+        (tmp / 'other.json').write_text(
+            (tmp / 'rules.json').read_text(encoding='utf-8') + '\n', encoding='utf-8')
+        other_digest = hashlib.sha256((tmp / 'other.json').read_bytes()).hexdigest()
+        (cache / f'{other_digest}.pkl').write_bytes(
+            next(cache.glob('*.pkl')).read_bytes())
+        assert not load_rule_file(tmp / 'other.json', cache, ('numpy',)).from_cache
+        for backend in ('python', 'numpy', 'codegen'):
+            em, _ = _random_models(random.Random(1), backend)
+            ref, _ = _random_models(random.Random(1), 'python')
+            em.rules, em.terms = again.emotion.rules, again.emotion.terms
+            assert em.apply_tsk_rules() == ref.apply_tsk_rules()
+    print("✓ rule_files: проверка файлов, кеш скомпилированных баз по хешу")
+
+
+def test_rule_file_hot_reload():
+    """Изменённый файл применяется перед очередным шагом; битый — нет."""
+    from agent_navigator import AgentNavigator
+    from scenario_graph import ScenarioGraph
+    from seed_scenario import BASE_AGENT, EDGES, NODES
+
+    def rewrite(path: Path, text: str):
+        path.write_text(text, encoding='utf-8')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'rules.json'
+        dump_rule_file(path, ethic_rules=None, ethic_terms=None)
+        nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                             rule_backend='codegen')
+        watcher = nav.attach_rule_file(path, cache_dir=Path(tmp) / 'cache',
+                                       poll_interval=0.0)
+        nav.init_agent(dict(BASE_AGENT))
+        assert nav.emotional_model.rules == EMOTION_TSK_RULES
+        assert nav.ethical_model.rules is ETHIC_TSK_RULES
+
+        single = ('{"emotion": {"rules": [{"id": "HOT", "conditions": '
+                  '{"joy": ["trap", 0, 0, 1, 1]}, "consequents": {"joy": [0.2, 1.0]}}]}}')
+        rewrite(path, single)
+        nav.step('V0')
+        assert watcher.version == 2
+        assert [r['id'] for r in nav.emotional_model.rules] == ['HOT']
+        assert [a[0] for a in nav.emotional_model.last_activations] == ['HOT']
+
+        rewrite(path, '{"emotion": {"rules": [')
+        nav.sync_rules()
+        assert watcher.version == 2 and watcher.last_error
+        assert [r['id'] for r in nav.emotional_model.rules] == ['HOT']
+
+        rewrite(path, single)                   # то же содержимое — без перекомпиляции
+        assert not nav.sync_rules() and watcher.version == 2
+        assert watcher.last_error is None
+    print("✓ rule_files: горячая замена базы правил в навигаторе")
+
+
+def test_rule_file_terms_in_reachability():
+    """Анализ достижимости живого графа учитывает термы из файла правил."""
+    from agent_navigator import AgentNavigator
+    from scenario_analysis import analyze_live_graph, profile_box
+    from scenario_graph import ScenarioGraph
+    from seed_scenario import BASE_AGENT, EDGES, NODES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'rules.json'
+        path.write_text(
+            '{"emotion": {"terms": {"calm": ["trap", 0, 0, 0.2, 0.5]}, '
+            '"rules": [{"id": "CALM", "conditions": {"fear": "calm"}, '
+            '"consequents": {"joy": [0.3, 1.0]}}]}}', encoding='utf-8')
+        nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES))
+        nav.attach_rule_file(path, poll_interval=0.0)
+        report = analyze_live_graph(nav, 'V0', profile_box([BASE_AGENT]))
+        nav.init_agent(dict(BASE_AGENT))
+        current = 'V0'
+        while (result := nav.step(current)) is not None:
+            assert result.edge_id not in report.dead_edges
+            assert nav.emotional_model.last_activations
+            lo, hi = report.node_boxes[result.to_node]['emotion_joy']
+            assert lo - 1e-9 <= nav.emotional_model.get_peak('joy') <= hi + 1e-9
+            current = result.to_node
+        assert current != 'V0'
+    print("✓ rule_files: собственные термы в анализе достижимости")
+
+
+def test_rule_analysis_pruning():
+    """Анализ базы: находки и отсечение мёртвых правил без изменения вывода."""
+    rules = [
+        {'id': 'A', 'conditions': {'joy': 'medium'},
+         'consequents': {'joy': (0.05, 1.0)}, 'description': ''},
+        {'id': 'B', 'conditions': {'joy': 'medium', 'fear': 'low'},
+         'consequents': {'joy': (0.05, 1.0)}, 'description': ''},
+        {'id': 'C', 'conditions': {'joy': 'medium'},
+         'consequents': {'joy': (-0.04, 1.0)}, 'description': ''},
+        {'id': 'D', 'conditions': {'fear': ('trap', 0.7, 0.8, 1.0, 1.0)},
+         'consequents': {'fear': (-0.05, 1.0)}, 'description': ''},
+    ]
+    report = analyze_rule_base(rules, EMOTION_TERMS, {'fear': (0.1, 0.6)})
+    kinds = {(f.rule_id, f.kind, f.other_id) for f in report.findings}
+    assert kinds == {('D', 'unreachable', None), ('B', 'subsumed', 'A'),
+                     ('A', 'conflict', 'C'), ('B', 'conflict', 'C')}, kinds
+    assert report.max_activation['D'] == 0.0 and report.max_activation['A'] == 1.0
+
+    # Диапазоны, достижимые в сценарной сети из окрестности BASE_AGENT
+    from scenario_analysis import analyze_reachability, profile_box
+    from seed_scenario import BASE_AGENT, EDGES, NODES
+    reach = analyze_reachability(NODES, EDGES, start_box=profile_box([BASE_AGENT], 0.1))
+    ranges = {'emotion_': reachable_ranges(reach, 'emotion_'),
+              'ethic_': reachable_ranges(reach, 'ethic_')}
+
+    rng = random.Random(3)
+    for _ in range(200):
+        ref = (EmotionalModel(), EthicalModel())
+        pruned = (EmotionalModel(), EthicalModel())
+        for model_ref, model, prefix in zip(ref, pruned, ('emotion_', 'ethic_')):
+            for name in model.state:
+                b = rng.uniform(*ranges[prefix][name])
+                model_ref.state[name] = [b, b, b]
+                model.state[name] = [b, b, b]
+        em_report = pruned[0].prune_rules(ranges['emotion_'])
+        eth_report = pruned[1].prune_rules(ranges['ethic_'])
+        for a, b in zip(ref, pruned):
+            assert a.apply_tsk_rules() == b.apply_tsk_rules()
+            assert a.last_activations == b.last_activations
+    assert {'ER06', 'ER10'} <= set(em_report.pruned)
+    assert 'ETH01' in eth_report.pruned
+    assert len(pruned[0].rules) == len(EMOTION_TSK_RULES) - len(em_report.pruned)
+
+    engine = get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS,
+                        PRIORITY_WEIGHTS, ranges=ranges['ethic_'])
+    assert engine.analysis.pruned == eth_report.pruned
+    assert len(engine.rules) == len(ETHIC_TSK_RULES) - len(eth_report.pruned)
+    assert get_engine('numpy', ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS,
+                      PRIORITY_WEIGHTS) is not engine
+    print("✓ rule_analysis: находки, отсечение мёртвых правил без изменения вывода")
+
+
+def test_strict_hierarchy():
+    """Строгая иерархия: вытеснение по переменным, порог, любой rule_backend."""
+    def decisive(rule_backend='python', strict=True):
+        eth = EthicalModel(rule_backend)
+        eth.strict_hierarchy = strict
+        for name in ALL_ETHICS:
+            eth.state[name] = [0.5, 0.5, 0.5]
+        # ETH01 (приоритет 1): зло и совесть высоки; ETH05 (2) и ETH08 (3)
+        # тоже срабатывают и тянут зло вверх
+        for name, b in (('evil', 0.9), ('conscience', 0.9), ('honesty', 0.0),
+                        ('fairness', 0.0), ('responsibility', 0.0), ('goodness', 0.0)):
+            eth.state[name] = [b, b, b]
+        return eth
+
+    blended, strict = decisive(strict=False), decisive()
+    d_blended, d_strict = blended.apply_tsk_rules(), strict.apply_tsk_rules()
+    assert d_strict['evil'] == -0.15 and d_blended['evil'] > -0.15
+    assert d_strict['conscience'] == 0.05
+    assert d_strict['justice'] == d_blended['justice'] == -0.08   # ETH05 не вытеснено
+    # заключения по evil / conscience уровней 2 и 3 не вычисляются
+    assert strict.last_preempted == ['ETH05', 'ETH06', 'ETH08', 'ETH10']
+    fired = [a[0] for a in strict.last_activations]
+    assert 'ETH05' in fired and 'ETH08' not in fired
+
+    high = decisive()
+    high.hierarchy_threshold = 0.8      # w(ETH01) = 0.75 не закрывает evil,
+    d_high = high.apply_tsk_rules()     # w(ETH05) = 1.0 закрывает его от ETH08
+    assert high.last_preempted == ['ETH08']
+    assert d_strict['evil'] < d_high['evil'] < d_blended['evil']
+    never = decisive()
+    never.hierarchy_threshold = 1.5     # порог недостижим — как смешивание
+    assert never.apply_tsk_rules() == d_blended and not never.last_preempted
+
+    engine = decisive('numpy')
+    assert engine.apply_tsk_rules() == d_strict and engine.state == strict.state
+
+    from agent_navigator import AgentNavigator
+    nav = AgentNavigator(strict_hierarchy=True)
+    assert nav.ethical_model.strict_hierarchy and not EthicalModel().strict_hierarchy
+    _assert_backend_matches('numpy', n_states=50, steps=2)
+    print("✓ EthicalModel: строгая иерархия норм вытесняет низшие уровни")
+
+
+def test_jit_kernels_match_reference():
+    """Ядра jit_kernels ≡ эталон и NumPy-движок; выбор 'auto'."""
+    from emotional_model import shift_tri
+    from jit_kernels import NUMBA_AVAILABLE, shift_tri_clip, tri_membership_kernel
+
+    _assert_backend_matches('jit')
+
+    for x in (0.0, 0.2, 0.4, 0.5, 0.6, 0.8, 1.0, 0.3333, 1.2, -0.1):
+        for abc in EMOTION_TERMS.values():
+            assert tri_membership_kernel(x, *abc) == tri_membership(x, *abc)
+
+    # Ядра в режиме интерпретатора (без Numba) — тот же результат
+    rng = np.random.default_rng(11)
+    for rules, names, terms, weights in (
+            (EMOTION_TSK_RULES, ALL_EMOTIONS, EMOTION_TERMS, None),
+            (ETHIC_TSK_RULES, ALL_ETHICS, ETHIC_TERMS, PRIORITY_WEIGHTS)):
+        peaks = rng.random((40, len(names)))
+        peaks[::3, :] = 0.5
+        jit = JitRuleBase(rules, names, terms, weights)
+        jit.kernels = True
+        dense = CompiledRuleBase(rules, names, terms, weights)
+        for got, want in zip(jit.evaluate_arrays(peaks), dense.evaluate_arrays(peaks)):
+            assert np.array_equal(got, want)
+        assert jit.evaluate(peaks[0]) == dense.evaluate(peaks[0])
+
+    tri = np.sort(rng.random((50, 3)), axis=1)
+    deltas = rng.uniform(-0.6, 0.6, 50)
+    expected = [shift_tri(list(t), d) for t, d in zip(tri, deltas)]
+    shift_tri_clip(tri, deltas)
+    assert [tuple(t) for t in tri.tolist()] == expected
+
+    assert resolve_rule_backend('auto') == ('jit' if NUMBA_AVAILABLE else 'numpy')
+    assert resolve_rule_backend('sparse') == 'sparse'
+    assert EmotionalModel('auto').rule_backend == resolve_rule_backend('auto')
+    from array_models import ArrayEthicalModel
+    assert ArrayEthicalModel().rule_backend == resolve_rule_backend('auto')
+    mode = 'Numba' if NUMBA_AVAILABLE else 'интерпретатор, движок — NumPy'
+    print(f"✓ jit_kernels: совпадают с эталоном ({mode})")
+
+
+if __name__ == '__main__':
+    print('═' * 60)
+    print('Офлайн-тесты движков TSK-вывода')
+    print('═' * 60)
+    test_numpy_engine_matches_reference()
+    test_numpy_engine_batch()
+    test_codegen_engine_matches_reference()
+    test_incremental_engine_recomputes_only_dependents()
+    test_tsk_memo_quantized_cache()
+    test_membership_tables_error_bound()
+    test_membership_shapes_all_backends()
+    test_sparse_engine_large_rule_bases()
+    test_rule_files_validation_and_cache()
+    test_rule_file_hot_reload()
+    test_rule_file_terms_in_reachability()
+    test_rule_analysis_pruning()
+    test_strict_hierarchy()
+    test_jit_kernels_match_reference()
+    print('─' * 60)
+    print('Все тесты пройдены ✓')
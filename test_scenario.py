@@ -2,20 +2,49 @@
 Офлайн-тесты сценарной сети «Кредитный скоринг» (без подключения к Neo4j).
 
 Проверяются:
-  1. Краевые случаи хелперов треугольных ФП (плечевые термы, клиппинг).
+  1. Краевые случаи хелперов треугольных ФП (плечевые термы, клиппинг),
+     неизменяемый тип Tri.
   2. Навигация в режиме 'deviation' (фильтрация неравенств + мин. ΣΔE).
   3. Навигация в режиме 'barrier' (Sem + Seth > β).
   4. Завершение процесса, когда ни одно ребро не удовлетворяет условиям.
+  5. Статический анализ достижимости (scenario_analysis), в том числе
+     при повторных проходах TSK.
+  6. Генератор синтетических сетей и локальное хранилище ScenarioGraph.
+  7. LRU-кеш окрестностей узлов навигатора.
+  8. Цепочки сценариев с ленивой загрузкой.
+  9. Упакованные условия рёбер (condition_pack) ≡ именованной схеме.
+ 10. Итерация TSK до неподвижной точки (tsk_max_iterations).
+ 11. Возможностная проверка условий по полным Tri (condition_mode).
+ 12. Монте-Карло по треугольным распределениям профиля (monte_carlo).
+ 13. Подключаемые метрики отклонения ΣΔE (deviation_metric).
 
 Запуск:
     python test_scenario.py
 """
 
 import copy
+import os
+import random
+import tempfile
 from typing import Dict, List, Optional
 
-from agent_navigator import AgentNavigator
-from emotional_model import tri_membership, shift_tri, EMOTION_TERMS
+import numpy as np
+
+from agent_navigator import AgentNavigator, NeighbourhoodCache
+from condition_pack import (DEVIATION_METRICS, OP_LE, VARIABLE_SLOTS,
+                            _evaluate_one_python,
+                            _evaluate_possibilistic_python, agent_peak_vector,
+                            agent_tri_vector, evaluate_packed,
+                            evaluate_possibilistic, fuzzy_distance, get_metric,
+                            necessity_le, pack_conditions, possibility_le,
+                            register_metric, unpack_conditions, weight_vector)
+from emotional_model import (EMOTION_TERMS, ZERO_TRI, EmotionalModel, Tri,
+                             format_tri, get_peak, make_tri, shift_tri,
+                             tri_membership)
+from monte_carlo import monte_carlo, sample_profiles, wilson_interval
+from scenario_analysis import analyze_live_graph, analyze_reachability, profile_box
+from scenario_generator import generate_scenario
+from scenario_graph import ScenarioGraph
 from seed_scenario import BASE_AGENT, EDGES, NODES
 
 # Свойства узлов по id — для передачи узловых обновлений (update_*)
@@ -116,6 +145,35 @@ def test_shift_tri_invariant():
     print("✓ shift_tri: инвариант a ≤ b ≤ c сохраняется")
 
 
+def test_tri_value_type():
+    """Tri — неизменяемая компактная тройка; хелперы принимают и возвращают её."""
+    import sys
+
+    tri = make_tri([0.1, 0.2, 0.3])
+    assert type(tri) is Tri and tri == (0.1, 0.2, 0.3) and tri.peak == 0.2
+    assert make_tri(tri) is tri                     # без повторного выделения
+    assert make_tri(0.5) == Tri(0.4, 0.5, 0.6) and get_peak(tri) == 0.2
+    shifted = shift_tri(tri, 0.8)
+    assert type(shifted) is Tri and shifted == tri.shift(0.8) == (0.9, 1.0, 1.0)
+    assert shift_tri([0.1, 0.2, 0.3], 0.8) == shifted and tri == (0.1, 0.2, 0.3)
+    assert str(shifted) == format_tri(shifted) == 'Tri(0.90, 1.00, 1.00)'
+    try:
+        tri.b = 0.5
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('Tri должна быть неизменяемой')
+    assert not hasattr(tri, '__dict__')
+    assert sys.getsizeof(tri) < sys.getsizeof([0.1, 0.2, 0.3])
+
+    model = EmotionalModel()
+    assert all(v is ZERO_TRI for v in model.state.values())
+    model.set_values({'emotion_joy': [0.3, 0.4, 0.5]})
+    model.shift_peaks({'joy': 0.1})
+    assert type(model.state['joy']) is Tri and model.get_peak('joy') == 0.5
+    print("✓ Tri: неизменяемая тройка без копирования")
+
+
 def test_base_agent_deviation():
     """Ответственный агент: V0 → V1 (проверка) → один из V3/V4/V5."""
     path = run_offline(BASE_AGENT, mode='deviation')
@@ -230,12 +288,536 @@ def test_termination_no_admissible():
     print("✓ deviation: завершение при отсутствии допустимых рёбер")
 
 
+def test_reachability_sound_for_profiles():
+    """Пути реальных агентов проходят только по живым рёбрам анализа."""
+    profiles = [BASE_AGENT, _profile_low_ethics(), _profile_formalist(),
+                _profile_merciful()]
+    report = analyze_reachability(NODES, EDGES, 'V0', profile_box(profiles))
+    edge_by_nodes = {(e['from'], e['to']): e['id'] for e in EDGES}
+    for p in profiles:
+        path = run_offline(p, mode='combined')
+        for u, v in zip(path, path[1:]):
+            assert edge_by_nodes[(u, v)] not in report.dead_edges, \
+                f"ребро {u} → {v} пройдено, но помечено мёртвым"
+            assert report.node_boxes[v] is not None
+    print("✓ анализ достижимости не отсекает реально пройденные рёбра")
+
+
+def test_reachability_flags_broken_edges():
+    """Непреодолимый барьер и невыполнимое условие → мёртвые рёбра."""
+    edges = copy.deepcopy(EDGES)
+    for e in edges:
+        if e['id'] == 'E2':
+            e['barrier'] = 2.5                      # Sem + Seth ≤ 2
+        if e['id'] == 'E3':
+            e['cond_em_pride_ge'] = [1.1, 1.2, 1.3]  # пик > 1 недостижим
+    report = analyze_reachability(NODES, edges, 'V0')
+    assert set(report.dead_edges) == {'E2', 'E3', 'E6', 'E7', 'E8'}
+    assert {'V2', 'V3', 'V6', 'V7', 'V8'} <= set(report.unreachable_verdicts)
+    nav = AgentNavigator()
+    nav.apply_reachability(report)
+    nav.init_agent(copy.deepcopy(BASE_AGENT))
+    ids = {c['edge_id'] for c in nav.build_candidates(_edges_from('V0'))}
+    assert ids == {'E1'}, "мёртвые рёбра должны исключаться из кандидатов"
+    # Прерванный по пределу итераций анализ не объявляет рёбра мёртвыми
+    capped = analyze_reachability(NODES, edges, 'V0', max_iterations=1)
+    assert not capped.complete and not capped.dead_edges
+    assert report.complete
+    print("✓ анализ достижимости находит мёртвые рёбра и вердикты")
+
+
+def test_reachability_sound_for_tsk_iterations():
+    """При tsk_max_iterations > 1 анализ учитывает все проходы TSK."""
+    box = profile_box([BASE_AGENT], 0.05)
+    nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                         tsk_max_iterations=50)
+    single = analyze_reachability(NODES, EDGES, 'V0', box)
+    for apply in (nav.apply_reachability, nav.prune_rules):
+        try:
+            apply(single)
+            raise AssertionError("однопроходный отчёт принят при cap = 50")
+        except ValueError:
+            pass
+
+    report = analyze_live_graph(nav, 'V0', box)
+    assert report.tsk_passes == 50 and report.complete
+    nav.apply_reachability(report)
+    nav.init_agent(copy.deepcopy(BASE_AGENT))
+    current = 'V0'
+    while True:
+        result = nav.step(current)
+        if result is None:
+            break
+        assert result.edge_id not in report.dead_edges
+        node_box = report.node_boxes[result.to_node]
+        for model, prefix in ((nav.emotional_model, 'emotion_'),
+                              (nav.ethical_model, 'ethic_')):
+            for name in model.state:
+                lo, hi = node_box[prefix + name]
+                assert lo - 1e-6 <= model.get_peak(name) <= hi + 1e-6, \
+                    f"{result.to_node}: {prefix}{name} = {model.get_peak(name)} ∉ [{lo}, {hi}]"
+        current = result.to_node
+    assert current != 'V0' and nav.last_tsk_iterations > 1
+
+    # Отсечение правил по такому отчёту не меняет путь агента (V1: ничья
+    # E4 / E5 разрешается random.choice — одинаково при общем seed)
+    ref = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                         tsk_max_iterations=50)
+    nav.prune_rules(report)
+    assert nav.rule_ranges is not None
+    paths = []
+    for navigator in (nav, ref):
+        random.seed(11)
+        path = navigator.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False)
+        paths.append([(s[2], s[3]) for s in path])
+    assert paths[0] == paths[1], paths
+    print("✓ анализ достижимости корректен при повторных проходах TSK")
+
+
+def test_local_graph_store_navigation():
+    """Навигатор с ScenarioGraph проходит тот же путь, что и офлайн-прогон."""
+    graph = ScenarioGraph.from_lists(NODES, EDGES)
+    nav = AgentNavigator(graph=graph)
+    path = nav.navigate('V0', copy.deepcopy(_profile_merciful()), verbose=False)
+    assert [path[0][0]] + [s[2] for s in path] == ['V0', 'V1', 'V5']
+    nodes, edges = nav.fetch_graph_topology_full()
+    assert len(nodes) == len(NODES) and len(edges) == len(EDGES)
+    print("✓ ScenarioGraph: офлайн-навигация через step()")
+
+
+def test_generator_schema_and_roundtrip():
+    """Сгенерированная сеть соблюдает схему свойств и переживает файл."""
+    nodes, edges = generate_scenario(n_nodes=300, mean_fanout=3.0,
+                                     cycle_prob=0.1, seed=7)
+    assert (nodes, edges) == generate_scenario(n_nodes=300, mean_fanout=3.0,
+                                               cycle_prob=0.1, seed=7)
+    assert len(nodes) == 300
+    ids = {n['id'] for n in nodes}
+    targets = {e['to'] for e in edges}
+    assert ids - targets <= {'G0'}, "каждый узел, кроме корня, имеет вход"
+    for e in edges:
+        assert 'barrier' in e and e['from'] in ids
+        assert any(k.startswith('cond_') for k in e)
+    sources = {e['from'] for e in edges}
+    assert all(('verdict' in n) == (n['id'] not in sources) for n in nodes)
+
+    graph = ScenarioGraph.from_lists(nodes, edges)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'net.jsonl')
+        graph.save_jsonl(path)
+        loaded = ScenarioGraph.load_jsonl(path)
+    assert loaded.edges_from('G0') == graph.edges_from('G0')
+    assert loaded.edge_count == len(edges)
+    assert generate_scenario(n_nodes=20, fanout='geometric', mean_fanout=0.5,
+                             seed=1)[1], "при mean ≤ 1 — по одному ребру"
+    try:
+        generate_scenario(n_nodes=20, fanout='geometric', mean_fanout=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ожидалась ValueError для mean_fanout = 0")
+    print(f"✓ генератор: {len(nodes)} узлов, {len(edges)} рёбер, схема соблюдена")
+
+
+class _CountingGraph(ScenarioGraph):
+    """Локальное хранилище, считающее обращения к «базе»."""
+
+    def __init__(self):
+        super().__init__()
+        self.queries = 0
+
+    def edges_from(self, node_id):
+        self.queries += 1
+        return super().edges_from(node_id)
+
+
+def test_neighbourhood_cache_hits_and_invalidation():
+    """Повторный визит узла обслуживается кешем; смена версии сбрасывает его."""
+    graph = _CountingGraph.from_lists(NODES, EDGES)
+    nav = AgentNavigator(graph=graph, cache_bytes=1024 * 1024)
+    for _ in range(3):
+        nav.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False)
+    stats = nav.edge_cache.stats()
+    assert graph.queries == stats['misses'] == 3, \
+        "каждый узел пути должен читаться из источника ровно один раз"
+    assert stats['hits'] == 6
+    graph.add_node({'id': 'V9', 'description': 'новая ситуация'})
+    assert nav.refresh_graph_version() and len(nav.edge_cache) == 0
+
+    # step() без navigate() тоже видит перезагруженный граф
+    nav.init_agent(copy.deepcopy(BASE_AGENT))
+    nav.step('V0')
+    graph.add_edge({'from': 'V0', 'to': 'V9', 'id': 'E9', 'cond_em_joy_ge': 0.0})
+    assert nav.step('V0') is not None
+    assert any(e[0] == 'E9' for e in nav.edge_cache.get('V0'))
+    print(f"✓ кеш окрестностей: {stats}")
+
+
+def test_neighbourhood_cache_lru_budget():
+    """При превышении бюджета вытесняются давно не использованные узлы."""
+    graph = ScenarioGraph.from_lists(NODES, EDGES)
+    sizes = {}
+    for node_id in ('V0', 'V1', 'V2'):
+        probe = NeighbourhoodCache()
+        probe.put(node_id, graph.edges_from(node_id))
+        sizes[node_id] = probe.bytes_used
+    # Вмещает V0 + V1, но не все три окрестности
+    cache = NeighbourhoodCache(max_bytes=sizes['V0'] + sizes['V1'] + sizes['V2'] // 2)
+    cache.put('V0', graph.edges_from('V0'))
+    cache.put('V1', graph.edges_from('V1'))
+    assert cache.get('V0') is not None           # V0 становится «свежим»
+    cache.put('V2', graph.edges_from('V2'))
+    assert cache.get('V1') is None and cache.get('V0') is not None
+    assert cache.bytes_used <= cache.max_bytes and cache.evictions >= 1
+    print("✓ кеш окрестностей: LRU-вытеснение в пределах бюджета")
+
+
+def test_scenario_chaining_lazy_loading():
+    """Терминальные узлы ведут в следующую заявку; граф грузится один раз."""
+    chained = copy.deepcopy(NODES)
+    for node in chained:
+        if node['id'] in ('V3', 'V4', 'V5'):
+            node['next_scenario'] = 'next_application'
+            node['next_entry'] = 'V0'
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return ScenarioGraph.from_lists(chained, EDGES)
+
+    nav = AgentNavigator(graph=ScenarioGraph.from_lists(chained, EDGES),
+                         cache_bytes=1024 * 1024)
+    nav.register_scenario('next_application', loader)
+    assert not loads, "сценарий не должен грузиться до первого входа"
+    path = nav.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False,
+                        max_scenarios=2)
+    hops = [s for s in path if s[1] == 'chain:next_application']
+    assert len(hops) == 2 and len(loads) == 1
+    assert nav.scenario_path == [('next_application', 'V0')] * 2
+    assert nav.graph is nav._base_graph and nav.scenario is None
+    # Стартовый узел сам терминален и сразу ведёт в следующий сценарий
+    lobby = AgentNavigator(graph=ScenarioGraph.from_lists(
+        [{'id': 'L0', 'next_scenario': 'next_application', 'next_entry': 'V0'}], []))
+    lobby.register_scenario('next_application', ScenarioGraph.from_lists(NODES, EDGES))
+    lobby_path = lobby.navigate('L0', copy.deepcopy(BASE_AGENT), verbose=False)
+    assert lobby_path[0][:3] == ('L0', 'chain:next_application', 'V0')
+    assert len(lobby_path) > 1
+    # Состояние переносится: гордость копится от заявки к заявке
+    single = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES))
+    single.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False)
+    assert nav.emotional_model.get_peak('pride') > \
+        single.emotional_model.get_peak('pride')
+    # Мёртвые рёбра базового графа не действуют в сценариях цепочки, даже
+    # при совпадении id: там E2 — единственное (и проходимое) ребро V0
+    report = analyze_reachability(chained, EDGES, 'V0', profile_box([BASE_AGENT]))
+    assert 'E2' in report.dead_edges
+    follow_edge = {'id': 'E2', 'from': 'V0', 'to': 'V2', 'barrier': 0.0}
+    follow = ScenarioGraph.from_lists([{'id': 'V0'}, {'id': 'V2'}], [follow_edge])
+    pruned = AgentNavigator(graph=ScenarioGraph.from_lists(chained, EDGES))
+    pruned.register_scenario('next_application', follow)
+    pruned.apply_reachability(report)
+    assert ('next_application', 'E2') not in pruned.dead_edges
+    follow_path = pruned.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False)
+    assert follow_path[-1][1:3] == ('E2', 'V2'), follow_path
+    # Переход между сценариями не сбрасывает кеш окрестностей: версия
+    # графа сценария сверяется только с его собственной
+    follow = ScenarioGraph.from_lists(NODES, EDGES)
+    follow.add_node({'id': 'V9', 'description': 'другая версия графа'})
+    cached = AgentNavigator(graph=ScenarioGraph.from_lists(chained, EDGES),
+                            cache_bytes=1024 * 1024)
+    cached.register_scenario('next_application', follow)
+    misses = []
+    for _ in range(2):
+        cached.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False,
+                        max_scenarios=1)
+        misses.append(cached.edge_cache.misses)
+    assert cached.edge_cache.invalidations == 0
+    assert misses[1] == misses[0], "повторный проход — целиком из кеша"
+    follow.add_edge({'from': 'V9', 'to': 'V0', 'id': 'E9'})
+    cached.navigate('V0', copy.deepcopy(BASE_AGENT), verbose=False, max_scenarios=1)
+    assert cached.edge_cache.invalidations == 1
+    print(f"✓ цепочка сценариев: {len(path)} шагов, загрузок графа: {len(loads)}")
+
+
+def test_packed_conditions_match_named():
+    """Упакованные условия дают те же ΣΔE, допустимость и нарушения."""
+    for e in EDGES:
+        assert unpack_conditions(pack_conditions(e)) == e
+    keys = ('edge_id', 'total_dev', 'em_dev', 'eth_dev', 'admissible',
+            'failed_conditions', 'barrier')
+    for profile in (BASE_AGENT, _profile_low_ethics(), _profile_merciful()):
+        nav = AgentNavigator()
+        nav.init_agent(copy.deepcopy(profile))
+        peaks = agent_peak_vector(nav.emotional_model, nav.ethical_model)
+        for node_id in ('V0', 'V1', 'V2'):
+            named = _edges_from(node_id)
+            packed = [(i, n, pack_conditions(p), np_) for i, n, p, np_ in named]
+            ref = nav.build_candidates(named)
+            fast = nav.build_candidates(packed)
+            assert [[c[k] for k in keys] for c in ref] == \
+                   [[c[k] for k in keys] for c in fast]
+            for (_, _, props, _), c in zip(packed, ref):
+                em, eth, ok, failed = _evaluate_one_python(props, peaks)
+                assert (round(em + eth, 3), ok, failed) == \
+                    (c['total_dev'], c['admissible'], c['failed_conditions'])
+            assert nav.compute_deviation_details(packed[0][2]) == \
+                nav.compute_deviation_details(named[0][2])
+    print("✓ упакованные условия эквивалентны именованным")
+
+
+def test_tsk_fixed_point_iteration():
+    """Повтор TSK-проходов до сходимости ≡ ручным повторам apply_tsk_rules."""
+    def make(state_backend='python', cap=1):
+        nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                             state_backend=state_backend, tsk_max_iterations=cap)
+        nav.init_agent(copy.deepcopy(BASE_AGENT))
+        return nav
+
+    single = make()
+    result = single.step('V0')
+    assert result.tsk_iterations == 1 and result.tsk_converged is None
+
+    nav = make(cap=500)
+    em_deltas, eth_deltas = nav.iterate_tsk()
+    n = nav.last_tsk_iterations
+    assert nav.last_tsk_converged and 1 < n < 500
+
+    manual = make()
+    start = agent_peak_vector(manual.emotional_model, manual.ethical_model)
+    for _ in range(n):
+        manual.emotional_model.apply_tsk_rules()
+        manual.ethical_model.apply_tsk_rules()
+    assert manual.emotional_model.state == nav.emotional_model.state
+    assert manual.ethical_model.state == nav.ethical_model.state
+    end = agent_peak_vector(nav.emotional_model, nav.ethical_model)
+    for i, name in enumerate(nav.emotional_model.state):
+        if name in em_deltas:
+            assert abs(em_deltas[name] - (end[i] - start[i])) < 1e-4
+    assert eth_deltas
+
+    # Ещё один проход почти ничего не меняет
+    manual.emotional_model.apply_tsk_rules()
+    manual.ethical_model.apply_tsk_rules()
+    after = agent_peak_vector(manual.emotional_model, manual.ethical_model)
+    assert max(abs(a - b) for a, b in zip(after, end)) <= nav.tsk_tolerance
+
+    arrays = make('numpy', cap=500)
+    arrays.iterate_tsk()
+    assert arrays.last_tsk_iterations == n and arrays.last_tsk_converged
+
+    capped = make(cap=3)
+    result = capped.step('V0')
+    assert result.tsk_iterations == 3 and result.tsk_converged is False
+    # Явный 0 — ни одного прохода, а не предел по умолчанию
+    before = agent_peak_vector(capped.emotional_model, capped.ethical_model)
+    assert capped.iterate_tsk(max_iterations=0) == ({}, {})
+    assert capped.last_tsk_iterations == 0
+    assert agent_peak_vector(capped.emotional_model, capped.ethical_model) == before
+    # Вход в сценарий цепочки обновляет счётчики TSK
+    capped.register_scenario('again', ScenarioGraph.from_lists(NODES, EDGES))
+    capped.last_tsk_iterations = capped.last_tsk_converged = None
+    capped.enter_scenario('again', 'V0')
+    assert capped.last_tsk_iterations == 3 and capped.last_tsk_converged is False
+    print(f"✓ итерация TSK до неподвижной точки: {n} проход(ов)")
+
+
+def test_possibilistic_conditions():
+    """Π / N по полным Tri: крайние случаи, векторный ≡ скалярному, α = 1 ≡ пикам."""
+    assert abs(possibility_le((0.3, 0.5, 0.7), (0.2, 0.3, 0.4)) - 1 / 3) < 1e-12
+    assert possibility_le((0.4, 0.5, 0.6), (0.2, 0.3, 0.4)) == 0.0
+    assert necessity_le((0.2, 0.3, 0.4), (0.4, 0.5, 0.6)) == 1.0
+    assert necessity_le((0.3, 0.3, 0.3), (0.3, 0.3, 0.3)) == 1.0
+    assert possibility_le((0.31, 0.31, 0.31), (0.3, 0.3, 0.3)) == 0.0
+    assert fuzzy_distance((0.2, 0.3, 0.4), (0.4, 0.5, 0.6)) == abs(0.3 - 0.5)
+
+    rng = random.Random(7)
+
+    def tri():
+        return sorted(rng.choice((0.0, 0.3, 1.0, rng.random())) for _ in range(3))
+
+    for _ in range(500):
+        x, y = tri(), tri()
+        assert necessity_le(x, y) <= possibility_le(x, y) + 1e-12
+
+    keys = ('edge_id', 'next_id', 'admissible')
+    for profile in (BASE_AGENT, _profile_low_ethics(), _profile_formalist(),
+                    _profile_merciful()):
+        peak = AgentNavigator()
+        peak.init_agent(copy.deepcopy(profile))
+        strict = AgentNavigator(condition_mode='possibility', condition_threshold=1.0)
+        strict.init_agent(copy.deepcopy(profile))
+        agent = agent_tri_vector(strict.emotional_model, strict.ethical_model)
+        for node_id in ('V0', 'V1', 'V2', 'V3'):
+            edges = _edges_from(node_id)
+            assert [[c[k] for k in keys] for c in peak.build_candidates(edges)] == \
+                   [[c[k] for k in keys] for c in strict.build_candidates(edges)]
+            packed = [pack_conditions(e[2]) for e in edges]
+            for mode in ('possibility', 'necessity'):
+                fast = evaluate_possibilistic(packed, agent, mode, 0.5)
+                slow = [_evaluate_possibilistic_python(p, agent, mode, 0.5, 1e-9)
+                        for p in packed]
+                for f, r in zip(fast, slow):
+                    assert f[2:4] == r[2:4]
+                    assert all(abs(f[i] - r[i]) < 1e-12 for i in (0, 1, 4))
+
+    # Навигация в режиме необходимости: выбранные рёбра проходят порог
+    nav = AgentNavigator(graph=ScenarioGraph.from_lists(NODES, EDGES),
+                         condition_mode='necessity', condition_threshold=0.5)
+    nav.init_agent(copy.deepcopy(_profile_merciful()))
+    result = nav.step('V0')
+    assert result is not None and result.chosen['condition_degree'] >= 0.5
+    assert all(c['admissible'] == (c['condition_degree'] >= 0.5)
+               for c in result.candidates)
+    try:
+        AgentNavigator(condition_mode='fuzzy')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ожидалась ValueError")
+    print("✓ возможностная проверка условий по полным Tri")
+
+
+def test_monte_carlo_matches_navigator():
+    """Пакетный прогон выборок ≡ поагентной навигации; интервалы Уилсона."""
+    graph = ScenarioGraph.from_lists(NODES, EDGES)
+    n = 200
+    for profile in (BASE_AGENT, _profile_low_ethics(), _profile_formalist()):
+        result = monte_carlo(graph, 'V0', profile, n, seed=3)
+        samples = sample_profiles(profile, n, np.random.default_rng(3))
+        assert np.array_equal(result.samples, samples[:, :, 1])
+        for i in range(0, n, 4):
+            if result.tied[i]:
+                continue
+            nav = AgentNavigator(graph=graph)
+            nav.init_agent({('emotion_' if kind == 'em' else 'ethic_') + name: list(tri)
+                            for (kind, name), tri in zip(VARIABLE_SLOTS, samples[i])})
+            current, path = 'V0', ['V0']
+            while True:
+                step = nav.step(current)
+                if step is None:
+                    break
+                current = step.to_node
+                path.append(current)
+            assert tuple(path) == result.sample_paths[i], (i, path)
+
+        assert sum(e.count for e in result.paths.values()) == n
+        assert abs(sum(e.probability for e in result.verdicts.values()) - 1.0) < 1e-12
+        for est in list(result.paths.values()) + list(result.verdicts.values()):
+            assert est.low <= est.probability <= est.high
+        assert 0.0 <= result.fragility < 1.0
+
+    # Точечный профиль: разброса нет — единственный путь с вероятностью 1
+    crisp = {k: [v[1]] * 3 for k, v in BASE_AGENT.items()}
+    result = monte_carlo(graph, 'V0', crisp, 50, seed=0)
+    assert len(result.paths) == 1 and result.fragility == 0.0
+    low, high = wilson_interval(50, 50)
+    assert high == 1.0 and 0.9 < low < 1.0
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    print(f"✓ Монте-Карло: пакетный прогон ≡ навигатору, "
+          f"{len(result.paths)} путь для точечного профиля")
+
+
+def test_deviation_metrics():
+    """Метрики ΣΔE: векторные ≡ скалярным ≡ формулам; выбор и запись в StepResult."""
+    weights = {'emotion_fear': 2.0, 'ethic_honesty': 0.5}
+    w = weight_vector(weights)
+    nav = AgentNavigator()
+    nav.init_agent(copy.deepcopy(_profile_low_ethics()))
+    peaks = agent_peak_vector(nav.emotional_model, nav.ethical_model)
+    packed = [pack_conditions(e[2]) for node in ('V0', 'V1', 'V2')
+              for e in _edges_from(node)]
+    for name in ('l1', 'l2', 'chebyshev', 'hinge'):
+        metric = get_metric(name)
+        for weighted in (None, w):
+            fast = evaluate_packed(packed, peaks, metric=name, weights=weighted)
+            for props, f in zip(packed, fast):
+                slow = _evaluate_one_python(props, peaks, 1e-9, metric, weighted)
+                assert f[2:] == slow[2:]
+                assert abs(f[0] - slow[0]) < 1e-12 and abs(f[1] - slow[1]) < 1e-12
+                # Прямой расчёт по формуле метрики
+                terms = []
+                for i, (slot, op) in enumerate(zip(props['cond_pack_slots'],
+                                                   props['cond_pack_ops'])):
+                    agent, req = peaks[slot], props['cond_pack_tri'][3 * i + 1]
+                    excess = agent - req if op == OP_LE else req - agent
+                    k = weighted[slot] if weighted else 1.0
+                    terms.append(k * {'l1': abs(excess), 'l2': excess ** 2,
+                                      'chebyshev': abs(excess),
+                                      'hinge': max(0.0, excess)}[name])
+                expected = {'l1': sum(terms), 'l2': sum(terms) ** 0.5,
+                            'chebyshev': max(terms, default=0.0),
+                            'hinge': sum(terms)}[name]
+                assert abs(metric.combine(f[0], f[1]) - expected) < 1e-12
+
+    # Эталонная L1 с единичными весами совпадает с именованной схемой
+    keys = ('edge_id', 'total_dev', 'em_dev', 'eth_dev', 'admissible')
+    unit = AgentNavigator(deviation_weights={'emotion_fear': 1.0})
+    unit.init_agent(copy.deepcopy(_profile_low_ethics()))
+    for node_id in ('V0', 'V1', 'V2'):
+        edges = _edges_from(node_id)
+        assert [[c[k] for k in keys] for c in nav.build_candidates(edges)] == \
+               [[c[k] for k in keys] for c in unit.build_candidates(edges)]
+
+    graph = ScenarioGraph.from_lists(NODES, EDGES)
+    for name in ('l2', 'chebyshev'):
+        walker = AgentNavigator(graph=graph, deviation_metric=name,
+                                deviation_weights=weights)
+        walker.init_agent(copy.deepcopy(BASE_AGENT))
+        result = walker.step('V0')
+        assert result.deviation_metric == name and result.deviation_weights == weights
+        feasible = [c for c in result.candidates if c['admissible']
+                    and result.sem + result.seth > c['barrier']]
+        assert result.total_dev == min(c['total_dev'] for c in feasible)
+
+        # Пакетный Монте-Карло с той же метрикой ≡ навигатору
+        mc = monte_carlo(graph, 'V0', BASE_AGENT, 40, seed=5,
+                         deviation_metric=name, deviation_weights=weights)
+        samples = sample_profiles(BASE_AGENT, 40, np.random.default_rng(5))
+        for i in range(0, 40, 8):
+            if mc.tied[i]:
+                continue
+            agent = AgentNavigator(graph=graph, deviation_metric=name,
+                                   deviation_weights=weights)
+            agent.init_agent({('emotion_' if kind == 'em' else 'ethic_') + var: list(tri)
+                              for (kind, var), tri in zip(VARIABLE_SLOTS, samples[i])})
+            current, path = 'V0', ['V0']
+            while (step := agent.step(current)) is not None:
+                current = step.to_node
+                path.append(current)
+            assert tuple(path) == mc.sample_paths[i]
+
+    # Реестр расширяем; неизвестные имена — ValueError
+    register_metric('squared_sum', lambda d, e: d * d)
+    try:
+        assert AgentNavigator(deviation_metric='squared_sum').metric.reduce == 'sum'
+    finally:
+        del DEVIATION_METRICS['squared_sum']
+    # hinge различает рёбра только в возможностных режимах
+    possible = AgentNavigator(graph=graph, deviation_metric='hinge',
+                              condition_mode='possibility')
+    possible.init_agent(copy.deepcopy(BASE_AGENT))
+    assert possible.step('V0').deviation_metric == 'hinge'
+    for bad in (lambda: AgentNavigator(deviation_metric='cosine'),
+                lambda: AgentNavigator(deviation_metric='hinge'),
+                lambda: monte_carlo(graph, 'V0', BASE_AGENT, 4, deviation_metric='hinge'),
+                lambda: AgentNavigator(deviation_weights={'fear': 2.0}),
+                lambda: register_metric('bad', lambda d, e: d, 'mean')):
+        try:
+            bad()
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ожидалась ValueError")
+    print("✓ метрики отклонения: l1, l2, chebyshev, hinge с весами переменных")
+
+
 if __name__ == '__main__':
     print('═' * 60)
     print('Офлайн-тесты сценарной сети «Кредитный скоринг»')
     print('═' * 60)
     test_tri_membership_shoulders()
     test_shift_tri_invariant()
+    test_tri_value_type()
     test_base_agent_deviation()
     test_low_ethics_deviation()
     test_formalist_deviation()
@@ -246,5 +828,18 @@ if __name__ == '__main__':
     test_combined_mode()
     test_emotion_rules_activate()
     test_termination_no_admissible()
+    test_reachability_sound_for_profiles()
+    test_reachability_flags_broken_edges()
+    test_reachability_sound_for_tsk_iterations()
+    test_local_graph_store_navigation()
+    test_generator_schema_and_roundtrip()
+    test_neighbourhood_cache_hits_and_invalidation()
+    test_neighbourhood_cache_lru_budget()
+    test_scenario_chaining_lazy_loading()
+    test_packed_conditions_match_named()
+    test_tsk_fixed_point_iteration()
+    test_possibilistic_conditions()
+    test_monte_carlo_matches_navigator()
+    test_deviation_metrics()
     print('─' * 60)
     print('Все тесты пройдены ✓')
@@ -0,0 +1,1053 @@
+"""
+Компилируемый векторизованный движок TSK-вывода для обеих моделей.
+
+Эталонные `EmotionalModel.apply_tsk_rules()` / `EthicalModel.apply_tsk_rules()`
+интерпретируют правила по одному: `tri_membership` на каждое условие,
+накопление в словари. Здесь база правил один раз компилируется в матрицы:
+
+    ante_idx   (R, K)     — номера переменных условий (K — макс. число условий)
+    ante_abc   (3, R, K)  — параметры треугольных термов условий
+    ante_mask  (R, K)     — реальные условия (остальное — заполнитель)
+    p0, p1     (R, V)     — коэффициенты заключений y = p0 + p1·x
+    cons_mask  (R, V)     — переменные в заключениях правил
+    weights    (R,)       — веса приоритетов (1.0 для эмоциональной модели)
+
+и все правила вычисляются несколькими операциями NumPy — для одного
+агента (вектор пиков формы (V,)) или для пакета агентов (форма (N, V)).
+Порядок операций повторяет эталон, поэтому дельты и `last_activations`
+совпадают с ним.
+
+Используется моделями при `rule_backend='numpy'` (см. `get_engine`).
+
+Для интерактивного пути одного агента накладные расходы вызовов NumPy на
+~20 правилах сопоставимы с самим выводом, поэтому есть и `rule_backend=
+'codegen'` (`CodegenRuleBase`): по базе правил генерируется и один раз
+компилируется специализированная функция на чистом Python — вычисление
+принадлежностей, min-агрегация и взвешенные суммы развёрнуты в прямой
+код, параметры термов и заключений подставлены константами. Функции
+кешируются по хешу содержимого базы правил.
+
+`rule_backend='incremental'` (`IncrementalRuleBase`) хранит индекс
+«переменная → правила» и кеш активаций на модель и пересчитывает только
+правила, чьи переменные условий изменились, — выигрыш на больших
+генерируемых базах, где большинство правил не активны.
+
+`rule_backend='lut'` (`LookupRuleBase`) берёт μ условий из
+предвычисленных таблиц термов (`MembershipTable`) с оценкой погрешности.
+
+`rule_backend='sparse'` (`SparseRuleBase`) хранит базу в CSR-матрицах и
+затрагивает только правила с ненулевой активацией — для тысяч правил,
+сгенерированных из экспертных таблиц (см. rule_generator).
+
+`rule_backend='jit'` (`JitRuleBase`) вычисляет те же матрицы ядрами
+jit_kernels, скомпилированными Numba (если установлен; иначе — NumPy);
+`rule_backend='auto'` выбирает лучший доступный движок
+(`resolve_rule_backend`).
+
+`TSKMemo` — необязательный слой мемоизации для популяционных прогонов:
+результат вывода кешируется по квантованным пикам условий (LRU).
+"""
+
+import hashlib
+import itertools
+import json
+import math
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from jit_kernels import NUMBA_AVAILABLE, tsk_activations, tsk_aggregate
+from membership_shapes import SHAPES, resolve_term, tri_membership_vec
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен
+    np = None
+
+# Порог активации правила (как в эталонных моделях)
+ACTIVATION_EPS = 1e-6
+
+
+class CompiledRuleBase:
+    """
+    Скомпилированная база TSK-правил.
+
+    Args:
+        rules: правила в формате EMOTION_TSK_RULES / ETHIC_TSK_RULES
+               (порядок вычисления = порядок списка)
+        var_names: переменные модели (порядок вектора пиков)
+        terms: лингвистические термы {имя: (a, b, c) | (форма, *параметры)}
+               — см. membership_shapes
+        priority_weights: веса приоритетов {priority: вес}; None — все 1.0
+
+    Треугольные условия вычисляются одним вызовом `tri_membership_vec` по
+    массиву ante_abc; условия других форм сгруппированы по форме
+    (`shaped`: форма → (маска (R, K), параметры (P, R, K))) и вычисляются
+    только если встречаются в базе правил.
+    """
+
+    def __init__(self, rules: Sequence[dict], var_names: Sequence[str],
+                 terms: Dict[str, tuple],
+                 priority_weights: Optional[Dict[int, float]] = None):
+        if np is None:
+            raise ImportError("rule_backend='numpy' требует NumPy "
+                              "(pip install numpy)")
+        self.rules = list(rules)
+        self.var_names = list(var_names)
+        index = {n: i for i, n in enumerate(self.var_names)}
+        n_rules, n_vars = len(self.rules), len(self.var_names)
+        k = max((len(r['conditions']) for r in self.rules), default=1) or 1
+
+        self.ante_idx = np.zeros((n_rules, k), dtype=np.intp)
+        self.ante_abc = np.zeros((3, n_rules, k))
+        self.ante_mask = np.zeros((n_rules, k), dtype=bool)
+        self.p0 = np.zeros((n_rules, n_vars))
+        self.p1 = np.zeros((n_rules, n_vars))
+        self.cons_mask = np.zeros((n_rules, n_vars), dtype=bool)
+        self.weights = np.ones(n_rules)
+        self.priorities = np.array([r.get('priority', 3) for r in self.rules],
+                                   dtype=np.int64)
+
+        self.shaped: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for r, rule in enumerate(self.rules):
+            for j, (name, term) in enumerate(rule['conditions'].items()):
+                if name not in index:
+                    raise ValueError(f"правило {rule['id']}: неизвестная "
+                                     f"переменная условия {name!r}")
+                self.ante_idx[r, j] = index[name]
+                self.ante_mask[r, j] = True
+                shape, params = resolve_term(term, terms)
+                if shape == 'tri':
+                    self.ante_abc[:, r, j] = params
+                    continue
+                if shape not in self.shaped:
+                    self.shaped[shape] = (
+                        np.zeros((n_rules, k), dtype=bool),
+                        np.zeros((len(params), n_rules, k)))
+                mask, values = self.shaped[shape]
+                mask[r, j] = True
+                values[:, r, j] = params
+            for name, (p0, p1) in rule['consequents'].items():
+                if name not in index:
+                    raise ValueError(f"правило {rule['id']}: неизвестная "
+                                     f"переменная заключения {name!r}")
+                v = index[name]
+                self.p0[r, v], self.p1[r, v] = p0, p1
+                self.cons_mask[r, v] = True
+            if priority_weights is not None:
+                self.weights[r] = priority_weights.get(rule.get('priority', 3), 1.0)
+        self._has_conditions = self.ante_mask.any(axis=1)
+
+    # ── Вычисление ─────────────────────────────────────────────────
+
+    def activations(self, peaks: np.ndarray) -> np.ndarray:
+        """w_i = min μ по условиям правила; форма (..., R)."""
+        x = peaks[..., self.ante_idx]                         # (..., R, K)
+        mu = tri_membership_vec(x, *self.ante_abc)
+        for shape, (mask, values) in self.shaped.items():
+            # Вне маски параметры нулевые — их значения отбрасываются
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                mu = np.where(mask, SHAPES[shape].vector(x, *values), mu)
+        mu = np.where(self.ante_mask, mu, np.inf)
+        w = mu.min(axis=-1)
+        return np.where(self._has_conditions, w, 0.0)
+
+    def evaluate_arrays(self, peaks: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Один TSK-проход для вектора (V,) или пакета (N, V) пиков.
+
+        Возвращает (deltas, touched, w): дельты пиков, маску переменных,
+        затронутых сработавшими правилами, и активации правил.
+        """
+        peaks = np.asarray(peaks, dtype=np.float64)
+        w = self.activations(peaks)
+        active = w >= ACTIVATION_EPS
+        ew = np.where(active, w, 0.0) * self.weights          # (..., R)
+        y = self.p0 + self.p1 * peaks[..., None, :]           # (..., R, V)
+        contrib = np.where(self.cons_mask, ew[..., :, None], 0.0)
+        num = (contrib * y).sum(axis=-2)
+        den = contrib.sum(axis=-2)
+        touched = den > ACTIVATION_EPS
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deltas = np.where(touched, num / den - peaks, 0.0)
+        return deltas, touched, w
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        """
+        Интерфейс движка для моделей: ({переменная: дельта}, [(правило, w)])
+        — дельты без округления для затронутых переменных и сработавшие
+        правила в порядке вычисления.
+        """
+        deltas, touched, w = self.evaluate_arrays(np.asarray(peaks, dtype=np.float64))
+        out = {self.var_names[v]: float(deltas[v]) for v in np.flatnonzero(touched)}
+        fired = [(self.rules[r], float(w[r]))
+                 for r in np.flatnonzero(w >= ACTIVATION_EPS)]
+        return out, fired
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Таблицы принадлежности лингвистических термов
+# ──────────────────────────────────────────────────────────────────────
+
+# Число интервалов сетки на [0, 1] по умолчанию (шаг h = 1e-3)
+LUT_RESOLUTION = 1000
+
+
+class MembershipTable:
+    """
+    Предвычисленные значения μ всех термов на равномерной сетке [0, 1].
+
+    `evaluate(x)` для вектора пиков — выборка из таблицы (с линейной
+    интерполяцией между узлами или по ближайшему узлу) вместо ветвлений
+    `tri_membership` на каждый вызов.
+
+    Оценка погрешности (`error_bound`) относительно точной функции для
+    пиков в [0, 1]; h = 1 / resolution, L — наибольший наклон плеча
+    терма (1 / мин. ширина плеча):
+      • интерполяция: μ кусочно-линейна, ошибка возникает только в ячейках
+        с изломом (a, b или c) и не превышает |скачок наклона|·h/4 ≤ L·h/2;
+        если все изломы лежат в узлах сетки (термы 0.2/0.5/0.8 при h = 1e-3),
+        таблица точна до округления float (в оценку заложен запас 1e-12);
+      • ближайший узел: ошибка ≤ L·h/2.
+    Для термов с разрывом внутри (0, 1) (a == b > 0 или b == c < 1) оценка
+    равна 1.0 — таблица в ячейке разрыва гарантий не даёт. Для гладких
+    форм (gauss, sigmoid) — L·h/2 с их липшицевой константой.
+    """
+
+    def __init__(self, terms: Dict[str, tuple],
+                 resolution: int = LUT_RESOLUTION, interpolate: bool = True):
+        if np is None:
+            raise ImportError("таблицы принадлежности требуют NumPy "
+                              "(pip install numpy)")
+        self.term_names = list(terms)
+        self.term_index = {t: i for i, t in enumerate(self.term_names)}
+        self.resolution = resolution
+        self.interpolate = interpolate
+        specs = [resolve_term(t, terms) for t in self.term_names]
+        grid = np.arange(resolution + 1) / resolution
+        self.table = np.array([[SHAPES[shape].scalar(float(x), *params) for x in grid]
+                               for shape, params in specs])
+        self.error_bound = self._error_bound(specs)
+
+    def _error_bound(self, specs: List[Tuple[str, tuple]]) -> float:
+        h = 1.0 / self.resolution
+        bound = 0.0
+        for shape, params in specs:
+            if shape in ('tri', 'trap'):
+                # Кусочно-линейные формы: изломы в параметрах
+                rise, fall = ((params[0], params[1]), (params[-2], params[-1]))
+                if ((rise[1] - rise[0] <= 1e-9 and rise[0] > 0.0)
+                        or (fall[1] - fall[0] <= 1e-9 and fall[1] < 1.0)):
+                    return 1.0
+                on_grid = all(abs(p * self.resolution - round(p * self.resolution))
+                              < 1e-9 for p in params)
+                if self.interpolate and on_grid:
+                    continue
+            bound = max(bound, SHAPES[shape].lipschitz(*params) * h / 2.0)
+        return bound + 1e-12            # запас на округление float
+
+    def evaluate(self, x: np.ndarray, term_idx: Optional[np.ndarray] = None
+                 ) -> np.ndarray:
+        """
+        μ по таблице. Без term_idx — все термы: форма (T, *x.shape);
+        иначе term_idx согласуется с x по broadcasting (поэлементный терм).
+        """
+        x = np.clip(np.asarray(x, dtype=np.float64), 0.0, 1.0)
+        rows = term_idx
+        if rows is None:
+            rows = np.arange(len(self.term_names)).reshape((-1,) + (1,) * x.ndim)
+        pos = x * self.resolution
+        if not self.interpolate:
+            return self.table[rows, np.rint(pos).astype(np.intp)]
+        k = np.minimum(pos.astype(np.intp), self.resolution - 1)
+        frac = pos - k
+        return self.table[rows, k] * (1.0 - frac) + self.table[rows, k + 1] * frac
+
+
+class LookupRuleBase(CompiledRuleBase):
+    """
+    `CompiledRuleBase`, у которой μ условий берутся из `MembershipTable`
+    (rule_backend='lut'). Результат отличается от эталона не более чем на
+    `table.error_bound` по каждой активации.
+    """
+
+    def __init__(self, rules: Sequence[dict], var_names: Sequence[str],
+                 terms: Dict[str, tuple],
+                 priority_weights: Optional[Dict[int, float]] = None,
+                 resolution: int = LUT_RESOLUTION, interpolate: bool = True):
+        super().__init__(rules, var_names, terms, priority_weights)
+        # Таблица по всем различным термам условий (включая заданные
+        # спецификацией прямо в правиле): ключ — (форма, *параметры)
+        keys = [[self._term_key(term, terms) for term in rule['conditions'].values()]
+                for rule in self.rules]
+        used = {key: key for row in keys for key in row}
+        self.table = MembershipTable(used, resolution, interpolate)
+        self.ante_term = np.zeros(self.ante_idx.shape, dtype=np.intp)
+        for r, row in enumerate(keys):
+            for j, key in enumerate(row):
+                self.ante_term[r, j] = self.table.term_index[key]
+
+    @staticmethod
+    def _term_key(term, terms: Dict[str, tuple]) -> tuple:
+        shape, params = resolve_term(term, terms)
+        return (shape, *params)
+
+    def activations(self, peaks: np.ndarray) -> np.ndarray:
+        mu = self.table.evaluate(peaks[..., self.ante_idx], self.ante_term)
+        mu = np.where(self.ante_mask, mu, np.inf)
+        w = mu.min(axis=-1)
+        return np.where(self._has_conditions, w, 0.0)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Генерация кода: развёрнутый вычислитель базы правил
+# ──────────────────────────────────────────────────────────────────────
+
+# хеш содержимого базы правил → (исходный текст, функция); LRU
+CODEGEN_CACHE_SIZE = 256
+_CODEGEN_CACHE: 'OrderedDict[str, Tuple[str, Callable]]' = OrderedDict()
+
+
+def _codegen_lookup(digest: str, source: Optional[str],
+                    build: Callable[[], str]) -> Tuple[str, Callable]:
+    """(исходный текст, функция) из LRU-кеша; иначе собрать и запомнить."""
+    cached = _CODEGEN_CACHE.get(digest)
+    if cached is not None:
+        _CODEGEN_CACHE.move_to_end(digest)
+        return cached
+    source = source if source is not None else build()
+    cached = (source, _compile_source(source, digest))
+    _CODEGEN_CACHE[digest] = cached
+    if len(_CODEGEN_CACHE) > CODEGEN_CACHE_SIZE:
+        _CODEGEN_CACHE.popitem(last=False)
+    return cached
+
+
+def _const(value) -> str:
+    """
+    Литерал константы для генерируемого кода: float(value) в виде
+    `float.__repr__` (np.float64, int, bool приводятся к float).
+    Нечисловые и бесконечные значения отвергаются — `nan` / `inf` не
+    являются литералами Python.
+    """
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"недопустимая константа в базе правил: {value!r}")
+    return float.__repr__(value)
+
+
+def _membership_expr(x: str, a: float, b: float, c: float) -> str:
+    """
+    Выражение μ = Tri(x; a, b, c) с подставленными константами —
+    те же ветви и те же арифметические операции, что в `tri_membership`.
+    """
+    a, b, c = float(a), float(b), float(c)
+    left = f"({x} - {_const(a)}) / {_const(b - a)}" if (b - a) > 1e-9 else "1.0"
+    right = f"({_const(c)} - {x}) / {_const(c - b)}" if (c - b) > 1e-9 else "1.0"
+    return (f"0.0 if ({x} < {_const(a)} or {x} > {_const(c)}) else 1.0 "
+            f"if abs({x} - {_const(b)}) < 1e-9 else "
+            f"({left} if {x} < {_const(b)} else {right})")
+
+
+def rule_set_digest(rules: Sequence[dict], var_names: Sequence[str],
+                    terms: Dict[str, tuple],
+                    priority_weights: Optional[Dict[int, float]] = None) -> str:
+    """Хеш всего, от чего зависит результат вывода (порядок правил учитывается)."""
+    payload = {
+        'rules': [[r['id'], list(r['conditions'].items()),
+                   [[n, list(pq)] for n, pq in r['consequents'].items()],
+                   r.get('priority', 3)] for r in rules],
+        'vars': list(var_names),
+        'terms': {k: list(v) for k, v in sorted(terms.items())},
+        'weights': (None if priority_weights is None
+                    else sorted(priority_weights.items())),
+    }
+    blob = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+
+def generate_source(rules: Sequence[dict], var_names: Sequence[str],
+                    terms: Dict[str, tuple],
+                    priority_weights: Optional[Dict[int, float]] = None) -> str:
+    """
+    Исходный текст функции `_tsk_eval(x)` для базы правил.
+
+    x — пики в порядке var_names; результат — ({имя: дельта}, [(№ правила, w)]).
+    Порядок накоплений совпадает с эталонными моделями, поэтому результат
+    совпадает с ними бит в бит. Треугольные термы разворачиваются в
+    выражения; термы других форм вызывают скалярную функцию формы.
+    """
+    index = {n: i for i, n in enumerate(var_names)}
+    used = sorted({index[n] for r in rules
+                   for n in (*r['conditions'], *r['consequents'])})
+    outputs = sorted({index[n] for r in rules for n in r['consequents']})
+    lines = ["def _tsk_eval(x):"]
+    lines += [f"    x{v} = x[{v}]" for v in used]
+    lines.append("    fired = []")
+    lines += [f"    num{v} = 0.0; den{v} = 0.0" for v in outputs]
+    for r, rule in enumerate(rules):
+        # id — только как экранированный литерал: сырой текст из файла
+        # правил не должен попадать в исполняемый код
+        rule_id = ' '.join(str(rule['id']).splitlines())
+        lines.append(f"    # {rule_id!r}")
+        conds = list(rule['conditions'].items())
+        if not conds:
+            continue
+        for j, (name, term) in enumerate(conds):
+            shape, params = resolve_term(term, terms)
+            if shape == 'tri':
+                expr = _membership_expr(f"x{index[name]}", *params)
+            else:
+                args = ', '.join(_const(p) for p in params)
+                expr = f"_MU[{shape!r}](x{index[name]}, {args})"
+            if j == 0:
+                lines.append(f"    w = {expr}")
+            else:
+                lines.append(f"    mu = {expr}")
+                lines.append("    if mu < w: w = mu")
+        lines.append(f"    if w >= {_const(ACTIVATION_EPS)}:")
+        lines.append(f"        fired.append(({r}, w))")
+        ew = "w"
+        if priority_weights is not None:
+            weight = priority_weights.get(rule.get('priority', 3), 1.0)
+            lines.append(f"        ew = w * {_const(weight)}")
+            ew = "ew"
+        for name, (p0, p1) in rule['consequents'].items():
+            v = index[name]
+            lines.append(f"        num{v} += {ew} * ({_const(p0)} + {_const(p1)} * x{v})")
+            lines.append(f"        den{v} += {ew}")
+    lines.append("    deltas = {}")
+    for v in outputs:
+        lines.append(f"    if den{v} > {_const(ACTIVATION_EPS)}:")
+        lines.append(f"        deltas[{var_names[v]!r}] = num{v} / den{v} - x{v}")
+    lines.append("    return deltas, fired")
+    return "\n".join(lines) + "\n"
+
+
+def _compile_source(source: str, digest: str) -> Callable:
+    namespace: dict = {'_MU': {n: sh.scalar for n, sh in SHAPES.items()}}
+    exec(compile(source, f"<tsk_codegen:{digest[:12]}>", 'exec'), namespace)
+    return namespace['_tsk_eval']
+
+
+class CodegenRuleBase:
+    """
+    База TSK-правил, скомпилированная в специализированную функцию Python.
+
+    Аргументы — как у `CompiledRuleBase`. Функция генерируется один раз на
+    содержимое базы правил (`rule_set_digest`) и переиспользуется всеми
+    экземплярами; исходный текст доступен в `source`.
+    """
+
+    def __init__(self, rules: Sequence[dict], var_names: Sequence[str],
+                 terms: Dict[str, tuple],
+                 priority_weights: Optional[Dict[int, float]] = None):
+        self.rules = list(rules)
+        self.var_names = list(var_names)
+        unknown = [n for r in self.rules
+                   for n in (*r['conditions'], *r['consequents'])
+                   if n not in self.var_names]
+        if unknown:
+            raise ValueError(f"неизвестные переменные в правилах: {unknown}")
+        self.digest = rule_set_digest(self.rules, self.var_names, terms,
+                                      priority_weights)
+        self.source, self._fn = _codegen_lookup(
+            self.digest, None, lambda: generate_source(
+                self.rules, self.var_names, terms, priority_weights))
+
+    def __getstate__(self):
+        # Функция не сериализуется — сохраняется исходный текст
+        state = dict(self.__dict__)
+        del state['_fn']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._fn = _codegen_lookup(self.digest, self.source, lambda: self.source)[1]
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        """Тот же интерфейс, что `CompiledRuleBase.evaluate`."""
+        deltas, fired = self._fn(peaks)
+        rules = self.rules
+        return deltas, [(rules[r], w) for r, w in fired]
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Разреженный движок для больших генерируемых баз правил
+# ──────────────────────────────────────────────────────────────────────
+
+def _gather_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Конкатенация диапазонов [starts[i], ends[i]) в один массив индексов."""
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.intp)
+    shift = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shift + np.arange(total)
+
+
+class SparseRuleBase:
+    """
+    База правил в разреженном (CSR) представлении (rule_backend='sparse').
+
+    Атом — пара (переменная, терм); одинаковые атомы разных правил общие.
+      ante_ptr / ante_atoms   — CSR «правило → атомы условия»
+      atom_ptr / atom_rules   — транспонированная (CSC) «атом → правила»
+      cons_ptr / cons_var / cons_p0 / cons_p1 — CSR заключений
+
+    Проход: μ всех атомов (их не больше V × число термов), затем по спискам
+    атомов с μ ≥ ACTIVATION_EPS отбираются правила, у которых активны все
+    условия, — остальные правила не затрагиваются. Стоимость прохода
+    растёт с числом активных правил, а не с размером базы. Порядок
+    накопления совпадает с эталоном (по правилам), результат — бит в бит.
+
+    Атрибут `last_candidates` — число правил, затронутых последним проходом.
+    """
+
+    def __init__(self, rules: Sequence[dict], var_names: Sequence[str],
+                 terms: Dict[str, tuple],
+                 priority_weights: Optional[Dict[int, float]] = None):
+        if np is None:
+            raise ImportError("rule_backend='sparse' требует NumPy "
+                              "(pip install numpy)")
+        self.rules = list(rules)
+        self.var_names = list(var_names)
+        index = {n: i for i, n in enumerate(self.var_names)}
+        atoms: Dict[tuple, int] = {}
+        atom_specs: List[Tuple[int, str, tuple]] = []
+        ante_ptr, ante_atoms = [0], []
+        cons_ptr, cons_var, cons_p0, cons_p1 = [0], [], [], []
+        for rule in self.rules:
+            for name, term in rule['conditions'].items():
+                if name not in index:
+                    raise ValueError(f"правило {rule['id']}: неизвестная "
+                                     f"переменная условия {name!r}")
+                shape, params = resolve_term(term, terms)
+                key = (index[name], shape, params)
+                if key not in atoms:
+                    atoms[key] = len(atom_specs)
+                    atom_specs.append(key)
+                ante_atoms.append(atoms[key])
+            ante_ptr.append(len(ante_atoms))
+            for name, (p0, p1) in rule['consequents'].items():
+                if name not in index:
+                    raise ValueError(f"правило {rule['id']}: неизвестная "
+                                     f"переменная заключения {name!r}")
+                cons_var.append(index[name])
+                cons_p0.append(p0)
+                cons_p1.append(p1)
+            cons_ptr.append(len(cons_var))
+
+        self.ante_ptr = np.array(ante_ptr, dtype=np.intp)
+        self.ante_atoms = np.array(ante_atoms, dtype=np.intp)
+        self.n_conditions = np.diff(self.ante_ptr)
+        self.cons_ptr = np.array(cons_ptr, dtype=np.intp)
+        self.cons_var = np.array(cons_var, dtype=np.intp)
+        self.cons_p0 = np.array(cons_p0, dtype=np.float64)
+        self.cons_p1 = np.array(cons_p1, dtype=np.float64)
+        self.weights = np.array([1.0 if priority_weights is None else
+                                 priority_weights.get(r.get('priority', 3), 1.0)
+                                 for r in self.rules])
+        self._weighted = priority_weights is not None
+
+        # CSC: для каждого атома — возрастающий список правил
+        rule_of_entry = np.repeat(np.arange(len(self.rules)), self.n_conditions)
+        order = np.argsort(self.ante_atoms, kind='stable')
+        self.atom_rules = rule_of_entry[order]
+        counts = np.bincount(self.ante_atoms, minlength=len(atom_specs))
+        self.atom_ptr = np.concatenate(([0], np.cumsum(counts))).astype(np.intp)
+
+        # Атомы, сгруппированные по форме терма: (номера атомов, переменные, параметры)
+        self.atom_var = np.array([a[0] for a in atom_specs], dtype=np.intp)
+        groups: Dict[str, List[int]] = {}
+        for i, (_, shape, _) in enumerate(atom_specs):
+            groups.setdefault(shape, []).append(i)
+        self.atom_groups = [
+            (shape, np.array(ids, dtype=np.intp), self.atom_var[ids],
+             np.array([atom_specs[i][2] for i in ids], dtype=np.float64).T)
+            for shape, ids in groups.items()]
+        self.n_atoms = len(atom_specs)
+        self.last_candidates = 0
+
+    def atom_memberships(self, peaks: np.ndarray) -> np.ndarray:
+        mu = np.zeros(self.n_atoms)
+        for shape, ids, var, params in self.atom_groups:
+            mu[ids] = SHAPES[shape].vector(peaks[var], *params)
+        return mu
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        """Тот же интерфейс, что `CompiledRuleBase.evaluate`."""
+        x = np.asarray(peaks, dtype=np.float64)
+        mu = self.atom_memberships(x)
+        live = np.flatnonzero(mu >= ACTIVATION_EPS)
+        postings = self.atom_rules[_gather_ranges(self.atom_ptr[live],
+                                                  self.atom_ptr[live + 1])]
+        touched, hits = np.unique(postings, return_counts=True)
+        self.last_candidates = len(touched)
+        active = touched[hits == self.n_conditions[touched]]
+        if not len(active):
+            return {}, []
+
+        ante = _gather_ranges(self.ante_ptr[active], self.ante_ptr[active + 1])
+        offsets = np.cumsum(self.n_conditions[active]) - self.n_conditions[active]
+        w = np.minimum.reduceat(mu[self.ante_atoms[ante]], offsets)
+        ew = w * self.weights[active] if self._weighted else w
+
+        ent = _gather_ranges(self.cons_ptr[active], self.cons_ptr[active + 1])
+        per_rule = self.cons_ptr[active + 1] - self.cons_ptr[active]
+        ew_ent = np.repeat(ew, per_rule)
+        var = self.cons_var[ent]
+        y = self.cons_p0[ent] + self.cons_p1[ent] * x[var]
+        n_vars = len(self.var_names)
+        num = np.bincount(var, weights=ew_ent * y, minlength=n_vars)
+        den = np.bincount(var, weights=ew_ent, minlength=n_vars)
+        names = self.var_names
+        deltas = {names[v]: float(num[v] / den[v] - x[v])
+                  for v in np.flatnonzero(den > ACTIVATION_EPS)}
+        rules = self.rules
+        return deltas, [(rules[r], float(wr)) for r, wr in zip(active, w)]
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Инкрементальный вывод: индекс зависимостей и кеш активаций
+# ──────────────────────────────────────────────────────────────────────
+
+# Порог изменения пика переменной, ниже которого активации зависящих от
+# неё правил не пересчитываются. 0.0 — пересчёт при любом изменении
+# (результат совпадает с эталоном бит в бит); при ε > 0 погрешность
+# активации не превышает ε / (мин. ширина плеча терма).
+INCREMENTAL_EPSILON = 0.0
+
+
+class IncrementalRuleBase:
+    """
+    База правил с индексом «переменная → правила, где она в условии».
+
+    Сам движок не хранит состояния и разделяется моделями через кеш
+    `get_engine`; кеш активаций живёт в `IncrementalSession` — своей для
+    каждой модели (см. `session()` и `engine_for`). За проход заново
+    вычисляются только правила, у которых пик хотя бы одной переменной
+    условия изменился больше чем на ε с момента их последнего вычисления.
+    Заключения y = p0 + p1·x сработавших правил считаются всегда.
+    """
+
+    def __init__(self, rules: Sequence[dict], var_names: Sequence[str],
+                 terms: Dict[str, tuple],
+                 priority_weights: Optional[Dict[int, float]] = None):
+        self.rules = list(rules)
+        self.var_names = list(var_names)
+        index = {n: i for i, n in enumerate(self.var_names)}
+        # Условие: (номер переменной, скалярная μ формы, параметры)
+        self.conditions: List[List[Tuple[int, Callable, tuple]]] = []
+        self.consequents: List[List[Tuple[int, float, float]]] = []
+        self.weights: List[Optional[float]] = []
+        self.dependents: List[List[int]] = [[] for _ in self.var_names]
+        for r, rule in enumerate(self.rules):
+            try:
+                conds = []
+                for n, t in rule['conditions'].items():
+                    shape, params = resolve_term(t, terms)
+                    conds.append((index[n], SHAPES[shape].scalar, params))
+                cons = [(index[n], p0, p1)
+                        for n, (p0, p1) in rule['consequents'].items()]
+            except KeyError as exc:
+                raise ValueError(f"правило {rule['id']}: неизвестная "
+                                 f"переменная или терм {exc}") from None
+            self.conditions.append(conds)
+            self.consequents.append(cons)
+            self.weights.append(None if priority_weights is None else
+                                priority_weights.get(rule.get('priority', 3), 1.0))
+            for v in {c[0] for c in conds}:
+                self.dependents[v].append(r)
+
+    def activation(self, r: int, peaks: Sequence[float]) -> float:
+        """w_r = min μ по условиям правила r."""
+        conds = self.conditions[r]
+        if not conds:
+            return 0.0
+        return min(mu(peaks[v], *params) for v, mu, params in conds)
+
+    def session(self, epsilon: Optional[float] = None) -> 'IncrementalSession':
+        return IncrementalSession(self, INCREMENTAL_EPSILON if epsilon is None
+                                  else epsilon)
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        """Вывод без кеша (одноразовая сессия)."""
+        return self.session().evaluate(peaks)
+
+
+class IncrementalSession:
+    """
+    Кеш активаций одной модели для `IncrementalRuleBase`.
+
+    Атрибуты:
+        epsilon — порог изменения пика (см. INCREMENTAL_EPSILON)
+        recomputed — число правил, пересчитанных в последнем проходе
+        total_recomputed / passes — накопленная статистика
+    """
+
+    def __init__(self, engine: IncrementalRuleBase, epsilon: float = 0.0):
+        self.engine = engine
+        self.epsilon = epsilon
+        self._seen: Optional[List[float]] = None
+        self._w = [0.0] * len(engine.rules)
+        self._active: set = set()
+        self.recomputed = 0
+        self.total_recomputed = 0
+        self.passes = 0
+
+    def invalidate(self):
+        """Сбросить кеш: следующий проход вычислит все правила."""
+        self._seen = None
+
+    def _dirty_rules(self, peaks: List[float]) -> set:
+        engine = self.engine
+        if self._seen is None:
+            self._seen = list(peaks)
+            return set(range(len(engine.rules)))
+        eps, seen, dirty = self.epsilon, self._seen, set()
+        for v, x in enumerate(peaks):
+            if abs(x - seen[v]) > eps:
+                seen[v] = x
+                dirty.update(engine.dependents[v])
+        return dirty
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        """Тот же интерфейс, что `CompiledRuleBase.evaluate`."""
+        engine = self.engine
+        peaks = [float(x) for x in peaks]
+        dirty = self._dirty_rules(peaks)
+        w, active = self._w, self._active
+        for r in dirty:
+            w[r] = wr = engine.activation(r, peaks)
+            if wr >= ACTIVATION_EPS:
+                active.add(r)
+            else:
+                active.discard(r)
+        self.recomputed = len(dirty)
+        self.total_recomputed += len(dirty)
+        self.passes += 1
+
+        num: Dict[int, float] = {}
+        den: Dict[int, float] = {}
+        fired = []
+        for r in sorted(active):
+            wr = w[r]
+            fired.append((engine.rules[r], wr))
+            weight = engine.weights[r]
+            ew = wr if weight is None else wr * weight
+            for v, p0, p1 in engine.consequents[r]:
+                num[v] = num.get(v, 0.0) + ew * (p0 + p1 * peaks[v])
+                den[v] = den.get(v, 0.0) + ew
+        names = engine.var_names
+        deltas = {names[v]: num[v] / d - peaks[v]
+                  for v, d in den.items() if d > ACTIVATION_EPS}
+        return deltas, fired
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Мемоизация TSK-вывода по квантованному состоянию
+# ──────────────────────────────────────────────────────────────────────
+
+class TSKMemo:
+    """
+    LRU-кеш результатов TSK-вывода, разделяемый популяцией агентов.
+
+    Ключ — пики переменных, входящих в условия правил, округлённые к
+    сетке шага `grid`. Значение — сработавшие правила с активациями в
+    узле сетки и агрегаты заключений по каждой переменной v:
+        A_v = Σ w·p0 / Σ w,   B_v = Σ w·p1 / Σ w,
+    откуда дельта восстанавливается точно по текущему пику:
+        δ_v = A_v + (B_v − 1)·x_v.
+    Приближение вносит только квантование активаций (|Δμ| ≤ grid/2,
+    делённое на минимальную ширину плеча терма).
+
+    Args:
+        grid: шаг квантования пиков
+        max_entries: ёмкость LRU (на все базы правил вместе)
+        strict: True — кеш не используется, вывод точный (эталонный путь
+                модели); переключается на лету
+    """
+
+    def __init__(self, grid: float = 0.01, max_entries: int = 100_000,
+                 strict: bool = False):
+        if grid <= 0:
+            raise ValueError(f"шаг сетки должен быть > 0: {grid}")
+        self.grid = grid
+        self.max_entries = max_entries
+        self.strict = strict
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return not self.strict
+
+    def evaluator(self, rules: Sequence[dict], var_names: Sequence[str],
+                  terms: Dict[str, tuple],
+                  priority_weights: Optional[Dict[int, float]] = None
+                  ) -> '_MemoEvaluator':
+        engine = get_engine('incremental', rules, var_names, terms,
+                            priority_weights)
+        return _MemoEvaluator(self, engine)
+
+    def lookup(self, key: tuple, compute: Callable[[], tuple]) -> tuple:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = compute()
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'grid': self.grid,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_MEMO_TAGS = itertools.count()
+
+
+class _MemoEvaluator:
+    """Вычислитель с интерфейсом `evaluate(peaks)` поверх `TSKMemo`."""
+
+    def __init__(self, memo: TSKMemo, engine: IncrementalRuleBase):
+        self.memo = memo
+        self.engine = engine
+        self._inputs = [v for v, deps in enumerate(engine.dependents) if deps]
+        # Базы правил различаются в общем кеше по метке движка: не id(),
+        # так как вытесненный из _ENGINE_CACHE движок может быть удалён
+        # и его id достанется другому
+        if not hasattr(engine, '_memo_tag'):
+            engine._memo_tag = next(_MEMO_TAGS)
+        self._tag = engine._memo_tag
+
+    def _compute(self, q: tuple) -> tuple:
+        engine, grid = self.engine, self.memo.grid
+        grid_peaks = [0.0] * len(engine.var_names)
+        for v, k in zip(self._inputs, q):
+            grid_peaks[v] = k * grid
+        num0: Dict[int, float] = {}
+        num1: Dict[int, float] = {}
+        den: Dict[int, float] = {}
+        fired = []
+        for r in range(len(engine.rules)):
+            w = engine.activation(r, grid_peaks)
+            if w < ACTIVATION_EPS:
+                continue
+            fired.append((engine.rules[r], w))
+            weight = engine.weights[r]
+            ew = w if weight is None else w * weight
+            for v, p0, p1 in engine.consequents[r]:
+                num0[v] = num0.get(v, 0.0) + ew * p0
+                num1[v] = num1.get(v, 0.0) + ew * p1
+                den[v] = den.get(v, 0.0) + ew
+        coeffs = tuple((v, num0[v] / d, num1[v] / d)
+                       for v, d in den.items() if d > ACTIVATION_EPS)
+        return fired, coeffs
+
+    def evaluate(self, peaks: Sequence[float]
+                 ) -> Tuple[Dict[str, float], List[Tuple[dict, float]]]:
+        grid = self.memo.grid
+        q = tuple(int(round(peaks[v] / grid)) for v in self._inputs)
+        fired, coeffs = self.memo.lookup((self._tag, q), lambda: self._compute(q))
+        names = self.engine.var_names
+        deltas = {names[v]: a + (b - 1.0) * peaks[v] for v, a, b in coeffs}
+        return deltas, list(fired)
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  JIT-ядра (Numba)
+# ──────────────────────────────────────────────────────────────────────
+
+class JitRuleBase(CompiledRuleBase):
+    """
+    База правил, вычисляемая ядрами jit_kernels (явные циклы, Numba).
+
+    Матрицы — те же, что у `CompiledRuleBase`. Ядра используются, если
+    `kernels` истинно (по умолчанию — при установленном Numba); иначе
+    вычисление идёт операциями NumPy базового класса. Условия нетреугольных
+    форм (membership_shapes) всегда вычисляются NumPy, агрегация — ядром.
+    """
+
+    kernels = NUMBA_AVAILABLE
+
+    def activations(self, peaks: np.ndarray) -> np.ndarray:
+        if not self.kernels or self.shaped:
+            return super().activations(peaks)
+        batch = np.atleast_2d(peaks)
+        w = np.empty((batch.shape[0], len(self.rules)))
+        tsk_activations(batch, self.ante_idx, self.ante_abc, self.ante_mask, w)
+        return w if peaks.ndim == 2 else w[0]
+
+    def evaluate_arrays(self, peaks: np.ndarray
+                        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if not self.kernels:
+            return super().evaluate_arrays(peaks)
+        peaks = np.asarray(peaks, dtype=np.float64)
+        batch = np.ascontiguousarray(np.atleast_2d(peaks))
+        w = self.activations(batch)
+        deltas = np.empty_like(batch)
+        touched = np.empty(batch.shape, dtype=bool)
+        tsk_aggregate(batch, w, self.weights, self.p0, self.p1, self.cons_mask,
+                      ACTIVATION_EPS, deltas, touched)
+        if peaks.ndim == 1:
+            return deltas[0], touched[0], w[0]
+        return deltas, touched, w
+
+
+def resolve_rule_backend(backend: str = 'auto') -> str:
+    """
+    'auto' → лучший доступный движок: 'jit' при установленном Numba,
+    иначе 'numpy', без NumPy — эталонный 'python'. Прочие имена — как есть.
+    """
+    if backend != 'auto':
+        return backend
+    if NUMBA_AVAILABLE:
+        return 'jit'
+    return 'numpy' if np is not None else 'python'
+
+
+# ──────────────────────────────────────────────────────────────────────
+#  Реестр движков и кеш скомпилированных баз
+# ──────────────────────────────────────────────────────────────────────
+
+RULE_BACKENDS = {
+    'numpy': CompiledRuleBase,
+    'codegen': CodegenRuleBase,
+    'incremental': IncrementalRuleBase,
+    'lut': LookupRuleBase,
+    'sparse': SparseRuleBase,
+    'jit': JitRuleBase,
+}
+
+# (backend, id(rules), id(terms), var_names, веса[, ranges]) → (rules,
+# terms, движок). Пока запись в кеше, ссылки на rules / terms удерживаются,
+# поэтому их id не может быть переиспользован; кеш ограничен (LRU), чтобы
+# горячие замены и сгенерированные базы не копились бесконечно.
+ENGINE_CACHE_SIZE = 128
+_ENGINE_CACHE: 'OrderedDict[tuple, tuple]' = OrderedDict()
+
+
+def _engine_key(backend: str, rules: Sequence[dict], var_names: Sequence[str],
+                terms: Dict[str, tuple],
+                priority_weights: Optional[Dict[int, float]] = None,
+                ranges: Optional[Dict[str, Tuple[float, float]]] = None) -> tuple:
+    weights_key = (None if priority_weights is None
+                   else tuple(sorted(priority_weights.items())))
+    key = (backend, id(rules), id(terms), tuple(var_names), weights_key)
+    if ranges is not None:
+        key += (tuple(sorted(ranges.items())),)
+    return key
+
+
+def _cache_engine(key: tuple, rules: Sequence[dict], terms: Dict[str, tuple], engine):
+    _ENGINE_CACHE[key] = (rules, terms, engine)
+    _ENGINE_CACHE.move_to_end(key)
+    if len(_ENGINE_CACHE) > ENGINE_CACHE_SIZE:
+        _ENGINE_CACHE.popitem(last=False)
+
+
+def order_by_priority(rules: Sequence[dict]) -> List[dict]:
+    """Порядок вычисления этических правил: по приоритету (устойчиво)."""
+    return sorted(rules, key=lambda r: r.get('priority', 3))
+
+
+def get_engine(backend: str, rules: Sequence[dict], var_names: Sequence[str],
+               terms: Dict[str, tuple],
+               priority_weights: Optional[Dict[int, float]] = None,
+               ranges: Optional[Dict[str, Tuple[float, float]]] = None):
+    """
+    Скомпилированный движок `backend` для базы правил (с кешированием).
+
+    При заданных priority_weights правила упорядочиваются по приоритету —
+    так же, как в `EthicalModel.apply_tsk_rules`.
+
+    ranges — достижимые диапазоны пиков {переменная: (lo, hi)}: правила,
+    которые в них не срабатывают (rule_analysis), не компилируются;
+    отчёт анализа — в атрибуте `analysis` движка.
+    """
+    key = _engine_key(backend, rules, var_names, terms, priority_weights, ranges)
+    cached = _ENGINE_CACHE.get(key)
+    if cached is not None and cached[0] is rules and cached[1] is terms:
+        _ENGINE_CACHE.move_to_end(key)
+        return cached[2]
+    try:
+        factory = RULE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"неизвестный rule_backend: {backend!r} "
+                         f"(допустимо: 'python', {', '.join(map(repr, RULE_BACKENDS))})"
+                         ) from None
+    ordered = order_by_priority(rules) if priority_weights is not None else rules
+    analysis = None
+    if ranges is not None:
+        from rule_analysis import prune_rule_base
+        ordered, analysis = prune_rule_base(ordered, terms, ranges, priority_weights)
+    engine = factory(ordered, var_names, terms, priority_weights)
+    if analysis is not None:
+        engine.analysis = analysis
+    _cache_engine(key, rules, terms, engine)
+    return engine
+
+
+def register_engine(backend: str, rules: Sequence[dict], var_names: Sequence[str],
+                    terms: Dict[str, tuple], engine,
+                    priority_weights: Optional[Dict[int, float]] = None) -> None:
+    """
+    Положить готовый движок в кеш `get_engine` (например, восстановленный
+    из дискового кеша rule_files), чтобы он не компилировался заново.
+    """
+    _cache_engine(_engine_key(backend, rules, var_names, terms, priority_weights),
+                  rules, terms, engine)
+
+
+def engine_for(model, var_names: Sequence[str], terms: Dict[str, tuple],
+               priority_weights: Optional[Dict[int, float]] = None):
+    """
+    Вычислитель TSK для модели (по её `rule_backend` и `rules`).
+
+    Если к модели подключён включённый `TSKMemo` (`model.tsk_memo`),
+    вывод идёт через него независимо от rule_backend.
+
+    Движки без состояния возвращаются как есть; для движков с `session()`
+    (инкрементальный) модель получает собственную сессию, которая хранится
+    в `model._rule_session` и пересоздаётся при смене движка.
+    """
+    memo = getattr(model, 'tsk_memo', None)
+    if memo is not None and memo.enabled:
+        return memo.evaluator(model.rules, var_names, terms, priority_weights)
+    engine = get_engine(model.rule_backend, model.rules, var_names, terms,
+                        priority_weights)
+    if not hasattr(engine, 'session'):
+        return engine
+    session = getattr(model, '_rule_session', None)
+    if session is None or session.engine is not engine:
+        session = engine.session()
+        model._rule_session = session
+    return session